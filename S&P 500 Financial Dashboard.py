@@ -6,14 +6,137 @@
 # Importing Packages
 #==============================================================================
 
+import time
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import wait
 from datetime import datetime, timedelta
-import yahoo_fin.stock_info as si
+import fundamentals as fd
 import streamlit as st
-import re
-import mplfinance as mpf
+import streamlit.components.v1 as components
+from montecarlo import simulate_paths, simulate_portfolio, value_at_risk
+from history import get_history, get_window, memory_report, memory_usage, window
+from universe import load_universe
+from statements import get_statement
+from export import FORMATS, build_export, export_file_name
+from analytics import quote_summary, split_stats, daily_volatility
+from screener import OPERATORS, build_status, load_screener, parse_number, start_build
+from chart_cache import cached_chart, data_version
+from indicators import OVERLAY_COLORS, get_indicators
+from instrumentation import get_metrics, lazy_import, run_events, stage, start_run
+from scheduler import dataset_ages, get_scheduler, refresh_ticker
+from prefetch import pending, prefetch_ticker
+from client_chart import CHART_HEIGHT, LIBRARY_PATH, chart_html, get_payload, library_available
+from live import POLL as LIVE_POLL, get_live
+from compare import (EQUAL_WEIGHT, benchmark_returns, correlation_matrix, normalized,
+                     price_matrix, returns, rolling_correlation)
+
+
+def charts():
+    
+    # The chart drawing module, matplotlib and mplfinance are only imported
+    # the first time a chart is drawn
+    return lazy_import('charts')
+
+
+def prefetched(*datasets):
+    
+    # Wait for the running prefetches of the datasets of the ticker, showing
+    # a placeholder while they are still loading. The tab then reads them from
+    # the caches, or loads the ones whose prefetch had not started yet
+    futures = [future for future in (pending(ticker, dataset) for dataset in datasets) if future is not None]
+    if futures:
+        placeholder = st.empty()
+        placeholder.info('Loading ' + ticker + ' data...')
+        with stage('wait', ticker = ticker):
+            wait(futures)
+        placeholder.empty()
+
+
+def interactive_chart(title, interval = '1d', kind = 'Line', overlays = (), start = None, end = None):
+    
+    # The whole history is sent once, zoom, pan and the ranges are handled in
+    # the browser without a rerun
+    if not library_available():
+        st.warning('The interactive chart needs a copy of Lightweight Charts in ' + LIBRARY_PATH
+                   + ' or its hash in LIGHTWEIGHT_CHARTS_INTEGRITY')
+        return
+    history = get_history(ticker, interval)
+    if len(history) == 0:
+        return
+    payload = get_payload(ticker, interval, history, get_indicators(ticker, interval)[list(OVERLAY_COLORS)])
+    components.html(chart_html(payload, title, kind, overlays, start, end), height = CHART_HEIGHT)
+
+
+# Updates of the live chart when st.fragment is not available (an hour)
+LIVE_CYCLES = 720
+
+
+def live_chart(interval, overlays, simulated = False):
+    
+    # The bars are kept in ring buffers shared by every session viewing the
+    # ticker, each update only polls the bars after the last one
+    live = get_live(ticker, interval, simulated)
+    
+    def draw():
+        try:
+            live.update()
+        except Exception as error:
+            # Tried again on the next update, the bars received are kept
+            st.warning('Could not update the intraday bars: ' + str(error))
+        bars = live.frame(overlays)
+        if len(bars) == 0:
+            st.write('No intraday bars for ' + ticker + ' yet, the market may be closed.')
+            return
+        
+        last = bars['close'].iloc[-1]
+        change = last - bars['close'].iloc[-2] if len(bars) > 1 else 0.0
+        col1, col2, col3 = st.columns(3)
+        col1.metric('Last', str(np.round(last, 2)), str(np.round(change, 2)))
+        col2.metric('Bars', len(bars))
+        col3.metric('Last bar (UTC)', bars.index[-1].strftime('%H:%M'))
+        st.line_chart(bars[['close'] + list(overlays)])
+        st.bar_chart(bars['volume'])
+    
+    # Only the chart runs again on every update, not the whole page
+    if hasattr(st, 'fragment'):
+        st.fragment(draw, run_every = LIVE_POLL)()
+    else:
+        placeholder = st.empty()
+        for cycle in range(LIVE_CYCLES):
+            with placeholder.container():
+                draw()
+            time.sleep(LIVE_POLL)
+
+def screener_build():
+    
+    # Progress of the screener build running in the background, the page is
+    # run again to show the new table once it is done
+    status = build_status()
+    if status is None:
+        return
+    future = status['future']
+    if future.done():
+        if future.exception() is not None:
+            st.error('The screener table could not be built: ' + str(future.exception()))
+        return
+    
+    def draw():
+        if future.done():
+            st.rerun()
+        total = status['total']
+        st.progress(status['done'] / total if total else 0.0,
+                    text = 'Building the screener table: ' + str(status['done']) + ' of ' + str(total) + ' tickers')
+    
+    if hasattr(st, 'fragment'):
+        st.fragment(draw, run_every = 1)()
+    else:
+        placeholder = st.empty()
+        while not future.done():
+            with placeholder.container():
+                draw()
+            time.sleep(1)
+        placeholder.empty()
 
 #==============================================================================
 # Tab 1 - Company Profile
@@ -29,12 +152,9 @@ def tab1():
     st.header('Company profile')
     
     # Add table to show stock data
-    @st.cache
-    def GetCompanyInfo(ticker):
-        return si.get_company_info(ticker)
-    
     if ticker != '-':
-        info = GetCompanyInfo(ticker)
+        prefetched('company')
+        info = fd.get_company_info(ticker)
         info['Value'] = info['Value'].astype(str)
         st.dataframe(info, height=1000)
 
@@ -42,6 +162,18 @@ def tab1():
 # Tab 2 - Chart
 #==============================================================================
 
+# Indicator columns drawn for each selection
+OVERLAYS = {'SMA_20': ['SMA_20'],
+            'SMA_50': ['SMA_50'],
+            'SMA_200': ['SMA_200'],
+            'EMA_20': ['EMA_20'],
+            'Bollinger Bands': ['BB_upper', 'BB_lower']}
+
+# Intraday intervals, shown by the live mode
+LIVE_INTERVALS = {'1 Minute': '1m',
+                  '5 Minutes': '5m',
+                  '15 Minutes': '15m'}
+
 def tab2():
     
     # Add dashboard title and description
@@ -51,25 +183,28 @@ def tab2():
     col2.write("Created by: Fajar Tri Anggoro")
     st.header('Stock Price Chart')
     
-    # Add table to show stock data
-    @st.cache
+    # Add table to show stock data, sliced from the cached daily history
     def GetStockData(tickers, start_date, end_date, interval = "1d"):
-        return pd.concat([si.get_data(tick, start_date, end_date, interval = interval) for tick in tickers])
+        return get_window(tickers, start_date, end_date, interval)
 
     # Define default variables
     if ticker != '-':
         col1, col2 = st.columns(2)    
         
-        sd = col1.date_input("Start date", datetime.today().date() - timedelta(days=180), key = 1)
-        ed = col2.date_input("End date", datetime.today().date(), key = 1)
+        sd = col1.date_input("Start date", datetime.today().date() - timedelta(days=180), key = 'chart_start')
+        ed = col2.date_input("End date", datetime.today().date(), key = 'chart_end')
         title_sum = ticker + ' adjusted close Price & Volume'
         
         interval_selection = col1.selectbox( 'Select Interval',
-                             ('Daily', 'Weekly', 'Monthly'))
+                             ('Daily', 'Weekly', 'Monthly') + tuple(LIVE_INTERVALS))
         
         plot_selection = col2.selectbox( 'Select Plot Type',
                              ('Line', 'Candle'))
         
+        overlay_selection = st.multiselect('Select Indicators', list(OVERLAYS), default = ['SMA_50'])
+        
+        interactive = st.checkbox('Interactive chart (zoom and pan in the browser)', key = 'interactive_chart')
+        
         col1, col2, col3, col4, col5, col6, col7, col8 = st.columns(8)
         
         if interval_selection == 'Weekly':
@@ -78,23 +213,31 @@ def tab2():
             selected_interval = "1mo"
         else:
             selected_interval = "1d"
-            
-        stock_price = GetStockData([ticker], sd, ed, selected_interval)
         
+        # Intraday bars are polled and drawn live
+        if interval_selection in LIVE_INTERVALS:
+            simulated = st.checkbox('Simulated feed (for testing)', key = 'live_simulated')
+            live_chart(LIVE_INTERVALS[interval_selection],
+                       [column for name in overlay_selection for column in OVERLAYS[name]], simulated)
+            return
+        
+        if interactive:
+            prefetched('prices')
+            interactive_chart(ticker + ' adjusted close Price & Volume', selected_interval, plot_selection,
+                              [column for name in overlay_selection for column in OVERLAYS[name]], sd, ed)
+            return
         
         # Time values will change accordingly
         
         if col1.button('1M'):
             sd = datetime.today().date() - timedelta(days=30)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 1 Month'
         
 
         if col2.button('3M'):
             sd = datetime.today().date() - timedelta(days=90)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 3 Months'
         
 
@@ -102,7 +245,6 @@ def tab2():
         if col3.button('6M'):
             sd = datetime.today().date() - timedelta(days=180)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 6 Months'
         
 
@@ -110,74 +252,55 @@ def tab2():
             Y = datetime.today().date().year
             sd = datetime(Y, 1, 1)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Year to Date'
         
         
         if col5.button('1Y'):
             sd = datetime.today().date() - timedelta(days=365)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 1 Year'
             
 
         if col6.button('3Y'):
             sd = datetime.today().date() - timedelta(days=1095)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 3 Years'
         
             
         if col7.button('5Y'):
             sd = datetime.today().date() - timedelta(days=1825)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed, selected_interval)
             title_sum = ticker + ' adjusted close Price & Volume Last 5 Years'
           
             
         if col8.button('Max'):
-            stock_price = GetStockData([ticker], start_date = None, end_date = None, interval = selected_interval)
+            sd = None
+            ed = None
             title_sum = 'All time ' + ticker + ' adjusted close Price & Volume'
+        
+        # Only the first request for a ticker touches the network
+        prefetched('prices')
+        stock_price = GetStockData([ticker], sd, ed, selected_interval)
+        
+        # Indicators computed on the full history, sliced to the chart window
+        overlays = window(get_indicators(ticker, selected_interval), sd, ed)
+        overlays = overlays[[column for name in overlay_selection for column in OVERLAYS[name]]]
             
+        # The chart is only drawn again when one of its inputs or the data changes
+        chart_key = (ticker, plot_selection, str(sd), str(ed), selected_interval,
+                     title_sum, tuple(overlay_selection), data_version(stock_price))
+        
         # Line plot
         if plot_selection == 'Line':
-            fig, ax = plt.subplots(figsize=(15, 5))
-            for tick in [ticker]:
-                stock_df = stock_price[stock_price['ticker'] == tick]
-                stock_df['SMA_50'] = stock_df['adjclose'].rolling(window=50).mean()
-            
-                if stock_df['adjclose'][-1] >= stock_df['open'][-1]:
-                    col = 'green'
-                else:
-                    col = 'red'
-                
-                up = stock_df[stock_df['adjclose'] >= stock_df['open']]
-                down = stock_df[stock_df['adjclose'] < stock_df['open']]
-                ax.bar(up.index, up['volume'], color = 'green')
-                ax.bar(down.index, down['volume'], color = 'red')
-                ax.set(yticklabels=[])  
-                ax.tick_params(left=False)
-            
-            
-                ax2 = ax.twinx()
-                ax2.plot(stock_df['adjclose'], label=tick, color = col)
-                ax2.plot(stock_df['SMA_50'], label='SMA_50', color = 'blue')
-                ax.set_ylim(stock_df['volume'].min(), stock_df['volume'].max()*1.75)
-                ax2.set_ylim(stock_df['adjclose'].min()*0.8, stock_df['adjclose'].max()*1.01)
-            ax2.set_ylabel("Adjusted Closing Price")
-            ax2.legend()
-            fig.suptitle(title_sum)
-            st.pyplot(fig)
+            st.image(cached_chart(chart_key, lambda: charts().draw_line_chart(stock_price, overlays, title_sum, ticker)))
             
             
         # Candlestick plot    
         elif plot_selection == 'Candle':
-            st.set_option('deprecation.showPyplotGlobalUse', False)
             st.write(title_sum)
-            st.pyplot(mpf.plot(stock_price, type='candle', style='yahoo', volume = True, mav = 50))
+            st.image(cached_chart(chart_key, lambda: charts().draw_candle_chart(stock_price, overlays)))
         
 
-
 #==============================================================================
 # Tab 3 - Summary
 #==============================================================================
@@ -194,32 +317,33 @@ def tab3():
 
     st.header('Summary - ' + ticker)
     
-    # Add table to show stock data
-    @st.cache
+    # Add table to show stock data, sliced from the cached daily history
     def GetStockData(tickers, start_date = None, end_date = None):
-        return pd.concat([si.get_data(tick, start_date, end_date) for tick in tickers])
+        return get_window(tickers, start_date, end_date)
     
 
     if ticker != '-':
         col1, col2 = st.columns(2)
-        res = si.get_quote_table(ticker)
-        df_summary = pd.DataFrame.from_dict(res, orient = 'index')
-        df_summary.columns = ['Data']
-        df_summary = df_summary.astype(str)
+        prefetched('quote')
+        res = fd.get_quote_table(ticker)
+        df_summary = quote_summary(res)
         df1 = df_summary.iloc[:9]
         df2 = df_summary.iloc[9:]
         col1.write(df1)
         col2.write(df2)
         
     # Add a line plot
-    if ticker != '-':
+    if ticker != '-' and st.checkbox('Interactive chart (zoom and pan in the browser)', key = 'interactive_summary'):
+        prefetched('prices')
+        interactive_chart(ticker + ' adjusted close Price', start = datetime.today().date() - timedelta(days=30))
+        
+    elif ticker != '-':
         col1, col2, col3, col4, col5, col6, col7, col8 = st.columns(8)
         
         # Define default variables
         
         sd = datetime.today().date() - timedelta(days=30)
         ed = datetime.today().date()
-        stock_price = GetStockData([ticker], sd , ed)
         title_sum = ticker + ' adjusted close Price Last 1 Month'
         
         
@@ -227,21 +351,18 @@ def tab3():
         if col1.button('1M'):
             sd = datetime.today().date() - timedelta(days=30)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 1 Month'
         
             
         if col2.button('3M'):
             sd = datetime.today().date() - timedelta(days=90)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 3 Months'
         
             
         if col3.button('6M'):
             sd = datetime.today().date() - timedelta(days=180)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 6 Months'
         
             
@@ -249,50 +370,40 @@ def tab3():
             Y = datetime.today().date().year
             sd = datetime(Y, 1, 1)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Year to Date'
         
         
         if col5.button('1Y'):
             sd = datetime.today().date() - timedelta(days=365)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 1 year'
         
             
         if col6.button('3Y'):
             sd = datetime.today().date() - timedelta(days=1095)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 3 years'
         
         
         if col7.button('5Y'):
             sd = datetime.today().date() - timedelta(days=1825)
             ed = datetime.today().date()
-            stock_price = GetStockData([ticker], sd, ed)
             title_sum = ticker + ' adjusted close Price Last 5 years'
         
 
         if col8.button('Max'):
-            stock_price = GetStockData([ticker])
+            sd = None
+            ed = None
             title_sum = 'All time ' + ticker + ' adjusted close Price'
         
-        if stock_price['adjclose'][-1] >= stock_price['open'][-1]:
-            col = 'green'
-        else:
-            col = 'red'
-        
+        prefetched('prices')
+        stock_price = GetStockData([ticker], sd, ed)
         
-        fig, ax = plt.subplots(figsize=(15, 5))
-        for tick in [ticker]:
-            stock_df = stock_price[stock_price['ticker'] == tick]
-            ax.fill_between(stock_price.index, stock_price['adjclose'],color=col, alpha = 0.5)
-            ax.plot(stock_df['adjclose'], label=tick, color = col)
-        ax.legend()
-        fig.suptitle(title_sum)
-        st.pyplot(fig)
-            
+        # The chart is only drawn again when the range or the data changes
+        chart_key = (ticker, 'Area', str(sd), str(ed), '1d', title_sum, data_version(stock_price))
+        st.image(cached_chart(chart_key, lambda: charts().draw_area_chart(stock_price, title_sum, ticker)))
+
+
 #==============================================================================
 # Tab 4 - Statistics
 #==============================================================================
@@ -308,73 +419,26 @@ def tab4():
     
     if ticker != '-':
         col1, col2 = st.columns(2)
-        stat = si.get_stats(ticker)
-        stat_val = si.get_stats_valuation(ticker)
+        prefetched('stats', 'valuation')
+        stat = fd.get_stats(ticker)
+        stat_val = fd.get_stats_valuation(ticker)
         
         # Index the Data Accordingly
-        
-        df_Stock_Price_History = stat.iloc[:7]
-        df_Stock_Price_History = df_Stock_Price_History.set_index('Attribute')
-        
-        df_Share_Statistics = stat.iloc[7:19]
-        df_Share_Statistics = df_Share_Statistics.set_index('Attribute')
-        
-        df_Dividends_Splits = stat.iloc[19:29]
-        df_Dividends_Splits = df_Dividends_Splits.set_index('Attribute')
-        
-        df_Fiscal_Year = stat.iloc[29:31]
-        df_Fiscal_Year = df_Fiscal_Year.set_index('Attribute')
-        
-        df_profitability = stat.iloc[31:33]
-        df_profitability = df_profitability.set_index('Attribute')
-        
-        df_management_effectiveness = stat.iloc[33:35]
-        df_management_effectiveness = df_management_effectiveness.set_index('Attribute')
-        
-        df_Income_Statement = stat.iloc[35:43]
-        df_Income_Statement = df_Income_Statement.set_index('Attribute')
-
-        df_Balance_Sheet = stat.iloc[43:49]
-        df_Balance_Sheet = df_Balance_Sheet.set_index('Attribute')
-        
-        df_cashflow = stat.iloc[49:]
-        df_cashflow = df_cashflow.set_index('Attribute')
-        
-        df_valuation = stat_val
-        df_valuation.columns = ['Attribute', 'Value']
-        df_valuation = df_valuation.set_index('Attribute')
+        stats = split_stats(stat, stat_val)
         
         col1.write('Valuation Measures')
-        col1.write(df_valuation)
+        col1.write(stats['Valuation Measures'])
         
         col1.subheader('Financial Highlights')
-        col1.write('Fiscal Year')
-        col1.write(df_Fiscal_Year)
-        
-        col1.write('Profitability')
-        col1.write(df_profitability)
-        
-        col1.write('Management Effectiveness')
-        col1.write(df_management_effectiveness)
-        
-        col1.write('Income Statement')
-        col1.write(df_Income_Statement)
-        
-        col1.write('Balance Sheet')
-        col1.write(df_Balance_Sheet)
-        
-        col1.write('Cash Flow Statement')
-        col1.write(df_cashflow)
+        for name in ['Fiscal Year', 'Profitability', 'Management Effectiveness',
+                     'Income Statement', 'Balance Sheet', 'Cash Flow Statement']:
+            col1.write(name)
+            col1.write(stats[name])
         
         col2.subheader('Trading Information')
-        col2.write('Stock Price History')
-        col2.write(df_Stock_Price_History)
-        
-        col2.write('Share Statistics')
-        col2.write(df_Share_Statistics)
-        
-        col2.write('Dividends & Splits')
-        col2.write(df_Dividends_Splits)
+        for name in ['Stock Price History', 'Share Statistics', 'Dividends & Splits']:
+            col2.write(name)
+            col2.write(stats[name])
         
         
         # Add Footnotes
@@ -392,6 +456,14 @@ def tab4():
 # Tab 5 - Financials
 #==============================================================================
 
+# Statement shown for each option, and the key of its timeframe radio box
+STATEMENTS = {'Income Statement': 'income_statement',
+              'Balance Sheet': 'balance_sheet',
+              'Cash Flow': 'cash_flow'}
+STATEMENT_KEYS = {'Income Statement': 1,
+                  'Balance Sheet': 2,
+                  'Cash Flow': 3}
+
 def tab5():
 
     # Add dashboard title and description
@@ -408,164 +480,30 @@ def tab5():
         
         col1, col2, col3, col4, col5, col6, col7, col8 = st.columns(8)
         
-        if option == 'Income Statement':
-            
-            T_select = st.radio("Select Timeframe",
-                                ('Annually', 'Quarterly'), key = 1)
-            
-            if T_select == 'Annually':
-                st.subheader('Income Statement - Annually')
-                st.write("All numbers in thousands")
-                inc_stat_y = si.get_income_statement(ticker, yearly = True)
-                
-                # Data Preprocessing, Filling NA
-                inc_stat_y = inc_stat_y.reset_index()
-                inc_stat_y['Breakdown'] = inc_stat_y['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                inc_stat_y['Breakdown'] = inc_stat_y['Breakdown'].apply(lambda row: ' '.join(row))
-                inc_stat_y = inc_stat_y.set_index('Breakdown')
-                inc_stat_y = inc_stat_y.fillna(0)
-                inc_stat_y = inc_stat_y / 1000
-                inc_stat_y = inc_stat_y.astype('int')
-                
-                # Processing Column Names
-                for i in inc_stat_y.columns:
-                    inc_stat_y.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(inc_stat_y.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")
-                
-            if T_select == 'Quarterly':
-                st.subheader('Income Statement - Quarterly')
-                st.write("All numbers in thousands")
-                inc_stat_q = si.get_income_statement(ticker, yearly = False)
-                
-                # Data Preprocessing, Filling NA
-                inc_stat_q = inc_stat_q.reset_index()
-                inc_stat_q['Breakdown'] = inc_stat_q['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                inc_stat_q['Breakdown'] = inc_stat_q['Breakdown'].apply(lambda row: ' '.join(row))
-                inc_stat_q = inc_stat_q.set_index('Breakdown')
-                inc_stat_q = inc_stat_q.fillna(0)
-                inc_stat_q = inc_stat_q / 1000
-                inc_stat_q = inc_stat_q.astype('int')
-                
-                # Processing Column Names
-                for i in inc_stat_q.columns:
-                    inc_stat_q.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(inc_stat_q.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")             
+        T_select = st.radio("Select Timeframe",
+                            ('Annually', 'Quarterly'), key = STATEMENT_KEYS[option])
         
-        if option == 'Balance Sheet':
-            
-            T_select = st.radio("Select Timeframe",
-                                ('Annually', 'Quarterly'), key = 2)
-                
-            if T_select == 'Annually':
-                st.subheader('Balance Sheet - Annually')
-                st.write("All numbers in thousands")
-                bal_sheet_y = si.get_balance_sheet(ticker, yearly = True)
-                
-                # Data Preprocessing, Filling NA
-                bal_sheet_y = bal_sheet_y.reset_index()
-                bal_sheet_y['Breakdown'] = bal_sheet_y['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                bal_sheet_y['Breakdown'] = bal_sheet_y['Breakdown'].apply(lambda row: ' '.join(row))
-                bal_sheet_y = bal_sheet_y.set_index('Breakdown')
-                bal_sheet_y = bal_sheet_y.fillna(0)
-                bal_sheet_y = bal_sheet_y / 1000
-                bal_sheet_y = bal_sheet_y.astype('int')
-                
-                # Processing Column Names
-                for i in bal_sheet_y.columns:
-                    bal_sheet_y.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(bal_sheet_y.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")
-                
-            if T_select == 'Quarterly':
-                st.subheader('Balance Sheet - Quarterly')
-                st.write("All numbers in thousands")
-                bal_sheet_q = si.get_balance_sheet(ticker, yearly = False)
-                
-                # Data Preprocessing, Filling NA
-                bal_sheet_q = bal_sheet_q.reset_index()
-                bal_sheet_q['Breakdown'] = bal_sheet_q['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                bal_sheet_q['Breakdown'] = bal_sheet_q['Breakdown'].apply(lambda row: ' '.join(row))
-                bal_sheet_q = bal_sheet_q.set_index('Breakdown')
-                bal_sheet_q = bal_sheet_q.fillna(0)
-                bal_sheet_q = bal_sheet_q / 1000
-                bal_sheet_q = bal_sheet_q.astype('int')
-                
-                # Processing Column Names
-                for i in bal_sheet_q.columns:
-                    bal_sheet_q.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(bal_sheet_q.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")
-                
-        if option == 'Cash Flow':
-            
-            T_select = st.radio("Select Timeframe",
-                                ('Annually', 'Quarterly'), key = 3)
-                
-            if T_select == 'Annually':
-                st.subheader('Cash Flow - Annually')
-                st.write("All numbers in thousands")
-                cash_flow_y = si.get_cash_flow(ticker, yearly = True)
-                
-                # Data Preprocessing, Filling NA
-                cash_flow_y = cash_flow_y.reset_index()
-                cash_flow_y['Breakdown'] = cash_flow_y['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                cash_flow_y['Breakdown'] = cash_flow_y['Breakdown'].apply(lambda row: ' '.join(row))
-                cash_flow_y = cash_flow_y.set_index('Breakdown')
-                cash_flow_y = cash_flow_y.fillna(0)
-                cash_flow_y = cash_flow_y / 1000
-                cash_flow_y = cash_flow_y.astype('int')
-                
-                # Processing Column Names
-                for i in cash_flow_y.columns:
-                    cash_flow_y.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(cash_flow_y.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")
-                
-            if T_select == 'Quarterly':
-                st.subheader('Cash Flow - Quarterly')
-                st.write("All numbers in thousands")
-                cash_flow_q = si.get_cash_flow(ticker, yearly = False)
-                
-                # Data Preprocessing, Filling NA
-                cash_flow_q = cash_flow_q.reset_index()
-                cash_flow_q['Breakdown'] = cash_flow_q['Breakdown'].apply(lambda row: re.split(r'([A-Z][a-z]*\d*)', row))
-                cash_flow_q['Breakdown'] = cash_flow_q['Breakdown'].apply(lambda row: ' '.join(row))
-                cash_flow_q = cash_flow_q.set_index('Breakdown')
-                cash_flow_q = cash_flow_q.fillna(0)
-                cash_flow_q = cash_flow_q / 1000
-                cash_flow_q = cash_flow_q.astype('int')
-                
-                # Processing Column Names
-                for i in cash_flow_q.columns:
-                    cash_flow_q.rename(columns={i: i.date()}, inplace=True)
-                
-                # Use proper Formatting
-                st.dataframe(cash_flow_q.style.format("{:,d}"))
-                st.subheader('Footnote:')
-                st.write("0 means the data is currently Not Available")            
+        st.subheader(option + ' - ' + T_select)
+        st.write("All numbers in thousands")
+        
+        # Data Preprocessing done once per ticker, statement and timeframe
+        prefetched((STATEMENTS[option], T_select == 'Annually'))
+        statement = get_statement(ticker, STATEMENTS[option], yearly = T_select == 'Annually')
+        
+        # Use proper Formatting
+        st.dataframe(statement.style.format("{:,d}"))
+        st.subheader('Footnote:')
+        st.write("0 means the data is currently Not Available")
                 
 
 #==============================================================================
 # Tab 6 - Analysis
 #==============================================================================
 
+# Tables of the analysts info, each indexed by its first column
+ANALYSIS_SECTIONS = ('Earnings Estimate', 'Revenue Estimate', 'Earnings History',
+                     'EPS Trend', 'EPS Revisions', 'Growth Estimates')
+
 def tab6():
     
     # Add dashboard title and description
@@ -578,40 +516,12 @@ def tab6():
     if ticker != '-':
         st.write('Currency in USD')
         
-        an = si.get_analysts_info(ticker)
-        df_an = pd.DataFrame.from_dict(an, columns = ['Earnings Estimate'], orient = 'index')
-        
-        # Subset the data accordingly
-        
-        st.subheader('Earnings Estimate')
-        Earnings_Estimate = df_an.iloc[0,0]
-        Earnings_Estimate = Earnings_Estimate.set_index('Earnings Estimate')
-        st.write(Earnings_Estimate)
-        
-        st.subheader('Revenue Estimate')
-        Revenue_Estimate = df_an.iloc[1,0]
-        Revenue_Estimate = Revenue_Estimate.set_index('Revenue Estimate')
-        st.write(Revenue_Estimate)
-        
-        st.subheader('Earnings History')
-        Earnings_History = df_an.iloc[2,0]
-        Earnings_History = Earnings_History.set_index('Earnings History')
-        st.write(Earnings_History)
-        
-        st.subheader('EPS Trend')
-        EPS_Trend = df_an.iloc[3,0]
-        EPS_Trend = EPS_Trend.set_index('EPS Trend')
-        st.write(EPS_Trend)
+        prefetched('analysts')
+        an = fd.get_analysts_info(ticker)
 
-        st.subheader('EPS Revisions')
-        EPS_revisions = df_an.iloc[4,0]
-        EPS_revisions = EPS_revisions.set_index('EPS Revisions')
-        st.write(EPS_revisions)
-        
-        st.subheader('Growth Estimates')
-        Growth_Estimates = df_an.iloc[5,0]
-        Growth_Estimates = Growth_Estimates.set_index('Growth Estimates')
-        st.write(Growth_Estimates)
+        for section in ANALYSIS_SECTIONS:
+            st.subheader(section)
+            st.write(an[section].set_index(section))
         
 
 #==============================================================================
@@ -626,145 +536,355 @@ def tab7():
     col1.write("Data source: Yahoo Finance")
     col2.write("Created by: Fajar Tri Anggoro")
     st.header('Monte Carlo Simulation - ' + ticker)
+    
+    mode = st.radio('Simulate', ['Single ticker', 'Portfolio'])
+    if mode == 'Portfolio':
+        portfolio_simulation()
+        return
+    
     col1, col2 = st.columns(2)
     
-    @st.cache
     def GetStockData(tickers, start_date = None, end_date = None):
-        return pd.concat([si.get_data(tick, start_date, end_date) for tick in tickers])
+        return get_window(tickers, start_date, end_date)
     
     if ticker != '-':
         sd = datetime.today().date() - timedelta(days=180)
         ed = datetime.today().date()
+        prefetched('prices')
         stock_price = GetStockData([ticker], sd, ed)
         
         # Take the close price
         close_price = stock_price['close']
         
-        # The returns ((today price - yesterday price) / yesterday price)
-        daily_return = close_price.pct_change()
-        
-        # The volatility (high value, high risk)
-        daily_volatility = np.std(daily_return)
+        # The volatility of the daily returns (high value, high risk)
+        volatility = daily_volatility(close_price)
         
         # Setup the Monte Carlo simulation
-        #np.random.seed(123)
         simulations = col1.selectbox( 'Number of Simulations',
-                                 (200, 500, 1000))
+                                 (200, 500, 1000, 10000, 100000))
         time_horizon = col2.selectbox( 'Time Horizon',
                                  (30, 60, 90))
+        if col1.checkbox('Fix random seed'):
+            seed = col2.number_input('Seed', value = 123, min_value = 0, step = 1)
+        else:
+            seed = None
     
-        # Run the simulation
-        simulation_df = pd.DataFrame()
-    
-        for i in range(simulations):
-        
-            # The list to store the next stock price
-            next_price = []
-        
-            # Create the next stock price
-            last_price = close_price[-1]
-        
-            for j in range(time_horizon):
-                # Generate the random percentage change around the mean (0) and std (daily_volatility)
-                future_return = np.random.normal(0, daily_volatility)
-    
-                # Generate the random future price
-                future_price = last_price * (1 + future_return)
-    
-                # Save the price and go next
-                next_price.append(future_price)
-                last_price = future_price
-        
-            # Store the result of the simulation
-            simulation_df[i] = next_price
+        # Run the simulation, one column per simulation and one row per day
+        with stage('monte_carlo', ticker = ticker):
+            simulation_paths = simulate_paths(close_price.iloc[-1], volatility, simulations,
+                                              time_horizon, seed = seed, dtype = np.float32)
             
         # Get the ending price 
-        ending_price = simulation_df.iloc[-1:, :].values[0, ]
+        ending_price = simulation_paths[-1]
         
-        # Price at 95% confidence interval
-        future_price_95ci = np.percentile(ending_price, 5)
-        
-        # Value at Risk
-        VaR = close_price[-1] - future_price_95ci
+        # Value at Risk at 95% confidence interval
+        VaR = value_at_risk(close_price.iloc[-1], ending_price, 0.95)
         st.write('Value at Risk at 95% confidence interval is: ' + str(np.round(VaR, 2)) + ' USD')
         
         # Plot the simulation stock price in the future
-        fig, ax = plt.subplots()
-        fig.set_size_inches(15, 10, forward=True)
+        fig = charts().draw_simulation_chart(simulation_paths, close_price.iloc[-1], ticker, time_horizon)
+        with stage('render', ticker = ticker):
+            st.pyplot(fig)
+        charts().close(fig)
+
+
+# Days of returns used for the covariance matrix of the portfolio
+PORTFOLIO_HISTORY = 365
+CONFIDENCE_LEVELS = (0.90, 0.95, 0.99)
+
+
+def parse_weights(text, count):
+    
+    # Comma separated weights, equal weights when empty or not matching
+    try:
+        weights = [float(w) for w in text.split(',') if w.strip() != '']
+    except ValueError:
+        weights = []
+    if len(weights) != count or sum(weights) <= 0 or min(weights) < 0:
+        return None
+    return weights
+
+
+def portfolio_simulation():
     
-        plt.plot(simulation_df)
-        plt.title('Monte Carlo simulation for ' + ticker + ' stock price in next ' + str(time_horizon) + ' days')
-        plt.xlabel('Day')
-        plt.ylabel('Price')
+    default = [] if ticker == '-' else [ticker]
+    tickers = st.multiselect('Portfolio tickers', load_universe()['ticker'].tolist(), default = default)
+    if len(tickers) == 0:
+        return
     
-        plt.axhline(y=close_price[-1], color='red')
-        plt.legend(['Current stock price is: ' + str(np.round(close_price[-1], 2))])
-        ax.get_legend().legendHandles[0].set_color('red')
+    weights_text = st.text_input('Weights (comma separated, in the order of the tickers, empty for equal weights)')
+    weights = parse_weights(weights_text, len(tickers))
+    if weights is None:
+        if weights_text.strip() != '':
+            st.write('The weights do not match the tickers, equal weights are used.')
+        weights = [1.0] * len(tickers)
+    
+    col1, col2 = st.columns(2)
+    portfolio_value = col1.number_input('Portfolio value (USD)', value = 1000000, step = 10000)
+    simulations = col1.selectbox('Number of Simulations', (1000, 10000, 100000))
+    time_horizon = col2.selectbox('Time Horizon', (30, 60, 90))
+    if col2.checkbox('Fix random seed'):
+        seed = col2.number_input('Seed', value = 123, min_value = 0, step = 1)
+    else:
+        seed = None
+    
+    # Aligned daily returns of all the tickers, one column per ticker
+    sd = datetime.today().date() - timedelta(days=PORTFOLIO_HISTORY)
+    daily_returns = returns(price_matrix(tickers, sd))
+    
+    # Correlated paths for all the assets, drawn in one batch per chunk
+    with stage('portfolio_monte_carlo', assets = len(tickers)):
+        ending_value, risk = simulate_portfolio(daily_returns, weights, simulations, time_horizon,
+                                                portfolio_value, CONFIDENCE_LEVELS, seed = seed)
+    
+    table = pd.DataFrame(risk).T
+    table.index = [str(int(c * 100)) + '%' for c in table.index]
+    table.index.name = 'Confidence'
+    st.write('Value at Risk and Conditional Value at Risk in ' + str(time_horizon) + ' days (USD)')
+    st.table(table.style.format('{:,.2f}'))
+    
+    # Distribution of the portfolio value at the end of the horizon
+    fig = charts().draw_portfolio_chart(ending_value, portfolio_value, risk, time_horizon)
+    with stage('render', ticker = 'Portfolio'):
         st.pyplot(fig)
+    charts().close(fig)
     
     
+#==============================================================================
+# Tab 8 - Screener
+#==============================================================================
+
+def tab8():
+    
+    # Add dashboard title and description
+    st.title("S&P 500 Financial Dashboard")
+    col1, col2 = st.columns(2)
+    col1.write("Data source: Yahoo Finance")
+    col2.write("Created by: Fajar Tri Anggoro")
+    st.header('Screener')
+    
+    # The table is only built by a bulk fetch in the background, never while filtering
+    if st.button('Rebuild Screener Table'):
+        start_build()
+    screener_build()
+    
+    screener = load_screener()
+    if screener is None:
+        st.write('The screener table has not been built yet, press the button above to build it.')
+        return
+    
+    # Add up to three filters, numbers can be written like 50B or 12%
+    st.write('Filters (numbers can be written as 50B, 1.2T or 15%)')
+    conditions = []
+    for i in range(3):
+        col1, col2, col3 = st.columns([3, 1, 2])
+        field = col1.selectbox('Field', ['-'] + screener.numeric, key = 'screen_field_' + str(i))
+        op = col2.selectbox('Operator', list(OPERATORS), key = 'screen_op_' + str(i))
+        value = parse_number(col3.text_input('Value', key = 'screen_value_' + str(i)))
+        if field != '-' and not np.isnan(value):
+            conditions.append((field, op, value))
+    
+    col1, col2, col3 = st.columns([3, 1, 2])
+    sort_by = col1.selectbox('Sort by', ['-'] + screener.numeric)
+    ascending = col2.checkbox('Ascending', value = False)
+    ranks = col3.checkbox('Show percentile ranks')
+    
+    columns = ['name', 'sector'] + [field for field, op, value in conditions]
+    if sort_by != '-' and sort_by not in columns:
+        columns.append(sort_by)
+    
+    # Show every field until a filter or a sort field is chosen
+    columns = [column for column in columns if column in screener.table.columns]
+    if len(columns) <= 2:
+        columns = None
+    
+    result = screener.query(conditions, sort_by = None if sort_by == '-' else sort_by,
+                            ascending = ascending, ranks = ranks, columns = columns)
+    st.write(str(len(result)) + ' of ' + str(len(screener)) + ' tickers')
+    if screener.failed:
+        with st.expander(str(len(screener.failed)) + ' tickers could not be loaded'):
+            st.write(', '.join(sorted(screener.failed)))
+    st.dataframe(result, height = 600)
+
+#==============================================================================
+# Tab 9 - Comparison
+#==============================================================================
+
+# Start of the window for each range, days before today
+COMPARISON_RANGES = {'1M': 30, '3M': 90, '6M': 180, '1Y': 365, '3Y': 1095, '5Y': 1825, 'Max': None}
+
+def tab9():
+    
+    # Add dashboard title and description
+    st.title("S&P 500 Financial Dashboard")
+    col1, col2 = st.columns(2)
+    col1.write("Data source: Yahoo Finance")
+    col2.write("Created by: Fajar Tri Anggoro")
+    st.header('Comparison')
+    
+    default = [] if ticker == '-' else [ticker]
+    tickers = st.multiselect('Select tickers', load_universe()['ticker'].tolist(), default = default)
+    
+    if len(tickers) > 0:
+        col1, col2, col3 = st.columns(3)
+        range_selection = col1.selectbox('Range', list(COMPARISON_RANGES), index = 3)
+        window_size = col2.slider('Rolling window (days)', 20, 120, 60)
+        benchmark = col3.selectbox('Correlation with', [EQUAL_WEIGHT] + tickers)
+        
+        if COMPARISON_RANGES[range_selection] is None:
+            sd = None
+        else:
+            sd = datetime.today().date() - timedelta(days=COMPARISON_RANGES[range_selection])
+        
+        # One aligned matrix, dates x tickers
+        matrix = price_matrix(tickers, sd)
+        daily_returns = returns(matrix)
+        chart_key = ('Comparison', tuple(tickers), range_selection, window_size, benchmark,
+                     matrix.shape, matrix.index[-1], float(np.nansum(matrix.iloc[-1])))
+        
+        st.subheader('Normalized Performance')
+        st.image(cached_chart(chart_key + ('performance',), lambda: charts().draw_performance_chart(normalized(matrix))))
+        
+        st.subheader('Rolling Correlation with ' + benchmark)
+        correlation = rolling_correlation(daily_returns, benchmark_returns(daily_returns, benchmark), window_size)
+        st.image(cached_chart(chart_key + ('rolling',), lambda: charts().draw_performance_chart(correlation)))
+        
+        st.subheader('Correlation of Daily Returns')
+        st.image(cached_chart(chart_key + ('heatmap',), lambda: charts().draw_heatmap(correlation_matrix(daily_returns))))
+
+
 #==============================================================================
 # Main body
 #==============================================================================
 
 def run():
     
+    # Timings of this rerun, shown in the debug panel
+    start_run()
+    
     # Add the ticker selection on the sidebar
-    # Get the list of stock tickers from S&P500
-    ticker_list = ['-'] + si.tickers_sp500()
+    # Get the list of stock tickers from S&P500, cached on disk
+    with stage('universe'):
+        universe = load_universe()
     
-    # Add selection box
-    global ticker
-    ticker = st.sidebar.selectbox("Select a ticker", ticker_list)
+    # Filter the tickers by sector
+    sectors = ['All sectors'] + sorted(universe['sector'].unique())
+    sector = st.sidebar.selectbox("Filter by sector", sectors)
+    if sector != 'All sectors':
+        universe = universe[universe['sector'] == sector]
     
-    # Add function to convert df into csv
-    def convert_df(df):
-        return df.to_csv().encode('utf-8')
-    
-    def GetStockData(tickers, start_date = None, end_date = None):
-        return pd.concat([si.get_data(tick, start_date, end_date) for tick in tickers])
+    ticker_list = ['-'] + universe['ticker'].tolist()
+    names = dict(zip(universe['ticker'], universe['name']))
     
+    # Add selection box, showing the company name next to the ticker
+    global ticker
+    ticker = st.sidebar.selectbox("Select a ticker", ticker_list,
+                                  format_func = lambda tick: tick if tick == '-' else tick + ' - ' + names[tick])
     
     if ticker != '-':
         
-        col1, col2 = st.sidebar.columns(2)
+        # The data of the recently viewed tickers is refreshed in the background
+        get_scheduler().viewed(ticker)
         
-        csv = convert_df(GetStockData(ticker))
-    
-        col1.download_button(
-            label="Download Stock Data as CSV",
-            data=csv,
-            file_name= ticker + '_data.csv',
-            mime='text/csv')
+        # Start loading the data of every page at once, in the background
+        prefetch_ticker(ticker)
+        
+        # Download everything cached for this ticker again now
+        if st.sidebar.button('Refresh Data'):
+            with st.spinner('Refreshing ' + ticker):
+                errors = refresh_ticker(ticker)
+            for name, error in errors:
+                st.sidebar.warning('Could not refresh ' + name + ', the cached copy is kept: ' + str(error))
         
-        if col2.button('Refresh Data'):
-            st.experimental_rerun()
+        # Add the stock data download, only built when it is requested
+        with st.sidebar.expander('Download Stock Data'):
+            export_tickers = st.multiselect('Tickers', load_universe()['ticker'].tolist(), default = [ticker])
+            
+            if st.checkbox('All history', value = True):
+                sd = None
+                ed = None
+            else:
+                sd = st.date_input('From', datetime.today().date() - timedelta(days=365), key = 'export_start')
+                ed = st.date_input('To', datetime.today().date(), key = 'export_end') + timedelta(days=1)
+            
+            file_format = st.selectbox('Format', list(FORMATS))
+            
+            # The file is only built when the button is clicked, not on every rerun
+            def export_data(tickers = export_tickers, sd = sd, ed = ed, file_format = file_format):
+                with stage('export', format = file_format):
+                    return build_export(tickers, sd, ed, file_format)
+            
+            if export_tickers:
+                st.download_button(
+                    label="Download Stock Data",
+                    data=export_data,
+                    file_name=export_file_name(export_tickers, file_format),
+                    mime=FORMATS[file_format][1])
     
     # Add a radio box
-    select_tab = st.sidebar.radio("Select Page", ['Summary', 'Chart', 'Statistics', 'Financials', 'Analysis', 'Simulation', 'Company Profile'])
+    select_tab = st.sidebar.radio("Select Page", ['Summary', 'Chart', 'Statistics', 'Financials', 'Analysis', 'Simulation', 'Company Profile', 'Screener', 'Comparison'])
     
     # Show the selected tab
-    if select_tab == 'Summary':
-        # Run tab 3
-        tab3()
-    elif select_tab == 'Chart':
-        # Run tab 2
-        tab2()
-    elif select_tab == 'Statistics':
-        # Run tab 4
-        tab4()
-    elif select_tab == 'Financials':
-        # Run tab 5
-        tab5()
-    elif select_tab == 'Analysis':
-        # Run tab 6
-        tab6()
-    elif select_tab == 'Simulation':
-        # Run tab 7
-        tab7()
-    elif select_tab == 'Company Profile':
-        # Run tab 1
-        tab1()
+    with stage('page', page = select_tab, ticker = ticker):
+        if select_tab == 'Summary':
+            # Run tab 3
+            tab3()
+        elif select_tab == 'Chart':
+            # Run tab 2
+            tab2()
+        elif select_tab == 'Statistics':
+            # Run tab 4
+            tab4()
+        elif select_tab == 'Financials':
+            # Run tab 5
+            tab5()
+        elif select_tab == 'Analysis':
+            # Run tab 6
+            tab6()
+        elif select_tab == 'Simulation':
+            # Run tab 7
+            tab7()
+        elif select_tab == 'Company Profile':
+            # Run tab 1
+            tab1()
+        elif select_tab == 'Screener':
+            # Run tab 8
+            tab8()
+        elif select_tab == 'Comparison':
+            # Run tab 9
+            tab9()
+    
+    # How old the data shown for this ticker is
+    if ticker != '-':
+        with st.sidebar.expander('Data Age'):
+            st.dataframe(dataset_ages(ticker))
+    
+    # Timings, bytes fetched and cache hits, for debugging slow pages
+    if st.sidebar.checkbox('Show debug metrics'):
+        debug_panel()
+
+
+def debug_panel():
+    
+    with st.sidebar.expander('Debug Metrics', expanded = True):
+        events = pd.DataFrame(run_events())
+        if len(events):
+            events['stage'] = ['  ' * depth + name for depth, name in zip(events['depth'], events['stage'])]
+            events['ms'] = (events['seconds'] * 1000).round(1)
+            labels = [c for c in events.columns if c not in ('stage', 'depth', 'seconds', 'time', 'ms', 'bytes', 'hits', 'misses', 'error')]
+            st.write('This run')
+            st.dataframe(events[['stage'] + labels + ['ms', 'bytes', 'hits', 'misses']])
+        
+        metrics = get_metrics()
+        st.write('Slowest stages since start')
+        st.dataframe(metrics.summary().head(10))
+        st.write('Slowest pages')
+        st.dataframe(metrics.summary(('stage', 'page')).head(10))
+        st.write('Caches')
+        st.dataframe(metrics.cache_table())
+        st.write('Price histories in memory: ' + str(round(memory_usage() / 1024 / 1024, 1)) + ' MB')
+        st.dataframe(memory_report().head(20))
+        st.download_button('Prometheus Metrics', metrics.prometheus_text(), file_name = 'metrics.txt')
         
 if __name__ == "__main__":
     run()
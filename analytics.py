@@ -0,0 +1,83 @@
+#==============================================================================
+# Dashboard Analytics
+#==============================================================================
+
+# The computations behind the tabs, without any Streamlit call, so they can be
+# shared by the dashboard and the headless batch mode.
+
+import numpy as np
+import pandas as pd
+
+from montecarlo import simulate_var
+
+# Rows of si.get_stats in each section of the Statistics tab
+STAT_SECTIONS = [('Stock Price History', 0, 7),
+                 ('Share Statistics', 7, 19),
+                 ('Dividends & Splits', 19, 29),
+                 ('Fiscal Year', 29, 31),
+                 ('Profitability', 31, 33),
+                 ('Management Effectiveness', 33, 35),
+                 ('Income Statement', 35, 43),
+                 ('Balance Sheet', 43, 49),
+                 ('Cash Flow Statement', 49, None)]
+
+#==============================================================================
+# Summary
+#==============================================================================
+
+def quote_summary(quote):
+
+    # Quote table as a single column of strings
+    df_summary = pd.DataFrame.from_dict(quote, orient = 'index')
+    df_summary.columns = ['Data']
+    return df_summary.astype(str)
+
+#==============================================================================
+# Chart
+#==============================================================================
+
+def sma(price, window = 50):
+    return price.rolling(window = window).mean()
+
+#==============================================================================
+# Statistics
+#==============================================================================
+
+def split_stats(stat, stat_val):
+
+    # Index the Data Accordingly
+    sections = {}
+    for name, first, last in STAT_SECTIONS:
+        sections[name] = stat.iloc[first:last].set_index('Attribute')
+
+    df_valuation = stat_val.copy()
+    df_valuation.columns = ['Attribute', 'Value']
+    sections['Valuation Measures'] = df_valuation.set_index('Attribute')
+
+    return sections
+
+#==============================================================================
+# Simulation
+#==============================================================================
+
+def daily_volatility(close_price):
+
+    # Standard deviation of the daily returns, like np.std on the returns
+    return float(close_price.pct_change().std(ddof = 0))
+
+
+def monte_carlo_var(close_price, simulations = 1000, time_horizon = 90,
+                    confidence = 0.95, seed = None):
+
+    last_price = float(close_price.iloc[-1])
+    volatility = daily_volatility(close_price)
+    ending_price, VaR = simulate_var(last_price, volatility, simulations, time_horizon,
+                                     confidence = confidence, seed = seed, dtype = np.float32)
+
+    return {'last_price': last_price,
+            'daily_volatility': volatility,
+            'simulations': simulations,
+            'time_horizon': time_horizon,
+            'confidence': confidence,
+            'mean_ending_price': float(ending_price.mean()),
+            'VaR': VaR}
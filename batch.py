@@ -0,0 +1,155 @@
+#==============================================================================
+# Headless Batch Mode
+#==============================================================================
+
+# Computes the dashboard analytics without Streamlit, for a list of tickers or
+# the whole S&P 500, spread across a process pool:
+#
+#   python batch.py                           # whole S&P 500
+#   python batch.py AAPL MSFT --format json   # a few tickers
+#   python batch.py --simulations 10000 --horizon 30 --seed 123
+#
+# Every run writes summary, statistics, financial statements, SMA_50 and VaR
+# tables to the output folder (data/batch/<date> by default), plus
+# errors.json for failed tickers.
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from price_store import DATA_DIR
+
+# Days of closing prices behind the Monte Carlo simulation, like the Simulation tab
+SIMULATION_HISTORY = 180
+
+#==============================================================================
+# Per Ticker Analytics
+#==============================================================================
+
+def analyze_ticker(ticker, simulations = 1000, time_horizon = 90, seed = None):
+
+    import fundamentals as fd
+    from history import window
+    from price_store import get_store
+    from statements import normalize_batch
+    from analytics import quote_summary, sma, split_stats, monte_carlo_var
+
+    result = {'ticker': ticker}
+    try:
+        # Summary quote table
+        summary = quote_summary(fd.get_quote_table(ticker))['Data']
+        result['summary'] = dict(summary, ticker = ticker)
+
+        # Statistics, in long format (section, attribute, value)
+        stats = split_stats(fd.get_stats(ticker), fd.get_stats_valuation(ticker))
+        result['stats'] = [{'ticker': ticker, 'section': name, 'attribute': attribute, 'value': str(value)}
+                           for name, frame in stats.items()
+                           for attribute, value in frame.iloc[:, 0].items()]
+
+        # Financial statements, yearly and quarterly, in long format
+        result['statements'] = normalize_batch([ticker])
+
+        # SMA_50 chart series over the full history, at full precision
+        history = get_store().get(ticker)
+        chart = pd.DataFrame({'ticker': ticker,
+                              'adjclose': history['adjclose'],
+                              'SMA_50': sma(history['adjclose'], 50)})
+        result['sma'] = chart.rename_axis('date').reset_index()
+
+        # Monte Carlo Value at Risk, on the same window as the Simulation tab
+        start = datetime.today().date() - timedelta(days = SIMULATION_HISTORY)
+        close_price = window(history, start, datetime.today().date())['close']
+        result['var'] = dict(monte_carlo_var(close_price, simulations, time_horizon, seed = seed),
+                             ticker = ticker)
+
+    except Exception as error:
+        result['error'] = repr(error)
+
+    return result
+
+#==============================================================================
+# Output
+#==============================================================================
+
+def write_table(df, path, file_format):
+    if file_format == 'parquet':
+        df.to_parquet(path + '.parquet', index = False)
+    else:
+        df.to_json(path + '.json', orient = 'records', date_format = 'iso', indent = 1)
+
+
+def write_results(results, out_dir, file_format = 'parquet'):
+
+    os.makedirs(out_dir, exist_ok = True)
+    ok = [result for result in results if 'error' not in result]
+    errors = {result['ticker']: result['error'] for result in results if 'error' in result}
+
+    if ok:
+        write_table(pd.DataFrame([result['summary'] for result in ok]).astype(str),
+                    os.path.join(out_dir, 'summary'), file_format)
+        write_table(pd.DataFrame([row for result in ok for row in result['stats']]),
+                    os.path.join(out_dir, 'stats'), file_format)
+        write_table(pd.concat([result['statements'] for result in ok], ignore_index = True),
+                    os.path.join(out_dir, 'statements'), file_format)
+        write_table(pd.concat([result['sma'] for result in ok], ignore_index = True),
+                    os.path.join(out_dir, 'sma'), file_format)
+        write_table(pd.DataFrame([result['var'] for result in ok]),
+                    os.path.join(out_dir, 'var'), file_format)
+
+    with open(os.path.join(out_dir, 'errors.json'), 'w') as f:
+        json.dump(errors, f, indent = 1)
+
+    return len(ok), errors
+
+#==============================================================================
+# Command Line
+#==============================================================================
+
+def run_batch(tickers, workers = None, simulations = 1000, time_horizon = 90, seed = None):
+
+    analyze = partial(analyze_ticker, simulations = simulations, time_horizon = time_horizon, seed = seed)
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        return list(executor.map(analyze, tickers, chunksize = 4))
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Compute the dashboard analytics for many tickers.')
+    parser.add_argument('tickers', nargs = '*', help = 'tickers to analyze, default is the whole S&P 500')
+    parser.add_argument('--workers', type = int, default = None, help = 'processes, default is one per CPU')
+    parser.add_argument('--simulations', type = int, default = 1000)
+    parser.add_argument('--horizon', type = int, default = 90)
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('--format', choices = ['parquet', 'json'], default = 'parquet')
+    parser.add_argument('--out', default = None, help = 'output folder')
+    args = parser.parse_args(argv)
+
+    if args.tickers:
+        tickers = args.tickers
+    else:
+        from universe import load_tickers
+        tickers = load_tickers()
+
+    out_dir = args.out or os.path.join(DATA_DIR, 'batch', datetime.today().strftime('%Y-%m-%d'))
+
+    started = time.perf_counter()
+    results = run_batch(tickers, args.workers, args.simulations, args.horizon, args.seed)
+    count, errors = write_results(results, out_dir, args.format)
+
+    print('Analyzed {} of {} tickers in {:.1f} s, written to {}'.format(
+        count, len(tickers), time.perf_counter() - started, out_dir))
+    for ticker, error in errors.items():
+        print('  ' + ticker + ': ' + error)
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
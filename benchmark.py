@@ -0,0 +1,396 @@
+#==============================================================================
+# Offline Benchmark Suite
+#==============================================================================
+
+# Times the dashboard against the local stand-in for yahoo_fin (fake_source),
+# so the numbers don't depend on the network and can be reproduced:
+#
+#   - every page of the dashboard, run by Streamlit's AppTest, with cold and
+#     warm caches
+#   - Monte Carlo throughput for every size of the Simulation tab
+#   - statement normalization throughput
+#   - chart rendering for several history lengths
+#
+# Results are saved as JSON and compared with an earlier run, so regressions
+# show up between versions:
+#
+#   python benchmark.py                          # save data/benchmarks/<date>-<commit>.json
+#   python benchmark.py --quick                  # fewer repeats and smaller sizes
+#   python benchmark.py --baseline old.json      # compare with a given run
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import fundamentals as fd
+import price_store
+import history
+import statements
+import indicators
+import chart_cache
+import shared_store
+from price_store import DATA_DIR, PriceStore
+from shared_store import SharedStore
+from fake_source import FakeSource
+
+BENCHMARK_DIR = os.path.join(DATA_DIR, 'benchmarks')
+DASHBOARD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'S&P 500 Financial Dashboard.py')
+
+# Pages of the tabs benchmark, as named in the sidebar
+PAGES = ('Company Profile', 'Chart', 'Summary', 'Statistics', 'Financials', 'Analysis',
+         'Simulation', 'Comparison')
+
+# Sizes of the Simulation tab
+SIMULATIONS = (200, 500, 1000, 10000, 100000)
+TIME_HORIZON = 90
+
+# History lengths of the rendering benchmark, in bars
+HISTORY_LENGTHS = {'1M': 21, '6M': 126, '1Y': 252, '5Y': 1260, 'Max': None}
+
+# Modules timed by the import benchmark, each in a new interpreter. The
+# dashboard script is imported without running it
+IMPORTS = {'dashboard script': 'import importlib.util as u; s = u.spec_from_file_location("d", {path!r}); '
+                                's.loader.exec_module(u.module_from_spec(s))',
+           'charts (matplotlib)': 'import charts',
+           'mplfinance': 'import mplfinance',
+           'yahoo_fin': 'import yahoo_fin.stock_info'}
+
+# A case slower than the baseline by more than this ratio is a regression
+THRESHOLD = 0.25
+
+#==============================================================================
+# Setup
+#==============================================================================
+
+def setup_offline(data_dir):
+
+    # Every data call goes to the stand-in, the prices are stored in data_dir
+    source = FakeSource()
+    fd.set_source(source)
+    price_store.set_store(PriceStore(data_dir, fetch = source.get_data))
+    shared_store.set_shared_store(SharedStore(data_dir))
+    clear_caches()
+    return source
+
+
+def clear_caches():
+    fd.invalidate()
+    history.invalidate()
+    indicators.invalidate()
+    chart_cache.invalidate()
+    shared_store.get_shared_store().close()
+
+
+def load_dashboard():
+
+    # The dashboard script has spaces in its name, it is loaded from its path
+    import matplotlib
+    matplotlib.use('Agg')
+    spec = importlib.util.spec_from_file_location('dashboard', DASHBOARD_PATH)
+    dashboard = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dashboard)
+    return dashboard
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output = True,
+                              text = True, cwd = os.path.dirname(DASHBOARD_PATH)).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+#==============================================================================
+# Timing
+#==============================================================================
+
+def measure(func, repeats, setup = None):
+
+    # Median and best of several runs, setup() is not timed
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), float(np.min(times))
+
+
+def result(group, name, timing, items = None, unit = None):
+    seconds, best = timing
+    row = {'group': group, 'name': name, 'seconds': seconds, 'best': best}
+    if items is not None:
+        row['throughput'] = items / seconds
+        row['unit'] = unit
+    return row
+
+#==============================================================================
+# Benchmarks
+#==============================================================================
+
+def dashboard_app():
+
+    # Script of the AppTest runs, loads the dashboard and runs its page. It is
+    # run from its source alone, the folder of the dashboard comes from the
+    # environment
+    import os
+    import sys
+    import importlib.util
+    import matplotlib
+    matplotlib.use('Agg')
+    root = os.environ['DASHBOARD_ROOT']
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    spec = importlib.util.spec_from_file_location('dashboard', os.path.join(root, 'S&P 500 Financial Dashboard.py'))
+    dashboard = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dashboard)
+    dashboard.run()
+
+
+def page_run(page, ticker, comparison):
+
+    # The page rendered by Streamlit for the ticker, run again on every call
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['DASHBOARD_ROOT'] = os.path.dirname(DASHBOARD_PATH)
+    at = AppTest.from_function(dashboard_app, default_timeout = 300)
+    at.run()
+    at.sidebar.selectbox[1].set_value(ticker)
+    at.sidebar.radio[0].set_value(page).run()
+    if page == 'Comparison':
+        at.main.multiselect[0].set_value(comparison).run()
+
+    def run():
+        at.run()
+        if at.exception:
+            raise RuntimeError(page + ' page failed: ' + at.exception[0].message)
+
+    return run
+
+
+def bench_tabs(repeats):
+
+    tickers = FakeSource().tickers_sp500()
+    results = []
+    for page in PAGES:
+
+        # Cold: the memory caches are empty, the prices are already stored
+        run = page_run(page, tickers[0], tickers[:20])
+        run()
+        results.append(result('tab', page + ' (cold)', measure(run, repeats, setup = clear_caches)))
+        results.append(result('tab', page + ' (warm)', measure(run, repeats)))
+    return results
+
+
+def bench_monte_carlo(dashboard, repeats, quick):
+
+    results = []
+    for simulations in SIMULATIONS[:-1] if quick else SIMULATIONS:
+        timing = measure(lambda: dashboard.simulate_paths(100.0, 0.02, simulations, TIME_HORIZON,
+                                                          dtype = np.float32), repeats)
+        results.append(result('monte_carlo', str(simulations) + ' paths', timing,
+                              simulations, 'paths/s'))
+
+    # Correlated portfolio of 20 assets
+    daily_returns = np.random.default_rng(0).normal(0, 0.02, (250, 20))
+    simulations = 1000 if quick else 10000
+    timing = measure(lambda: dashboard.simulate_portfolio(daily_returns, np.ones(20), simulations,
+                                                          TIME_HORIZON), repeats)
+    results.append(result('monte_carlo', 'portfolio 20 assets', timing, simulations, 'paths/s'))
+    return results
+
+
+def bench_statements(repeats, quick):
+
+    source = FakeSource()
+    tickers = source.tickers_sp500()[:20 if quick else 100]
+    raw = {(tick, statement, yearly): getattr(source, 'get_' + statement)(tick, yearly = yearly)
+           for tick in tickers for statement in statements.STATEMENTS for yearly in (True, False)}
+
+    def one_by_one():
+        for table in raw.values():
+            statements.normalize_statement(table)
+
+    # Every cached table of the tickers stacked for a bulk export, once the
+    # tables are in the fundamentals cache
+    statements.normalize_batch(tickers)
+    batch = measure(lambda: statements.normalize_batch(tickers), repeats)
+
+    return [result('statements', 'normalize_statement', measure(one_by_one, repeats), len(raw), 'tables/s'),
+            result('statements', 'normalize_batch', batch, len(raw), 'tables/s')]
+
+
+def bench_rendering(repeats):
+
+    import charts
+
+    ticker = FakeSource().tickers_sp500()[0]
+    full = history.get_history(ticker)
+    overlays = indicators.get_indicators(ticker)[['SMA_50', 'BB_upper', 'BB_lower']]
+    results = []
+    for label, bars in HISTORY_LENGTHS.items():
+        stock_price = full if bars is None else full.iloc[-bars:]
+        overlay = overlays.loc[stock_price.index]
+        draws = {'line': lambda: charts.draw_line_chart(stock_price, overlay, label, ticker),
+                 'candle': lambda: charts.draw_candle_chart(stock_price, overlay),
+                 'area': lambda: charts.draw_area_chart(stock_price, label, ticker)}
+        for kind, draw in draws.items():
+            timing = measure(lambda: chart_cache.render_png(draw()), repeats)
+            results.append(result('render', kind + ' ' + label + ' (' + str(len(stock_price)) + ' bars)', timing))
+    return results
+
+
+def bench_imports(repeats):
+
+    # Cold import time, each in a new interpreter so nothing is cached
+    results = []
+    folder = os.path.dirname(DASHBOARD_PATH)
+    for name, statement in IMPORTS.items():
+        code = ('import sys, time; sys.path.insert(0, {folder!r}); start = time.perf_counter(); '
+                + statement + '; print(time.perf_counter() - start)').format(folder = folder, path = DASHBOARD_PATH)
+        times = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, cwd = folder)
+            if output.returncode != 0:
+                break
+            times.append(float(output.stdout.strip().splitlines()[-1]))
+        if times:
+            results.append(result('import', name, (float(np.median(times)), float(np.min(times)))))
+    return results
+
+
+def run_benchmarks(repeats = 5, quick = False, progress = print):
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        setup_offline(data_dir)
+        dashboard = load_dashboard()
+        results = []
+        for name, bench in (('import', lambda: bench_imports(repeats)),
+                            ('tabs', lambda: bench_tabs(repeats)),
+                            ('Monte Carlo', lambda: bench_monte_carlo(dashboard, repeats, quick)),
+                            ('statements', lambda: bench_statements(repeats, quick)),
+                            ('rendering', lambda: bench_rendering(repeats))):
+            progress('Running ' + name + ' benchmarks')
+            results.extend(bench())
+        fd.set_source(None)
+        price_store.set_store(None)
+        clear_caches()
+        shared_store.set_shared_store(None)
+
+    return {'version': git_version(),
+            'created': datetime.now().isoformat(timespec = 'seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'quick': quick,
+            'repeats': repeats,
+            'results': results}
+
+#==============================================================================
+# Saving and Comparing
+#==============================================================================
+
+def save_results(report, out_dir = BENCHMARK_DIR):
+    os.makedirs(out_dir, exist_ok = True)
+    name = datetime.now().strftime('%Y%m%d-%H%M%S') + '-' + report['version'] + '.json'
+    path = os.path.join(out_dir, name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(report, f, indent = 1)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def latest_results(out_dir = BENCHMARK_DIR):
+    if not os.path.isdir(out_dir):
+        return None
+    files = sorted(name for name in os.listdir(out_dir) if name.endswith('.json'))
+    return os.path.join(out_dir, files[-1]) if files else None
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(report, baseline, threshold = THRESHOLD):
+
+    # Ratio of the new time to the baseline time, for the cases in both runs
+    old = {(row['group'], row['name']): row['seconds'] for row in baseline['results']}
+    rows = []
+    for row in report['results']:
+        key = (row['group'], row['name'])
+        if key in old:
+            ratio = row['seconds'] / old[key]
+            rows.append({'group': key[0], 'name': key[1], 'baseline s': old[key],
+                         'seconds': row['seconds'], 'ratio': ratio,
+                         'regression': ratio > 1 + threshold})
+    return pd.DataFrame(rows)
+
+
+def format_results(report):
+    table = pd.DataFrame(report['results'])
+    table['ms'] = (table['seconds'] * 1000).round(2)
+    columns = ['group', 'name', 'ms']
+    if 'throughput' in table.columns:
+        table['throughput'] = [('{:,.0f} '.format(value) + unit) if unit == unit and unit else ''
+                               for value, unit in zip(table['throughput'], table['unit'])]
+        columns.append('throughput')
+    return table[columns].to_string(index = False)
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the dashboard against the local stand-in data source.')
+    parser.add_argument('--quick', action = 'store_true', help = 'fewer repeats and smaller sizes')
+    parser.add_argument('--repeats', type = int, default = None)
+    parser.add_argument('--out', default = BENCHMARK_DIR, help = 'folder of the saved results')
+    parser.add_argument('--baseline', default = None, help = 'results to compare with, default is the last saved run')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD,
+                        help = 'slowdown reported as a regression, 0.25 is 25%%')
+    parser.add_argument('--no-save', action = 'store_true')
+    args = parser.parse_args(argv)
+
+    repeats = args.repeats or (2 if args.quick else 5)
+    baseline_path = args.baseline or latest_results(args.out)
+
+    report = run_benchmarks(repeats, args.quick)
+    pd.set_option('display.width', 200)
+    print(format_results(report))
+
+    if not args.no_save:
+        print('Saved ' + save_results(report, args.out))
+
+    if baseline_path is None:
+        return 0
+
+    baseline = load_results(baseline_path)
+    comparison = compare_results(report, baseline, args.threshold)
+    print()
+    print('Compared with ' + baseline['version'] + ' (' + baseline['created'] + ')')
+    if len(comparison) == 0:
+        print('No common cases')
+        return 0
+
+    regressions = comparison[comparison['regression']]
+    print(comparison.drop(columns = 'regression').to_string(index = False, float_format = '{:.3f}'.format))
+    if len(regressions):
+        print()
+        print(str(len(regressions)) + ' regressions over ' + str(int(args.threshold * 100)) + '%:')
+        for _, row in regressions.iterrows():
+            print('  ' + row['group'] + ' / ' + row['name'] + ': ' + '{:.2f}x'.format(row['ratio']))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#==============================================================================
+# Rendered Chart Cache
+#==============================================================================
+
+# PNG bytes of the rendered charts, keyed by every input that changes the
+# picture and by the version of the underlying data. The least recently used
+# charts are dropped when the cache grows over its memory budget.
+
+import io
+import threading
+from collections import OrderedDict
+
+from instrumentation import cache_result, stage
+
+# Memory budget of the cached PNG bytes
+MAX_BYTES = 64 * 1024 * 1024
+
+# Resolution of the rendered charts
+DPI = 100
+
+
+def data_version(df):
+
+    # Changes whenever bars are added or the last bar is updated
+    if len(df) == 0:
+        return (0,)
+    last = df.iloc[-1]
+    return (len(df), df.index[0], df.index[-1], float(last['close']), float(last['volume']))
+
+
+def render_png(fig, dpi = DPI):
+    import matplotlib.pyplot as plt
+
+    # Encode and close the figure, so long running servers don't keep it
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format = 'png', dpi = dpi, bbox_inches = 'tight')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartCache:
+
+    def __init__(self, max_bytes = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._charts)
+
+    def get(self, key):
+        with self._lock:
+            png = self._charts.get(key)
+            if png is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._charts.move_to_end(key)
+        cache_result('charts', 'miss' if png is None else 'hit')
+        return png
+
+    def put(self, key, png):
+        with self._lock:
+            if key in self._charts:
+                self.size -= len(self._charts.pop(key))
+            self._charts[key] = png
+            self.size += len(png)
+            while self.size > self.max_bytes and len(self._charts) > 1:
+                self.size -= len(self._charts.popitem(last = False)[1])
+
+    def invalidate(self, ticker = None):
+
+        # Keys start with the ticker
+        with self._lock:
+            for key in list(self._charts):
+                if ticker is None or key[0] == ticker:
+                    self.size -= len(self._charts.pop(key))
+
+    def chart(self, key, draw):
+
+        # draw() builds the matplotlib figure, only called on a miss
+        png = self.get(key)
+        if png is None:
+            with stage('render', ticker = str(key[0])):
+                png = render_png(draw())
+            self.put(key, png)
+        return png
+
+
+_cache = ChartCache()
+
+
+def get_cache():
+    return _cache
+
+
+def cached_chart(key, draw):
+    return _cache.chart(key, draw)
+
+
+def invalidate(ticker = None):
+    _cache.invalidate(ticker)
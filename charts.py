@@ -0,0 +1,167 @@
+#==============================================================================
+# Chart Drawing
+#==============================================================================
+
+# Every matplotlib chart of the dashboard. The dashboard imports this module
+# the first time a chart has to be drawn, so the pages without a chart (and
+# the charts served from the chart cache) never load matplotlib. mplfinance
+# is only imported by the candlestick chart.
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from downsample import bucket_last, bucket_ohlcv, bucket_size, lttb, target_points
+from indicators import OVERLAY_COLORS
+
+# Maximum number of simulated paths drawn on the simulation chart
+MAX_PLOTTED_PATHS = 1000
+
+
+def close(fig):
+    plt.close(fig)
+
+#==============================================================================
+# Chart
+#==============================================================================
+
+def draw_line_chart(stock_price, overlays, title_sum, ticker):
+
+    fig, ax = plt.subplots(figsize=(15, 5))
+    for tick in [ticker]:
+        stock_df = stock_price[stock_price['ticker'] == tick]
+
+        if stock_df['adjclose'].iloc[-1] >= stock_df['open'].iloc[-1]:
+            col = 'green'
+        else:
+            col = 'red'
+
+        # No more bars and points than the chart has pixels
+        bars = bucket_ohlcv(stock_df, target_points(15, 'bar'))
+        width = 0.8 * bucket_size(len(stock_df), target_points(15, 'bar')) * bar_days(stock_df)
+
+        up = bars[bars['adjclose'] >= bars['open']]
+        down = bars[bars['adjclose'] < bars['open']]
+        ax.bar(up.index, up['volume'], color = 'green', width = width)
+        ax.bar(down.index, down['volume'], color = 'red', width = width)
+        ax.set(yticklabels=[])
+        ax.tick_params(left=False)
+
+
+        ax2 = ax.twinx()
+        ax2.plot(lttb(stock_df['adjclose'], target_points(15)), label=tick, color = col)
+        for column in overlays.columns:
+            ax2.plot(lttb(overlays[column], target_points(15)), label=column, color = OVERLAY_COLORS[column])
+        ax.set_ylim(bars['volume'].min(), bars['volume'].max()*1.75)
+        ax2.set_ylim(stock_df['adjclose'].min()*0.8, stock_df['adjclose'].max()*1.01)
+    ax2.set_ylabel("Adjusted Closing Price")
+    ax2.legend()
+    fig.suptitle(title_sum)
+    return fig
+
+
+def draw_candle_chart(stock_price, overlays):
+    import mplfinance as mpf
+
+    # Prices and indicators merged into as many candles as fit
+    candles = bucket_ohlcv(stock_price, target_points(15, 'candle'))
+    addplot = []
+    for column in overlays.columns:
+        values = bucket_last(overlays[column], target_points(15, 'candle'))
+        if values.notna().any():
+            addplot.append(mpf.make_addplot(values.to_numpy(), color = OVERLAY_COLORS[column]))
+
+    fig, axes = mpf.plot(candles, type='candle', style='yahoo', volume = True, addplot = addplot,
+                         figsize = (15, 8), returnfig = True)
+    return fig
+
+
+def bar_days(stock_df):
+
+    # Days between two bars, so merged volume bars stay as wide as their bucket
+    if len(stock_df) < 2:
+        return 1
+    return max((stock_df.index[-1] - stock_df.index[0]).days / (len(stock_df) - 1), 1)
+
+#==============================================================================
+# Summary
+#==============================================================================
+
+def draw_area_chart(stock_price, title_sum, ticker):
+
+    if stock_price['adjclose'].iloc[-1] >= stock_price['open'].iloc[-1]:
+        col = 'green'
+    else:
+        col = 'red'
+
+
+    fig, ax = plt.subplots(figsize=(15, 5))
+    for tick in [ticker]:
+        stock_df = stock_price[stock_price['ticker'] == tick]
+        line = lttb(stock_df['adjclose'], target_points(15))
+        ax.fill_between(line.index, line, color=col, alpha = 0.5)
+        ax.plot(line, label=tick, color = col)
+    ax.legend()
+    fig.suptitle(title_sum)
+    return fig
+
+#==============================================================================
+# Simulation
+#==============================================================================
+
+def draw_simulation_chart(simulation_paths, last_price, ticker, time_horizon):
+
+    # Plot the simulation stock price in the future
+    fig, ax = plt.subplots()
+    fig.set_size_inches(15, 10, forward=True)
+
+    # Only draw a sample of the paths, the chart can't show more than that
+    plt.plot(simulation_paths[:, :MAX_PLOTTED_PATHS])
+    plt.title('Monte Carlo simulation for ' + ticker + ' stock price in next ' + str(time_horizon) + ' days')
+    plt.xlabel('Day')
+    plt.ylabel('Price')
+
+    plt.axhline(y=last_price, color='red')
+    plt.legend(['Current stock price is: ' + str(np.round(last_price, 2))])
+    ax.get_legend().legend_handles[0].set_color('red')
+    return fig
+
+
+def draw_portfolio_chart(ending_value, portfolio_value, risk, time_horizon):
+
+    # Distribution of the portfolio value at the end of the horizon
+    fig, ax = plt.subplots(figsize=(15, 6))
+    ax.hist(ending_value, bins = 100, color = 'steelblue')
+    for confidence in risk:
+        ax.axvline(portfolio_value - risk[confidence]['VaR'], color = 'red', linestyle = '--')
+    ax.axvline(portfolio_value, color = 'black')
+    ax.set_title('Portfolio value in ' + str(time_horizon) + ' days')
+    ax.set_xlabel('Value (USD)')
+    ax.set_ylabel('Simulations')
+    return fig
+
+#==============================================================================
+# Comparison
+#==============================================================================
+
+def draw_performance_chart(matrix):
+
+    # One line per ticker, each downsampled to the chart width
+    fig, ax = plt.subplots(figsize=(15, 5))
+    for tick in matrix.columns:
+        ax.plot(lttb(matrix[tick], target_points(15)), label = tick, linewidth = 1)
+    if len(matrix.columns) <= 20:
+        ax.legend(ncol = 10, fontsize = 'small')
+    return fig
+
+
+def draw_heatmap(corr):
+
+    size = min(max(len(corr) * 0.3, 6), 15)
+    fig, ax = plt.subplots(figsize=(size + 1, size))
+    image = ax.imshow(corr.to_numpy(), cmap = 'RdYlGn', vmin = -1, vmax = 1)
+    ax.set_xticks(range(len(corr)))
+    ax.set_yticks(range(len(corr)))
+    ax.set_xticklabels(corr.columns, rotation = 90, fontsize = 'small')
+    ax.set_yticklabels(corr.index, fontsize = 'small')
+    fig.colorbar(image, ax = ax)
+    return fig
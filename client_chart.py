@@ -0,0 +1,257 @@
+#==============================================================================
+# Interactive Client-Side Chart
+#==============================================================================
+
+# The interactive chart mode sends the bars and the indicators of a ticker to
+# the browser once, as one base64 block of little-endian typed arrays, and
+# draws them with TradingView Lightweight Charts. Zoom, pan, the range
+# presets, line / candle and the indicators are then switched in the browser
+# without a rerun of the script.
+#
+# The whole history is sent, so zooming or panning never needs more data: the
+# recent bars one by one and the older ones merged in larger bars, which keeps
+# the payload small for tickers with decades of history.
+#
+# The pinned build of the library is inlined in the page from the vendor
+# folder, so the browser runs no third party script:
+#
+#   vendor/lightweight-charts.standalone.production.js   (from LIBRARY_URL)
+#
+# Without that copy it is loaded from the CDN only when the SRI hash of the
+# pinned build is set (LIGHTWEIGHT_CHARTS_INTEGRITY), which the browser checks
+# before running it.
+
+import os
+import json
+import base64
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from chart_cache import data_version
+from downsample import bucket_size
+from indicators import OVERLAY_COLORS
+from instrumentation import cache_result, stage
+
+# Recent bars sent one by one (10 years of daily bars), and the number of
+# merged bars the older history is reduced to
+RECENT_BARS = 2520
+OLDER_BARS = 1000
+
+# Height of the chart in pixels, and the payloads kept in memory
+CHART_HEIGHT = 560
+MAX_PAYLOADS = 64
+
+# Pinned build of the library, its copy in the vendor folder and the SRI hash
+# of the build (e.g. 'sha384-...') checked by the browser when loaded from the CDN
+LIBRARY_URL = 'https://unpkg.com/lightweight-charts@4.1.3/dist/lightweight-charts.standalone.production.js'
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor',
+                            os.path.basename(LIBRARY_URL))
+LIBRARY_INTEGRITY = os.environ.get('LIGHTWEIGHT_CHARTS_INTEGRITY', '')
+
+# Range presets of the chart, days before the last bar (None is the whole history)
+PRESETS = [('1M', 30), ('3M', 90), ('6M', 180), ('YTD', 'ytd'), ('1Y', 365),
+           ('3Y', 1095), ('5Y', 1825), ('Max', None)]
+
+#==============================================================================
+# Payload
+#==============================================================================
+
+def client_rows(n, recent_bars = RECENT_BARS, older_bars = OLDER_BARS):
+
+    # First row of every bar sent, the older rows merged in buckets
+    split = max(n - recent_bars, 0)
+    k = bucket_size(split, older_bars) if split else 1
+    return np.concatenate([np.arange(0, split, k), np.arange(split, n)]).astype(np.int64)
+
+
+def encode_payload(history, indicators, recent_bars = RECENT_BARS, older_bars = OLDER_BARS):
+
+    # Columns of float32 (time as int32 seconds, negative before 1970), one
+    # after the other
+    n = len(history)
+    starts = client_rows(n, recent_bars, older_bars)
+    ends = np.append(starts[1:], n) - 1 if n else starts
+
+    columns = {'time': history.index.values[starts].astype('datetime64[s]').astype(np.int32)}
+    if n:
+        columns['open'] = history['open'].to_numpy(np.float32)[starts]
+        columns['high'] = np.fmax.reduceat(history['high'].to_numpy(np.float32), starts)
+        columns['low'] = np.fmin.reduceat(history['low'].to_numpy(np.float32), starts)
+        columns['close'] = history['close'].to_numpy(np.float32)[ends]
+        columns['adjclose'] = history['adjclose'].to_numpy(np.float32)[ends]
+        columns['volume'] = np.add.reduceat(np.nan_to_num(history['volume'].to_numpy(np.float32)), starts)
+        for column in indicators.columns:
+            columns[column] = indicators[column].to_numpy(np.float32)[ends]
+
+    data = b''.join(values.astype(values.dtype.newbyteorder('<')).tobytes() for values in columns.values())
+    return {'bars': len(starts), 'columns': list(columns), 'indicators': list(indicators.columns),
+            'data': base64.b64encode(data).decode('ascii')}
+
+#==============================================================================
+# Payload Cache
+#==============================================================================
+
+_payloads = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_payload(ticker, interval, history, indicators):
+
+    # Built again only when the bars of the ticker change
+    key = (ticker, interval, data_version(history), tuple(indicators.columns))
+    with _lock:
+        payload = _payloads.get(key)
+        if payload is not None:
+            _payloads.move_to_end(key)
+    cache_result('client_charts', 'miss' if payload is None else 'hit')
+    if payload is None:
+        with stage('payload', ticker = ticker):
+            payload = encode_payload(history, indicators)
+        with _lock:
+            _payloads[key] = payload
+            while len(_payloads) > MAX_PAYLOADS:
+                _payloads.popitem(last = False)
+    return payload
+
+
+def invalidate(ticker = None):
+    with _lock:
+        for key in list(_payloads):
+            if ticker is None or key[0] == ticker:
+                del _payloads[key]
+
+#==============================================================================
+# Chart Page
+#==============================================================================
+
+def library_available():
+    return os.path.exists(LIBRARY_PATH) or bool(LIBRARY_INTEGRITY)
+
+
+def library_script():
+
+    # Inlined from the vendor folder, or loaded from the CDN with its hash
+    if os.path.exists(LIBRARY_PATH):
+        with open(LIBRARY_PATH, encoding = 'utf-8') as f:
+            return '<script>' + f.read().replace('</script', '<\\/script') + '</script>'
+    if LIBRARY_INTEGRITY:
+        return ('<script src="' + LIBRARY_URL + '" integrity="' + LIBRARY_INTEGRITY
+                + '" crossorigin="anonymous"></script>')
+    raise FileNotFoundError('Lightweight Charts is not in ' + LIBRARY_PATH
+                            + ' and LIGHTWEIGHT_CHARTS_INTEGRITY is not set')
+
+
+def chart_html(payload, title, kind = 'Line', overlays = (), start = None, end = None, height = CHART_HEIGHT):
+
+    # start / end are the first visible range, the whole history when None
+    def seconds(value):
+        return None if value is None else int(np.datetime64(value, 's').astype(np.int64))
+
+    options = {'title': title, 'kind': kind, 'overlays': list(overlays), 'colors': OVERLAY_COLORS,
+               'start': seconds(start), 'end': seconds(end), 'height': height - 40, 'presets': PRESETS}
+    return (CHART_TEMPLATE.replace('__PAYLOAD__', json.dumps(payload))
+                          .replace('__OPTIONS__', json.dumps(options))
+                          .replace('__LIBRARY__', library_script()))
+
+
+CHART_TEMPLATE = """
+<div style="font-family: sans-serif; font-size: 13px">
+  <div id="toolbar" style="margin-bottom: 4px"></div>
+  <div id="chart"></div>
+</div>
+__LIBRARY__
+<script>
+const payload = __PAYLOAD__;
+const options = __OPTIONS__;
+
+// Typed array views on the decoded block, no copy of the columns
+const raw = Uint8Array.from(atob(payload.data), c => c.charCodeAt(0)).buffer;
+const n = payload.bars;
+const col = {};
+payload.columns.forEach((name, i) => {
+  col[name] = name === 'time' ? new Int32Array(raw, i * n * 4, n) : new Float32Array(raw, i * n * 4, n);
+});
+
+function points(name) {
+  const out = [];
+  for (let i = 0; i < n; i++) {
+    if (!isNaN(col[name][i])) out.push({time: col.time[i], value: col[name][i]});
+  }
+  return out;
+}
+
+const chart = LightweightCharts.createChart(document.getElementById('chart'), {
+  height: options.height, layout: {textColor: '#333'},
+  rightPriceScale: {scaleMargins: {top: 0.1, bottom: 0.25}},
+  timeScale: {rightOffset: 2}, watermark: {visible: true, text: options.title, fontSize: 14, color: 'rgba(0, 0, 0, 0.3)', horzAlign: 'left', vertAlign: 'top'}
+});
+new ResizeObserver(entries => chart.applyOptions({width: entries[0].contentRect.width})).observe(document.getElementById('chart'));
+
+const volume = chart.addHistogramSeries({priceFormat: {type: 'volume'}, priceScaleId: ''});
+chart.priceScale('').applyOptions({scaleMargins: {top: 0.8, bottom: 0}});
+const candles = [], volumes = [];
+for (let i = 0; i < n; i++) {
+  if (isNaN(col.open[i]) || isNaN(col.close[i])) continue;
+  const up = col.close[i] >= col.open[i];
+  candles.push({time: col.time[i], open: col.open[i], high: col.high[i], low: col.low[i], close: col.close[i]});
+  volumes.push({time: col.time[i], value: col.volume[i], color: up ? 'rgba(0, 150, 0, 0.5)' : 'rgba(200, 0, 0, 0.5)'});
+}
+volume.setData(volumes);
+
+const candle = chart.addCandlestickSeries({visible: options.kind === 'Candle'});
+candle.setData(candles);
+const last = n - 1;
+const line = chart.addLineSeries({color: col.adjclose[last] >= col.open[last] ? 'green' : 'red', lineWidth: 2,
+                                  visible: options.kind !== 'Candle'});
+line.setData(points('adjclose'));
+
+// Indicators, drawn once and shown or hidden in the browser
+const series = {};
+payload.indicators.forEach(name => {
+  series[name] = chart.addLineSeries({color: options.colors[name] || 'gray', lineWidth: 1,
+                                      priceLineVisible: false, lastValueVisible: false,
+                                      visible: options.overlays.includes(name)});
+  series[name].setData(points(name));
+});
+
+function show(start, end) {
+  if (start === null) { chart.timeScale().fitContent(); return; }
+  chart.timeScale().setVisibleRange({from: start, to: end === null ? col.time[last] : end});
+}
+
+function button(text, onclick) {
+  const b = document.createElement('button');
+  b.textContent = text;
+  b.style.marginRight = '4px';
+  b.onclick = onclick;
+  document.getElementById('toolbar').appendChild(b);
+  return b;
+}
+
+options.presets.forEach(([name, days]) => button(name, () => {
+  const end = col.time[last];
+  if (days === null) show(null, null);
+  else if (days === 'ytd') show(Date.UTC(new Date(end * 1000).getUTCFullYear(), 0, 1) / 1000, end);
+  else show(end - days * 86400, end);
+}));
+button('Line / Candle', () => {
+  const showCandles = !candle.options().visible;
+  candle.applyOptions({visible: showCandles});
+  line.applyOptions({visible: !showCandles});
+});
+Object.keys(series).forEach(name => {
+  const label = document.createElement('label');
+  const box = document.createElement('input');
+  box.type = 'checkbox';
+  box.checked = options.overlays.includes(name);
+  box.onchange = () => series[name].applyOptions({visible: box.checked});
+  label.appendChild(box);
+  label.appendChild(document.createTextNode(name + ' '));
+  document.getElementById('toolbar').appendChild(label);
+});
+
+show(options.start, options.end);
+</script>
+"""
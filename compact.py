@@ -0,0 +1,61 @@
+#==============================================================================
+# Compact Price Histories
+#==============================================================================
+
+# The histories kept in memory by every server process. Yahoo Finance returns
+# float64 prices and volume and the ticker repeated as a string on every row,
+# 70 bytes per bar or more. Here the prices are float32, the volume an integer
+# and the ticker a categorical column, under 40 bytes per bar. Every column
+# is one array per ticker, the frame is built on top of them without copying
+# and the chart windows are index slices of that frame. The exports and the
+# batch outputs read the float64 prices of the price store instead.
+
+import numpy as np
+import pandas as pd
+
+# Columns stored as float32, in the order of Yahoo Finance
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'adjclose']
+
+
+def compact_arrays(df):
+
+    # One contiguous array per column
+    arrays = {}
+    for column in df.columns:
+        if column in PRICE_COLUMNS:
+            arrays[column] = np.ascontiguousarray(df[column].to_numpy(dtype = np.float32))
+        elif column == 'volume':
+            # Missing volume (e.g. the bar of an index) is stored as 0
+            arrays[column] = np.ascontiguousarray(df[column].fillna(0).to_numpy(dtype = np.int64))
+        elif column != 'ticker':
+            arrays[column] = df[column].to_numpy()
+    return arrays
+
+
+def arrays_frame(arrays, index, ticker = None):
+
+    # Frame on top of the arrays, without copying them. The ticker codes are
+    # all 0, a broadcast array takes no memory
+    columns = dict(arrays)
+    if ticker is not None:
+        codes = np.broadcast_to(np.int8(0), (len(index),))
+        columns['ticker'] = pd.Categorical.from_codes(codes, categories = [ticker])
+    return pd.DataFrame(columns, index = index, copy = False)
+
+
+def compact_frame(df, ticker = None):
+
+    # ticker defaults to the ticker column of the frame
+    if ticker is None and 'ticker' in df.columns and len(df):
+        ticker = str(df['ticker'].iloc[0])
+    return arrays_frame(compact_arrays(df), df.index, ticker)
+
+
+def frame_bytes(df):
+
+    # Memory used by the columns and the index of a frame
+    return int(df.memory_usage(index = True, deep = True).sum())
+
+
+def bytes_per_bar(df):
+    return frame_bytes(df) / len(df) if len(df) else 0.0
@@ -0,0 +1,83 @@
+#==============================================================================
+# Multi-Ticker Comparison
+#==============================================================================
+
+# Several tickers loaded into one aligned matrix (dates x tickers). The
+# normalized performance, the rolling correlations and the correlation matrix
+# are computed on the whole matrix at once.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from history import get_history, window
+
+# Threads loading the histories of the selected tickers
+MAX_WORKERS = 8
+
+# Name of the equal weighted benchmark
+EQUAL_WEIGHT = 'Equal weight'
+
+
+def price_matrix(tickers, start_date = None, end_date = None, column = 'adjclose'):
+
+    # Histories come from the cache, the missing ones are loaded in parallel
+    with ThreadPoolExecutor(max_workers = MAX_WORKERS) as executor:
+        histories = list(executor.map(get_history, tickers))
+
+    matrix = pd.concat([history[column].rename(tick) for tick, history in zip(tickers, histories)],
+                       axis = 1, sort = True)
+    return window(matrix, start_date, end_date)
+
+
+def normalized(matrix):
+
+    # Every column starts at 1 on its first price inside the window
+    first = matrix.bfill().iloc[0].to_numpy()
+    return matrix / first
+
+
+def returns(matrix):
+    return matrix.pct_change(fill_method = None)
+
+
+def benchmark_returns(daily_returns, benchmark = EQUAL_WEIGHT):
+    if benchmark == EQUAL_WEIGHT:
+        return daily_returns.mean(axis = 1)
+    return daily_returns[benchmark]
+
+
+def rolling_correlation(daily_returns, benchmark, window_size = 60):
+
+    # Rolling correlation of every column with the benchmark, from rolling
+    # sums on the whole matrix
+    x = daily_returns.to_numpy(dtype = float)
+    y = benchmark.to_numpy(dtype = float)[:, None]
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+
+    def rolling_sum(values):
+        total = np.cumsum(values, axis = 0)
+        total[window_size:] = total[window_size:] - total[:-window_size]
+        total[:window_size - 1] = np.nan
+        return total
+
+    n = rolling_sum(valid.astype(float))
+    sx, sy = rolling_sum(x), rolling_sum(y)
+    sxx, syy, sxy = rolling_sum(x * x), rolling_sum(y * y), rolling_sum(x * y)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+
+    # Windows with too few common returns are left empty
+    corr[n < window_size // 2] = np.nan
+    return pd.DataFrame(corr, index = daily_returns.index, columns = daily_returns.columns)
+
+
+def correlation_matrix(daily_returns):
+    return daily_returns.corr()
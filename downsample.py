@@ -0,0 +1,115 @@
+#==============================================================================
+# Level of Detail Downsampling
+#==============================================================================
+
+# Long histories have far more bars than the chart has pixels. Line series are
+# reduced with Largest-Triangle-Three-Buckets (LTTB), which keeps the visual
+# shape, and OHLCV bars are merged into buckets keeping the first open, the
+# highest high, the lowest low, the last close and the total volume.
+
+import numpy as np
+import pandas as pd
+
+from chart_cache import DPI
+
+# Pixels needed by one point of each kind of chart
+PIXELS_PER_POINT = {'line': 1, 'bar': 2, 'candle': 4}
+
+
+def target_points(width_inches, kind = 'line', dpi = DPI):
+    return max(int(width_inches * dpi / PIXELS_PER_POINT[kind]), 3)
+
+#==============================================================================
+# Line Series
+#==============================================================================
+
+def lttb_indices(x, y, target):
+
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+
+    # First and last points are always kept, the others are split in buckets
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    selected = np.empty(target, dtype = np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(target - 2):
+        start, stop = edges[i], edges[i + 1]
+
+        # Average of the next bucket, the last bucket looks at the last point
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        # Keep the point making the largest triangle with the previous point
+        # and the average of the next bucket
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def lttb(series, target):
+
+    # Downsample a series indexed by date, missing values are dropped first
+    series = series.dropna()
+    if len(series) <= target:
+        return series
+
+    x = series.index.values.astype('int64').astype(float)
+    y = series.to_numpy(dtype = float)
+    return series.iloc[lttb_indices(x, y, target)]
+
+#==============================================================================
+# OHLCV Bars
+#==============================================================================
+
+def bucket_size(length, target):
+    return max(int(np.ceil(length / target)), 1)
+
+
+def bucket_ohlcv(df, target):
+
+    n = len(df)
+    if n <= target:
+        return df
+
+    # Buckets of k consecutive bars, labelled with their first date
+    k = bucket_size(n, target)
+    starts = np.arange(0, n, k)
+    ends = np.minimum(starts + k, n) - 1
+
+    bars = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column == 'open':
+            bars[column] = values[starts]
+        elif column == 'high':
+            bars[column] = np.fmax.reduceat(values, starts)
+        elif column == 'low':
+            bars[column] = np.fmin.reduceat(values, starts)
+        elif column == 'volume':
+            bars[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            bars[column] = values[ends]
+
+    return pd.DataFrame(bars, index = df.index[starts])
+
+
+def bucket_last(series, target):
+
+    # Last value of every bucket of bucket_ohlcv, e.g. an indicator at the close
+    n = len(series)
+    if n <= target:
+        return series
+    k = bucket_size(n, target)
+    ends = np.minimum(np.arange(0, n, k) + k, n) - 1
+    return pd.Series(series.to_numpy()[ends], index = series.index[np.arange(0, n, k)], name = series.name)
@@ -0,0 +1,133 @@
+#==============================================================================
+# Stock Data Export
+#==============================================================================
+
+# Builds the sidebar download only when it is requested. The file is encoded
+# chunk by chunk, one ticker at a time, so no table of every ticker is built.
+# Streamlit holds a download in memory to serve it, whatever the data passed
+# to st.download_button, so the file is written to an in-memory buffer handed
+# to Streamlit, not to a temporary file on disk it would read back into memory
+# anyway. The prices are read from the price store at full precision, not from
+# the float32 histories kept in memory for the charts.
+
+import io
+import gzip
+
+from history import resample_ohlcv, window
+from price_store import get_store
+
+# File extension and mime type of every export format
+FORMATS = {'CSV': ('.csv', 'text/csv'),
+           'CSV (gzip)': ('.csv.gz', 'application/gzip'),
+           'Parquet': ('.parquet', 'application/octet-stream')}
+
+# Rows encoded at once
+CHUNK_ROWS = 50000
+
+#==============================================================================
+# Chunked Encoders
+#==============================================================================
+
+def iter_frames(tickers, start_date = None, end_date = None, interval = '1d', chunk_rows = CHUNK_ROWS):
+
+    # Windows of the stored histories, cut in chunks of rows
+    for tick in tickers:
+        df = resample_ohlcv(get_store().get(tick), interval)
+        df = window(df, start_date, end_date).rename_axis('date')
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def iter_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(header = header).encode('utf-8')
+        header = False
+
+
+class _ChunkSink:
+
+    # File object collecting what the Parquet writer has written since the
+    # last chunk, while reporting the total position to the writer
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(frames):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # One row group per chunk, yielded as soon as it is written
+    sink = _ChunkSink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame)
+        if writer is None:
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode = 'w'), table.schema)
+        writer.write_table(table)
+        yield sink.take()
+
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def iter_export(tickers, start_date = None, end_date = None, file_format = 'CSV',
+                chunk_rows = CHUNK_ROWS):
+
+    frames = iter_frames(tickers, start_date, end_date, chunk_rows = chunk_rows)
+    if file_format == 'Parquet':
+        return iter_parquet(frames)
+    return iter_csv(frames)
+
+#==============================================================================
+# Export File
+#==============================================================================
+
+def build_export(tickers, start_date = None, end_date = None, file_format = 'CSV',
+                 chunk_rows = CHUNK_ROWS):
+
+    # Encoded chunk by chunk into a buffer, rewound for reading. Returned as is
+    # by the callable of st.download_button
+    buffer = io.BytesIO()
+    if file_format == 'CSV (gzip)':
+        out = gzip.GzipFile(fileobj = buffer, mode = 'wb')
+    else:
+        out = buffer
+
+    for chunk in iter_export(tickers, start_date, end_date, file_format, chunk_rows):
+        out.write(chunk)
+
+    if out is not buffer:
+        out.close()
+    buffer.seek(0)
+    return buffer
+
+
+def export_file_name(tickers, file_format):
+    extension = FORMATS[file_format][0]
+    if len(tickers) == 1:
+        return tickers[0] + '_data' + extension
+    return 'stock_data_' + str(len(tickers)) + '_tickers' + extension
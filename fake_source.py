@@ -0,0 +1,286 @@
+#==============================================================================
+# Local Stand-in for yahoo_fin.stock_info
+#==============================================================================
+
+# Synthetic, deterministic responses with the same shape as yahoo_fin, so the
+# loaders can be run and benchmarked without touching the network. Every
+# ticker always gets the same price history, so gap-filling stays consistent.
+
+import time
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# First date of every synthetic history
+HISTORY_START = '2000-01-03'
+
+# Row names of si.get_stats, in the order of the Statistics tab sections
+STATS_ATTRIBUTES = [
+    'Beta (5Y Monthly)', '52-Week Change 3', 'S&P500 52-Week Change 3', '52 Week High 3',
+    '52 Week Low 3', '50-Day Moving Average 3', '200-Day Moving Average 3',
+    'Avg Vol (3 month) 3', 'Avg Vol (10 day) 3', 'Shares Outstanding 5',
+    'Implied Shares Outstanding 6', 'Float', '% Held by Insiders 1', '% Held by Institutions 1',
+    'Shares Short 4', 'Short Ratio 4', 'Short % of Float 4', 'Short % of Shares Outstanding 4',
+    'Shares Short (prior month) 4',
+    'Forward Annual Dividend Rate 4', 'Forward Annual Dividend Yield 4',
+    'Trailing Annual Dividend Rate 3', 'Trailing Annual Dividend Yield 3',
+    '5 Year Average Dividend Yield 4', 'Payout Ratio 4', 'Dividend Date 3', 'Ex-Dividend Date 4',
+    'Last Split Factor 2', 'Last Split Date 3',
+    'Fiscal Year Ends', 'Most Recent Quarter (mrq)',
+    'Profit Margin', 'Operating Margin (ttm)',
+    'Return on Assets (ttm)', 'Return on Equity (ttm)',
+    'Revenue (ttm)', 'Revenue Per Share (ttm)', 'Quarterly Revenue Growth (yoy)',
+    'Gross Profit (ttm)', 'EBITDA', 'Net Income Avi to Common (ttm)', 'Diluted EPS (ttm)',
+    'Quarterly Earnings Growth (yoy)',
+    'Total Cash (mrq)', 'Total Cash Per Share (mrq)', 'Total Debt (mrq)',
+    'Total Debt/Equity (mrq)', 'Current Ratio (mrq)', 'Book Value Per Share (mrq)',
+    'Operating Cash Flow (ttm)', 'Levered Free Cash Flow (ttm)']
+
+VALUATION_ATTRIBUTES = [
+    'Market Cap (intraday) 5', 'Enterprise Value 3', 'Trailing P/E', 'Forward P/E 1',
+    'PEG Ratio (5 yr expected) 1', 'Price/Sales (ttm)', 'Price/Book (mrq)',
+    'Enterprise Value/Revenue 3', 'Enterprise Value/EBITDA 7']
+
+# Breakdown names of the statements, camel case like yahoo_fin
+STATEMENT_ROWS = {
+    'income_statement': [
+        'totalRevenue', 'costOfRevenue', 'grossProfit', 'researchDevelopment',
+        'sellingGeneralAdministrative', 'nonRecurring', 'otherOperatingExpenses',
+        'totalOperatingExpenses', 'operatingIncome', 'totalOtherIncomeExpenseNet', 'ebit',
+        'interestExpense', 'incomeBeforeTax', 'incomeTaxExpense', 'minorityInterest',
+        'netIncomeFromContinuingOps', 'discontinuedOperations', 'extraordinaryItems',
+        'effectOfAccountingCharges', 'otherItems', 'netIncome',
+        'netIncomeApplicableToCommonShares'],
+    'balance_sheet': [
+        'cash', 'shortTermInvestments', 'netReceivables', 'inventory', 'otherCurrentAssets',
+        'totalCurrentAssets', 'longTermInvestments', 'propertyPlantEquipment', 'goodWill',
+        'intangibleAssets', 'otherAssets', 'deferredLongTermAssetCharges', 'totalAssets',
+        'accountsPayable', 'shortLongTermDebt', 'otherCurrentLiab', 'longTermDebt',
+        'otherLiab', 'minorityInterest', 'totalCurrentLiabilities', 'totalLiab',
+        'commonStock', 'retainedEarnings', 'treasuryStock', 'capitalSurplus',
+        'otherStockholderEquity', 'totalStockholderEquity', 'netTangibleAssets'],
+    'cash_flow': [
+        'netIncome', 'depreciation', 'changeToNetincome', 'changeToAccountReceivables',
+        'changeToLiabilities', 'changeToInventory', 'changeToOperatingActivities',
+        'totalCashFromOperatingActivities', 'capitalExpenditures', 'investments',
+        'otherCashflowsFromInvestingActivities', 'totalCashflowsFromInvestingActivities',
+        'dividendsPaid', 'netBorrowings', 'otherCashflowsFromFinancingActivities',
+        'totalCashFromFinancingActivities', 'changeInCash', 'repurchaseOfStock',
+        'issuanceOfStock']}
+
+# Tables of si.get_analysts_info, in the order of the Analysis tab
+ANALYSTS_TABLES = {
+    'Earnings Estimate': ['No. of Analysts', 'Avg. Estimate', 'Low Estimate', 'High Estimate', 'Year Ago EPS'],
+    'Revenue Estimate': ['No. of Analysts', 'Avg. Estimate', 'Low Estimate', 'High Estimate',
+                         'Year Ago Sales', 'Sales Growth (year/est)'],
+    'Earnings History': ['EPS Est.', 'EPS Actual', 'Difference', 'Surprise %'],
+    'EPS Trend': ['Current Estimate', '7 Days Ago', '30 Days Ago', '60 Days Ago', '90 Days Ago'],
+    'EPS Revisions': ['Up Last 7 Days', 'Up Last 30 Days', 'Down Last 7 Days', 'Down Last 30 Days'],
+    'Growth Estimates': ['Current Qtr.', 'Next Qtr.', 'Current Year', 'Next Year',
+                         'Next 5 Years (per annum)', 'Past 5 Years (per annum)']}
+
+ANALYSTS_PERIODS = ['Current Qtr.', 'Next Qtr.', 'Current Year', 'Next Year']
+
+
+def business_days():
+    days = pd.date_range(HISTORY_START, datetime.today().date())
+    return days[days.dayofweek < 5]
+
+
+class FakeSource:
+
+    def __init__(self, latency = 0.0, failure_rate = 0.0, seed = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.calls = 0
+        self._histories = {}
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+
+    # Simulated network round trip and transient errors
+    def _request(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError('simulated network error')
+
+    def _ticker_rng(self, ticker):
+        return np.random.default_rng(zlib.crc32(ticker.upper().encode()) + self.seed)
+
+    def _history(self, ticker):
+
+        # Geometric brownian motion on business days, generated once per ticker
+        with self._lock:
+            if ticker in self._histories:
+                return self._histories[ticker]
+
+        index = business_days()
+        rng = self._ticker_rng(ticker)
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(index))))
+        open_ = close * (1 + rng.normal(0, 0.005, len(index)))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, len(index))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, len(index))))
+        volume = rng.integers(1000000, 20000000, len(index))
+
+        history = pd.DataFrame({'open': open_,
+                                'high': high,
+                                'low': low,
+                                'close': close,
+                                'adjclose': close,
+                                'volume': volume.astype(float)}, index = index)
+
+        with self._lock:
+            self._histories[ticker] = history
+        return history
+
+    #==========================================================================
+    # yahoo_fin.stock_info functions
+    #==========================================================================
+
+    def tickers_sp500(self, include_company_data = False):
+        tickers = ['T' + str(i).zfill(3) for i in range(500)]
+        if not include_company_data:
+            return tickers
+
+        sectors = ['Industrials', 'Health Care', 'Information Technology', 'Financials',
+                   'Consumer Discretionary', 'Utilities', 'Energy', 'Materials']
+        return pd.DataFrame({'Symbol': tickers,
+                             'Security': ['Company ' + tick for tick in tickers],
+                             'GICS Sector': [sectors[i % len(sectors)] for i in range(len(tickers))]})
+
+    def get_data(self, ticker, start_date = None, end_date = None, index_as_date = True,
+                 interval = '1d'):
+
+        self._request()
+        frame = self._history(ticker.upper())
+        if start_date is not None:
+            frame = frame[frame.index >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            frame = frame[frame.index < pd.Timestamp(end_date)]
+
+        # yahoo_fin fails on an empty range
+        if len(frame) == 0:
+            raise KeyError('timestamp')
+
+        if interval == '1wk':
+            frame = frame.resample('W-MON', label = 'left', closed = 'left').agg(
+                {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                 'adjclose': 'last', 'volume': 'sum'}).dropna()
+        elif interval == '1mo':
+            frame = frame.resample('MS').agg(
+                {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                 'adjclose': 'last', 'volume': 'sum'}).dropna()
+
+        frame = frame.copy()
+        frame['ticker'] = ticker.upper()
+        if not index_as_date:
+            frame = frame.reset_index().rename(columns = {'index': 'date'})
+        return frame
+
+    def get_quote_table(self, ticker, dict_result = True):
+
+        self._request()
+        history = self._history(ticker.upper())
+        rng = self._ticker_rng(ticker)
+        last = history.iloc[-1]
+        year = history.iloc[-252:]
+
+        quote = {'1y Target Est': round(last['close'] * 1.1, 2),
+                 '52 Week Range': '{:.2f} - {:.2f}'.format(year['low'].min(), year['high'].max()),
+                 'Ask': '{:.2f} x 800'.format(last['close'] * 1.001),
+                 'Avg. Volume': float(year['volume'].mean()),
+                 'Beta (5Y Monthly)': round(float(rng.uniform(0.3, 2.0)), 2),
+                 'Bid': '{:.2f} x 900'.format(last['close'] * 0.999),
+                 "Day's Range": '{:.2f} - {:.2f}'.format(last['low'], last['high']),
+                 'EPS (TTM)': round(float(rng.uniform(0.5, 15)), 2),
+                 'Earnings Date': (datetime.today() + timedelta(days = 30)).strftime('%b %d, %Y'),
+                 'Ex-Dividend Date': (datetime.today() - timedelta(days = 30)).strftime('%b %d, %Y'),
+                 'Forward Dividend & Yield': '0.88 (1.20%)',
+                 'Market Cap': '{:.2f}B'.format(rng.uniform(5, 2500)),
+                 'Open': round(float(last['open']), 2),
+                 'PE Ratio (TTM)': round(float(rng.uniform(5, 60)), 2),
+                 'Previous Close': round(float(history['close'].iloc[-2]), 2),
+                 'Quote Price': float(last['close']),
+                 'Volume': float(last['volume'])}
+
+        if dict_result:
+            return quote
+        return pd.DataFrame(list(quote.items()), columns = ['attribute', 'value'])
+
+    def get_stats(self, ticker):
+
+        self._request()
+        rng = self._ticker_rng(ticker)
+        values = ['{:.2f}'.format(v) if i % 3 else '{:.2f}B'.format(v)
+                  for i, v in enumerate(rng.uniform(0.1, 500, len(STATS_ATTRIBUTES)))]
+        return pd.DataFrame({'Attribute': STATS_ATTRIBUTES, 'Value': values})
+
+    def get_stats_valuation(self, ticker):
+
+        self._request()
+        rng = self._ticker_rng(ticker)
+        values = ['{:.2f}B'.format(v) for v in rng.uniform(5, 2500, 2)]
+        values += ['{:.2f}'.format(v) for v in rng.uniform(0.5, 60, len(VALUATION_ATTRIBUTES) - 2)]
+        return pd.DataFrame({'Unnamed: 0': VALUATION_ATTRIBUTES,
+                             'As of Date: ' + datetime.today().strftime('%m/%d/%Y') + 'Current': values})
+
+    def _statement(self, ticker, statement, yearly):
+
+        # Four years or four quarters, with some values missing like Yahoo
+        self._request()
+        rng = self._ticker_rng(ticker + statement + str(yearly))
+        rows = STATEMENT_ROWS[statement]
+        today = pd.Timestamp(datetime.today().date())
+        if yearly:
+            dates = [pd.Timestamp(today.year - i, 12, 31) for i in range(1, 5)]
+        else:
+            dates = list(pd.date_range(end = today, periods = 4, freq = 'QE')[::-1])
+
+        values = rng.normal(0, 5e9, (len(rows), len(dates))).round(-3)
+        values[rng.random(values.shape) < 0.05] = np.nan
+        return pd.DataFrame(values, index = pd.Index(rows, name = 'Breakdown'), columns = dates)
+
+    def get_income_statement(self, ticker, yearly = True):
+        return self._statement(ticker, 'income_statement', yearly)
+
+    def get_balance_sheet(self, ticker, yearly = True):
+        return self._statement(ticker, 'balance_sheet', yearly)
+
+    def get_cash_flow(self, ticker, yearly = True):
+        return self._statement(ticker, 'cash_flow', yearly)
+
+    def get_analysts_info(self, ticker):
+
+        self._request()
+        rng = self._ticker_rng(ticker)
+        tables = {}
+        for name, rows in ANALYSTS_TABLES.items():
+            columns = ['Current Estimate'] if name == 'Growth Estimates' else ANALYSTS_PERIODS
+            table = pd.DataFrame(rng.uniform(0, 10, (len(rows), len(columns))).round(2),
+                                 columns = columns)
+            table.insert(0, name, rows)
+            tables[name] = table
+        return tables
+
+    def get_company_info(self, ticker):
+
+        self._request()
+        rng = self._ticker_rng(ticker)
+        info = {'zip': str(rng.integers(10000, 99999)),
+                'sector': 'Technology',
+                'fullTimeEmployees': int(rng.integers(1000, 200000)),
+                'longBusinessSummary': ' '.join(['Synthetic company ' + ticker.upper() + '.'] * 20),
+                'city': 'Springfield',
+                'country': 'United States',
+                'website': 'https://www.example.com',
+                'industry': 'Software',
+                'phone': '555-0100'}
+        return pd.DataFrame({'Value': list(info.values())},
+                            index = pd.Index(list(info.keys()), name = 'Breakdown'))
@@ -0,0 +1,310 @@
+#==============================================================================
+# Fundamentals Cache
+#==============================================================================
+
+# One cache for the yahoo_fin quote, statistics, statement, analysis and
+# company endpoints. Every data type has its own time to live. When an entry
+# has expired but is not too old, the cached copy is returned immediately and
+# a background thread downloads the new one (stale-while-revalidate).
+#
+# The financial statements are kept normalized (statements.py), in the format
+# of the Financials tab, so they are only cached once.
+#
+# The quote tables saved by the warm-up before market open
+# (python prefetch.py --quotes) are read on the first request of a ticker.
+
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from instrumentation import cache_result, fetched, stage
+from price_store import DATA_DIR
+from singleflight import SingleFlight
+
+# (time to live, maximum age still served while refreshing) in seconds
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+TTLS = {'quote': (MINUTE, HOUR),
+        'stats': (6 * HOUR, 7 * DAY),
+        'valuation': (6 * HOUR, 7 * DAY),
+        'income_statement': (30 * DAY, 180 * DAY),
+        'balance_sheet': (30 * DAY, 180 * DAY),
+        'cash_flow': (30 * DAY, 180 * DAY),
+        'analysts': (DAY, 30 * DAY),
+        'company': (7 * DAY, 90 * DAY)}
+
+# Maximum number of cached responses, the least recently used are dropped
+MAX_ENTRIES = 5000
+
+# Folder of the quote tables saved by the warm-up, and how old they may be
+QUOTE_DIR = os.path.join(DATA_DIR, 'quotes')
+SAVED_QUOTE_MAX_AGE = DAY
+
+#==============================================================================
+# TTL Cache
+#==============================================================================
+
+class TTLCache:
+
+    def __init__(self, max_entries = MAX_ENTRIES, max_workers = 4, name = 'fundamentals'):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers = max_workers)
+
+        # Concurrent loads of the same key share one call to the source
+        self._flight = SingleFlight(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, value, at = None):
+        with self._lock:
+            self._put(key, value, at)
+
+    def _put(self, key, value, at):
+        self._entries[key] = (time.time() if at is None else at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+
+    def seed(self, key, value, at):
+
+        # Value loaded at time at from somewhere else (e.g. a file), only
+        # kept when nothing newer has been loaded meanwhile
+        with self._lock:
+            if key not in self._entries:
+                self._put(key, value, at)
+
+    def age(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry[0]
+
+    def invalidate(self, match = None):
+        with self._lock:
+            for key in list(self._entries):
+                if match is None or match(key):
+                    del self._entries[key]
+
+    def _load(self, key, loader):
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def refresh(self, key, loader):
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _revalidate(self, key, loader):
+        try:
+            self.refresh(key, loader)
+        except Exception:
+            # Keep the stale copy, the next request tries again
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def get(self, key, loader, ttl, max_stale = None):
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < ttl:
+                self.hits += 1
+                cache_result(self.name, 'hit')
+                return entry[1]
+
+            # Expired but still usable, serve it and refresh in the background
+            if max_stale is not None and age < max_stale:
+                self.stale_hits += 1
+                cache_result(self.name, 'stale')
+                with self._lock:
+                    refresh = key not in self._pending
+                    self._pending.add(key)
+                if refresh:
+                    self._executor.submit(self._revalidate, key, loader)
+                return entry[1]
+
+        # Only the session calling the source counts a miss
+        def load():
+            self.misses += 1
+            cache_result(self.name, 'miss')
+            return self._load(key, loader)
+
+        return self._flight.do(key, load)
+
+#==============================================================================
+# Saved Quote Tables
+#==============================================================================
+
+def quote_path(ticker, root = None):
+    folder = QUOTE_DIR if root is None else os.path.join(root, 'quotes')
+    return os.path.join(folder, ticker.upper() + '.json')
+
+
+def save_quote(ticker, quote, root = None):
+    path = quote_path(ticker, root)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(quote, f, default = str)
+    os.replace(path + '.tmp', path)
+
+
+def load_quote(ticker, root = None):
+
+    # (quote, time it was saved), None when there is no saved quote
+    path = quote_path(ticker, root)
+    try:
+        with open(path) as f:
+            return json.load(f), os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _seed_quote(ticker):
+
+    # A saved quote less than a day old is served on the first request. When
+    # older than the time to live it is served as expired, and the new quote
+    # is downloaded in the background
+    saved = load_quote(ticker)
+    if saved is None or time.time() - saved[1] > SAVED_QUOTE_MAX_AGE:
+        return
+    ttl = TTLS['quote'][0]
+    _cache.seed(('quote', ticker), saved[0], max(saved[1], time.time() - ttl))
+
+#==============================================================================
+# Endpoints
+#==============================================================================
+
+_cache = TTLCache()
+
+
+def get_cache():
+    return _cache
+
+
+def _copy(value):
+
+    # Callers get their own copy, the tabs change the tables they receive
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return copy.copy(value)
+    return value
+
+
+# Object answering the yahoo_fin.stock_info calls. A local stand-in (e.g.
+# fake_source.FakeSource) can be set for offline runs and benchmarks
+_source = None
+
+
+def set_source(source = None):
+    global _source
+    _source = source
+
+
+def stock_info():
+    if _source is not None:
+        return _source
+    import yahoo_fin.stock_info as si
+    return si
+
+
+# yahoo_fin call behind every kind of data, from the ticker and the params
+LOADERS = {'quote': lambda ticker: stock_info().get_quote_table(ticker),
+           'stats': lambda ticker: stock_info().get_stats(ticker),
+           'valuation': lambda ticker: stock_info().get_stats_valuation(ticker),
+           'income_statement': lambda ticker, yearly: stock_info().get_income_statement(ticker, yearly = yearly),
+           'balance_sheet': lambda ticker, yearly: stock_info().get_balance_sheet(ticker, yearly = yearly),
+           'cash_flow': lambda ticker, yearly: stock_info().get_cash_flow(ticker, yearly = yearly),
+           'analysts': lambda ticker: stock_info().get_analysts_info(ticker),
+           'company': lambda ticker: stock_info().get_company_info(ticker)}
+
+
+# Statements normalized before they are cached
+STATEMENT_KINDS = ('income_statement', 'balance_sheet', 'cash_flow')
+
+
+def _loader(kind, ticker, params):
+
+    def load():
+        value = fetched(kind, ticker, lambda: LOADERS[kind](ticker, *params))
+        if kind in STATEMENT_KINDS:
+            from statements import normalize_statement
+            with stage('normalize', statement = kind, ticker = ticker):
+                value = normalize_statement(value)
+        return value
+
+    return load
+
+
+def cached(kind, ticker, *params):
+    ttl, max_stale = TTLS[kind]
+    return _copy(_cache.get((kind, ticker) + params, _loader(kind, ticker, params), ttl, max_stale))
+
+
+def refresh(kind, ticker, *params):
+
+    # Download again now, readers keep getting the old copy until it's done
+    return _copy(_cache.refresh((kind, ticker) + params, _loader(kind, ticker, params)))
+
+
+def age(kind, ticker, *params):
+    return _cache.age((kind, ticker) + params)
+
+
+def get_quote_table(ticker):
+    if _cache.age(('quote', ticker)) is None:
+        _seed_quote(ticker)
+    return cached('quote', ticker)
+
+
+def get_stats(ticker):
+    return cached('stats', ticker)
+
+
+def get_stats_valuation(ticker):
+    return cached('valuation', ticker)
+
+
+def get_income_statement(ticker, yearly = True):
+    return cached('income_statement', ticker, yearly)
+
+
+def get_balance_sheet(ticker, yearly = True):
+    return cached('balance_sheet', ticker, yearly)
+
+
+def get_cash_flow(ticker, yearly = True):
+    return cached('cash_flow', ticker, yearly)
+
+
+def get_analysts_info(ticker):
+    return cached('analysts', ticker)
+
+
+def get_company_info(ticker):
+    return cached('company', ticker)
+
+
+def invalidate(ticker = None, kinds = None):
+    _cache.invalidate(lambda key: (ticker is None or key[1] == ticker)
+                      and (kinds is None or key[0] in kinds))
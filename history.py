@@ -0,0 +1,210 @@
+#==============================================================================
+# Time Series Cache
+#==============================================================================
+
+# One daily history per ticker is loaded from the price store and kept in
+# memory. Every chart range is an index slice of it, and weekly / monthly bars
+# are resampled locally instead of downloaded again. The histories are kept
+# in the compact form of compact.py, within a memory budget: the least
+# recently used ones are dropped first and loaded again from the price store.
+# The daily histories are read from the shared store of shared_store.py, mapped
+# by every server process instead of downloaded and held by each of them.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from market_hours import bars_stale
+from price_store import REFRESH_AFTER
+from shared_store import get_shared_store
+from chart_cache import data_version, invalidate as invalidate_charts
+from compact import compact_frame, frame_bytes
+from instrumentation import cache_result
+from singleflight import SingleFlight
+
+# Pandas resampling rules matching the Yahoo Finance bars
+RESAMPLE_RULES = {'1wk': 'W-MON', '1mo': 'MS'}
+
+# How every OHLCV column is aggregated when resampling
+OHLCV_AGG = {'open': 'first',
+             'high': 'max',
+             'low': 'min',
+             'close': 'last',
+             'adjclose': 'last',
+             'volume': 'sum'}
+
+# Bytes of histories kept in memory by each server process
+MEMORY_BUDGET = int(float(os.environ.get('DASHBOARD_MEMORY_MB', 512)) * 1024 * 1024)
+
+# Least recently used first
+_cache = OrderedDict()
+_loaded = {}
+_sizes = {}
+_lock = threading.Lock()
+
+# Sessions opening the same ticker at once share one load
+_flight = SingleFlight('history')
+
+#==============================================================================
+# Resampling and Slicing
+#==============================================================================
+
+def resample_ohlcv(df, interval):
+
+    if interval == '1d':
+        return df
+
+    # Bars are labelled with the first day of the week / month, like Yahoo
+    agg = {col: how for col, how in OHLCV_AGG.items() if col in df.columns}
+    bars = df.resample(RESAMPLE_RULES[interval], label = 'left', closed = 'left').agg(agg)
+    bars = bars.dropna(subset = ['close'])
+
+    if 'ticker' in df.columns and len(df):
+        bars['ticker'] = df['ticker'].iloc[0]
+    return bars
+
+
+def window(df, start_date = None, end_date = None):
+
+    # Binary search on the sorted index, the end date is exclusive
+    index = df.index.values
+    first = 0 if start_date is None else np.searchsorted(index, np.datetime64(pd.Timestamp(start_date)), 'left')
+    last = len(index) if end_date is None else np.searchsorted(index, np.datetime64(pd.Timestamp(end_date)), 'left')
+    return df.iloc[first:last]
+
+#==============================================================================
+# Cached Histories
+#==============================================================================
+
+def get_history(ticker, interval = '1d'):
+
+    key = (ticker, interval)
+    with _lock:
+        fresh = key in _cache and not bars_stale(_loaded[key], REFRESH_AFTER)
+        if fresh:
+            cache_result('history', 'hit')
+            _cache.move_to_end(key)
+            return _cache[key]
+    return _flight.do(key, lambda: _load(ticker, interval))
+
+
+def _load(ticker, interval, refresh = False):
+
+    # Load the full daily history once, other intervals are built from it
+    key = (ticker, interval)
+    cache_result('history', 'miss')
+    if interval == '1d':
+        history = get_shared_store().get(ticker, '1d', refresh = refresh)
+
+        # New bars make the rendered charts of this ticker out of date
+        with _lock:
+            previous = _cache.get(key)
+        if previous is not None and data_version(previous) != data_version(history):
+            invalidate_charts(ticker)
+    else:
+        history = compact_frame(resample_ohlcv(get_history(ticker, '1d'), interval), ticker)
+
+    with _lock:
+        _cache[key] = history
+        _cache.move_to_end(key)
+        _loaded[key] = time.time()
+        _sizes[key] = frame_bytes(history)
+        evicted = _evict(keep = key)
+    _drop_indicators(evicted)
+    return history
+
+
+def _evict(keep, budget = None):
+
+    # Drop the least recently used histories until the budget is met, the
+    # one just loaded is always kept. Called with the lock held
+    budget = MEMORY_BUDGET if budget is None else budget
+    evicted = []
+    total = sum(_sizes.values())
+    for key in list(_cache):
+        if total <= budget:
+            break
+        if key == keep:
+            continue
+        total -= _sizes.pop(key)
+        del _cache[key]
+        del _loaded[key]
+        evicted.append(key)
+    return evicted
+
+
+def _drop_indicators(keys):
+
+    # The indicators of a dropped history would keep it in memory
+    if keys:
+        from indicators import invalidate as invalidate_indicators
+        for ticker in {key[0] for key in keys}:
+            invalidate_indicators(ticker)
+
+
+def refresh(ticker):
+
+    # Download the latest bars now. The weekly and monthly bars are resampled
+    # again on their next read
+    history = _flight.do((ticker, '1d'), lambda: _load(ticker, '1d', refresh = True))
+    with _lock:
+        for key in list(_cache):
+            if key[0] == ticker and key[1] != '1d':
+                del _cache[key]
+                del _loaded[key]
+                del _sizes[key]
+    return history
+
+
+def age(ticker, interval = '1d'):
+    with _lock:
+        loaded = _loaded.get((ticker, interval))
+    return None if loaded is None else time.time() - loaded
+
+
+def get_window(tickers, start_date = None, end_date = None, interval = '1d'):
+
+    # A single ticker is returned as a view of its cached history
+    frames = [window(get_history(tick, interval), start_date, end_date) for tick in tickers]
+    return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+
+def invalidate(ticker = None):
+    with _lock:
+        for key in list(_cache):
+            if ticker is None or key[0] == ticker:
+                del _cache[key]
+                del _loaded[key]
+                del _sizes[key]
+
+#==============================================================================
+# Memory Report
+#==============================================================================
+
+def memory_usage():
+    with _lock:
+        return sum(_sizes.values())
+
+
+def memory_report():
+
+    # Bytes of every cached history, the largest first
+    with _lock:
+        rows = [{'ticker': key[0], 'interval': key[1], 'bars': len(_cache[key]), 'bytes': size}
+                for key, size in _sizes.items()]
+    table = pd.DataFrame(rows, columns = ['ticker', 'interval', 'bars', 'bytes'])
+    table['bytes per bar'] = (table['bytes'] / table['bars'].where(table['bars'] > 0)).round(1)
+    return table.sort_values('bytes', ascending = False).reset_index(drop = True)
+
+
+def set_memory_budget(megabytes):
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = int(megabytes * 1024 * 1024)
+    with _lock:
+        evicted = _evict(keep = None)
+    _drop_indicators(evicted)
+
@@ -0,0 +1,167 @@
+#==============================================================================
+# Technical Indicator Engine
+#==============================================================================
+
+# SMA, EMA, RSI, Bollinger Bands and MACD computed once over the full cached
+# history of a ticker. When new bars arrive only the tail is computed, from
+# the last rows of the indicator table (the EMA, RSI and MACD recursions) and
+# the last prices (the rolling windows). Chart windows read slices of it, so
+# the indicators are also correct at the first bars of a short window.
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+SMA_WINDOWS = (20, 50, 200)
+EMA_SPANS = (12, 20, 26)
+RSI_WINDOW = 14
+BOLLINGER_WINDOW = 20
+BOLLINGER_WIDTH = 2
+MACD_SIGNAL = 9
+
+# Prices needed before the first new bar to compute the rolling windows
+LOOKBACK = max(SMA_WINDOWS + (BOLLINGER_WINDOW,)) - 1
+
+# Colors of the indicator columns drawn on the price charts
+OVERLAY_COLORS = {'SMA_20': 'orange',
+                  'SMA_50': 'blue',
+                  'SMA_200': 'purple',
+                  'EMA_20': 'brown',
+                  'BB_upper': 'gray',
+                  'BB_lower': 'gray'}
+
+#==============================================================================
+# Indicators
+#==============================================================================
+
+def _ema(values, span = None, alpha = None, seed = None):
+
+    # Exponential moving average, continued from the seed when given
+    if seed is not None:
+        values = pd.concat([pd.Series([seed]), values.reset_index(drop = True)])
+        ema = values.ewm(span = span, alpha = alpha, adjust = False).mean().to_numpy()[1:]
+    else:
+        ema = values.ewm(span = span, alpha = alpha, adjust = False).mean().to_numpy()
+    return ema
+
+
+def compute(close, previous = None, lookback = None):
+
+    # close is the whole price series. With previous (the indicator row of the
+    # bar before the first one to compute) and lookback (the prices before it),
+    # only the bars of close are computed
+    index = close.index
+    columns = {}
+
+    if lookback is not None:
+        window_close = pd.concat([lookback, close])
+    else:
+        window_close = close
+    skip = len(window_close) - len(close)
+
+    # Simple moving averages and Bollinger Bands on the rolling windows
+    for n in SMA_WINDOWS:
+        columns['SMA_' + str(n)] = window_close.rolling(n).mean().to_numpy()[skip:]
+
+    rolling = window_close.rolling(BOLLINGER_WINDOW)
+    mid = rolling.mean().to_numpy()[skip:]
+    std = rolling.std(ddof = 0).to_numpy()[skip:]
+    columns['BB_upper'] = mid + BOLLINGER_WIDTH * std
+    columns['BB_lower'] = mid - BOLLINGER_WIDTH * std
+
+    # Exponential moving averages
+    for n in EMA_SPANS:
+        seed = None if previous is None else previous['EMA_' + str(n)]
+        columns['EMA_' + str(n)] = _ema(close, span = n, seed = seed)
+
+    # RSI, with the Wilder averages of the gains and losses
+    delta = window_close.diff().to_numpy()[skip:]
+    delta = pd.Series(np.nan_to_num(delta))
+    seed_gain = None if previous is None else previous['RSI_gain']
+    seed_loss = None if previous is None else previous['RSI_loss']
+    gain = _ema(delta.clip(lower = 0), alpha = 1 / RSI_WINDOW, seed = seed_gain)
+    loss = _ema(-delta.clip(upper = 0), alpha = 1 / RSI_WINDOW, seed = seed_loss)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        columns['RSI'] = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+    columns['RSI_gain'] = gain
+    columns['RSI_loss'] = loss
+
+    # MACD, from the 12 and 26 day EMAs
+    macd = columns['EMA_12'] - columns['EMA_26']
+    seed = None if previous is None else previous['MACD_signal']
+    columns['MACD'] = macd
+    columns['MACD_signal'] = _ema(pd.Series(macd), span = MACD_SIGNAL, seed = seed)
+    columns['MACD_hist'] = macd - columns['MACD_signal']
+
+    return pd.DataFrame(columns, index = index)
+
+
+class Indicators:
+
+    def __init__(self, close):
+        self.close = close.astype(float)
+        self.table = compute(self.close)
+
+    def update(self, close):
+
+        # Only the bars after the last stored one are new, and the last stored
+        # bar may have changed. Anything else (e.g. adjusted prices changed
+        # after a dividend) needs the whole history again
+        close = close.astype(float)
+        old = self.close
+        n = len(old)
+        unchanged = (n >= 2 and len(close) >= n
+                     and close.index[n - 2] == old.index[n - 2]
+                     and close.iloc[0] == old.iloc[0]
+                     and close.iloc[n - 2] == old.iloc[n - 2])
+
+        if not unchanged:
+            self.close = close
+            self.table = compute(close)
+            return self.table
+
+        first = n - 1
+        tail = compute(close.iloc[first:],
+                       previous = self.table.iloc[first - 1],
+                       lookback = close.iloc[max(first - LOOKBACK, 0):first])
+        self.close = close
+        self.table = pd.concat([self.table.iloc[:first], tail])
+        return self.table
+
+#==============================================================================
+# Cached Indicators
+#==============================================================================
+
+_engines = {}
+_sources = {}
+_lock = threading.Lock()
+
+
+def get_indicators(ticker, interval = '1d'):
+
+    from history import get_history
+
+    # Updated only when the cached history of the ticker has changed
+    history = get_history(ticker, interval)
+    key = (ticker, interval)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is not None and _sources[key] is history:
+            return engine.table
+
+        if engine is None:
+            engine = Indicators(history['adjclose'])
+        else:
+            engine.update(history['adjclose'])
+        _engines[key] = engine
+        _sources[key] = history
+        return engine.table
+
+
+def invalidate(ticker = None):
+    with _lock:
+        for key in list(_engines):
+            if ticker is None or key[0] == ticker:
+                del _engines[key]
+                del _sources[key]
@@ -0,0 +1,322 @@
+#==============================================================================
+# Instrumentation
+#==============================================================================
+
+# Wall time, bytes fetched and cache hits / misses of every stage of a page
+# run. Stages are nested with the stage() context manager:
+#
+#   with stage('page', page = 'Chart', ticker = 'AAPL'):
+#       with stage('fetch', endpoint = 'prices', ticker = 'AAPL'):
+#           ...
+#
+# The totals are kept as Prometheus style counters, the last durations of
+# every stage are kept for the percentiles, and the stages of the current
+# rerun are kept for the debug panel. The counters and durations are keyed by
+# the stage and its low cardinality labels only (METRIC_LABELS), so they stay
+# bounded whatever the number of tickers viewed. When DASHBOARD_METRICS_LOG is
+# set every stage is also appended to that file as one JSON line, with all its
+# labels, ticker included. The log can be summarized later with:
+#
+#   python instrumentation.py data/metrics.jsonl
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import importlib
+from contextlib import contextmanager
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+# JSON lines file receiving every stage, not written when empty
+METRICS_LOG = os.environ.get('DASHBOARD_METRICS_LOG')
+
+# Durations kept per stage and labels for the percentiles
+MAX_SAMPLES = 1000
+
+# Labels of the counters and durations, each with a few values. The others
+# (e.g. ticker) are only written to the run events and the log
+METRIC_LABELS = ('page', 'endpoint', 'statement', 'interval', 'format', 'module')
+
+
+def payload_bytes(value):
+
+    # Size of a downloaded payload. yahoo_fin does not expose the response,
+    # so the size of the parsed tables is used instead
+    if value is None:
+        return 0
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep = True).sum())
+    if isinstance(value, dict):
+        return sum(payload_bytes(v) if isinstance(v, (pd.DataFrame, dict)) else len(str(v))
+                   for v in value.values())
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(str(value))
+
+#==============================================================================
+# Metrics
+#==============================================================================
+
+class Metrics:
+
+    def __init__(self, log_path = METRICS_LOG, max_samples = MAX_SAMPLES):
+        self.log_path = log_path
+        self.max_samples = max_samples
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.cache = defaultdict(int)
+        self.samples = defaultdict(lambda: deque(maxlen = self.max_samples))
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._local = threading.local()
+
+    # Open stages and finished events of the current thread
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+            self._local.events = []
+        return self._local.stack
+
+    def start_run(self):
+        self._stack()
+        self._local.stack = []
+        self._local.events = []
+
+    def run_events(self):
+
+        # Finished stages of the current rerun, in the order they started
+        self._stack()
+        return [event for event in self._local.events if 'seconds' in event]
+
+    @contextmanager
+    def stage(self, name, **labels):
+        stack = self._stack()
+        event = {'stage': name, 'depth': len(stack), 'bytes': 0, 'hits': 0, 'misses': 0}
+        event.update(labels)
+        stack.append(event)
+        self._local.events.append(event)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield event
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            event['seconds'] = seconds
+            event['time'] = time.time()
+            if error:
+                event['error'] = True
+
+            key = (name, tuple(sorted((label, value) for label, value in labels.items()
+                                      if label in METRIC_LABELS)))
+            with self._lock:
+                self.seconds[key] += seconds
+                self.calls[key] += 1
+                self.errors[key] += error
+                self.samples[key].append(seconds)
+            self._log(event)
+
+    def add_bytes(self, endpoint, nbytes):
+
+        # Counted for the endpoint and for the innermost open stage
+        with self._lock:
+            self.bytes[endpoint] += nbytes
+        stack = self._stack()
+        if stack:
+            stack[-1]['bytes'] += nbytes
+
+    def cache_result(self, cache, result):
+
+        # result is 'hit', 'stale' (served while refreshing), 'miss' or
+        # 'shared' (waited for the same request of another session)
+        with self._lock:
+            self.cache[(cache, result)] += 1
+        stack = self._stack()
+        if stack:
+            stack[-1]['misses' if result == 'miss' else 'hits'] += 1
+
+    def _log(self, event):
+        if not self.log_path:
+            return
+        line = json.dumps(event, default = str)
+        with self._log_lock:
+            with open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+
+    def reset(self):
+        with self._lock:
+            for counter in (self.seconds, self.calls, self.errors, self.bytes, self.cache, self.samples):
+                counter.clear()
+
+    # Reports
+    def summary(self, group_by = ('stage',)):
+
+        # Calls, total and percentiles of the durations, grouped by the stage
+        # and some of its METRIC_LABELS (e.g. ('stage', 'page') for the page
+        # latency)
+        with self._lock:
+            samples = {key: list(values) for key, values in self.samples.items()}
+            calls = dict(self.calls)
+            seconds = dict(self.seconds)
+
+        groups = {}
+        for key, values in samples.items():
+            labels = dict(key[1], stage = key[0])
+            group = tuple(labels.get(label, '') for label in group_by)
+            total = groups.setdefault(group, [[], 0, 0.0])
+            total[0].extend(values)
+            total[1] += calls[key]
+            total[2] += seconds[key]
+        return summary_table(groups, group_by)
+
+    def cache_table(self):
+        with self._lock:
+            counts = dict(self.cache)
+        caches = sorted({cache for cache, _ in counts})
+        table = pd.DataFrame({result: [counts.get((cache, result), 0) for cache in caches]
+                              for result in ('hit', 'stale', 'shared', 'miss')}, index = caches)
+        # Requests served without their own call to the source
+        total = table.sum(axis = 1)
+        table['hit ratio'] = (total - table['miss']) / total.where(total > 0)
+        return table
+
+    def prometheus_text(self):
+
+        # Counters in the Prometheus text exposition format
+        def labels_text(labels):
+            return '{' + ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels) + '}'
+
+        with self._lock:
+            lines = ['# TYPE dashboard_stage_seconds_total counter']
+            for (name, labels), value in sorted(self.seconds.items()):
+                lines.append('dashboard_stage_seconds_total' + labels_text((('stage', name),) + labels) + ' ' + repr(value))
+            lines.append('# TYPE dashboard_stage_calls_total counter')
+            for (name, labels), value in sorted(self.calls.items()):
+                lines.append('dashboard_stage_calls_total' + labels_text((('stage', name),) + labels) + ' ' + str(value))
+            lines.append('# TYPE dashboard_stage_errors_total counter')
+            for (name, labels), value in sorted(self.errors.items()):
+                lines.append('dashboard_stage_errors_total' + labels_text((('stage', name),) + labels) + ' ' + str(value))
+            lines.append('# TYPE dashboard_fetched_bytes_total counter')
+            for endpoint, value in sorted(self.bytes.items()):
+                lines.append('dashboard_fetched_bytes_total' + labels_text((('endpoint', endpoint),)) + ' ' + str(value))
+            lines.append('# TYPE dashboard_cache_requests_total counter')
+            for (cache, result), value in sorted(self.cache.items()):
+                lines.append('dashboard_cache_requests_total' + labels_text((('cache', cache), ('result', result))) + ' ' + str(value))
+        return '\n'.join(lines) + '\n'
+
+
+def summary_table(groups, group_by):
+
+    rows = []
+    for group, (values, calls, seconds) in groups.items():
+        values = np.asarray(values)
+        rows.append(group + (calls, seconds, np.percentile(values, 50),
+                             np.percentile(values, 95), values.max()))
+    table = pd.DataFrame(rows, columns = list(group_by) + ['calls', 'total s', 'p50 s', 'p95 s', 'max s'])
+    return table.sort_values('p95 s', ascending = False).reset_index(drop = True)
+
+#==============================================================================
+# Shared Metrics
+#==============================================================================
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def stage(name, **labels):
+    return _metrics.stage(name, **labels)
+
+
+def add_bytes(endpoint, nbytes):
+    _metrics.add_bytes(endpoint, nbytes)
+
+
+def cache_result(cache, result):
+    _metrics.cache_result(cache, result)
+
+
+def start_run():
+    _metrics.start_run()
+
+
+def run_events():
+    return _metrics.run_events()
+
+
+def lazy_import(name):
+
+    # Import a module the first time it is needed, and time that import
+    module = sys.modules.get(name)
+    if module is None:
+        with stage('import', module = name):
+            module = importlib.import_module(name)
+    return module
+
+
+def fetched(endpoint, ticker, loader):
+
+    # Time a download and count the size of what it returned
+    with stage('fetch', endpoint = endpoint, ticker = ticker):
+        value = loader()
+        add_bytes(endpoint, payload_bytes(value))
+    return value
+
+#==============================================================================
+# Log Summary
+#==============================================================================
+
+def read_log(path):
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def log_summary(events, group_by = ('stage',)):
+    groups = {}
+    for group, rows in events.groupby(list(group_by), dropna = False):
+        group = group if isinstance(group, tuple) else (group,)
+        groups[tuple('' if pd.isna(g) else g for g in group)] = [
+            rows['seconds'].tolist(), len(rows), rows['seconds'].sum()]
+    return summary_table(groups, group_by)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Summarize the stage timings of a metrics log.')
+    parser.add_argument('log', help = 'JSON lines file written with DASHBOARD_METRICS_LOG')
+    parser.add_argument('--top', type = int, default = 15)
+    args = parser.parse_args(argv)
+
+    events = read_log(args.log)
+    pd.set_option('display.width', 200)
+    print('Stages')
+    print(log_summary(events).head(args.top).to_string(index = False))
+
+    for label, title in (('page', 'Page latency'), ('endpoint', 'Slow endpoints'), ('ticker', 'Slow tickers')):
+        if label in events.columns:
+            rows = events[events[label].notna()]
+            group_by = ('stage', label)
+            print()
+            print(title)
+            print(log_summary(rows, group_by).head(args.top).to_string(index = False))
+
+    if 'bytes' in events.columns and 'endpoint' in events.columns:
+        print()
+        print('Bytes fetched')
+        print(events.groupby('endpoint')['bytes'].sum().sort_values(ascending = False).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
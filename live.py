@@ -0,0 +1,325 @@
+#==============================================================================
+# Intraday Live Mode
+#==============================================================================
+
+# 1, 5 and 15 minute bars of a ticker, polled every few seconds while the
+# Chart page is open. Every live ticker keeps a fixed number of bars in ring
+# buffers, and only the bars after the last one received are asked for. The
+# 5 and 15 minute bars are built from the 1 minute bars, and the indicators
+# of compute() are continued from the last computed row, so an update costs
+# the same whether the page has been open for a minute or for a day.
+#
+# The bars come from Yahoo Finance, or from a simulated tick feed for testing:
+#
+#   python live.py AAPL --interval 5m --updates 20
+
+import sys
+import time
+import zlib
+import argparse
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from indicators import LOOKBACK, compute
+from instrumentation import fetched, stage
+
+# Minutes of every intraday interval
+INTERVALS = {'1m': 1, '5m': 5, '15m': 15}
+
+# Bars kept per live ticker, and seconds between two polls of the feed
+CAPACITY = 500
+POLL = 5
+
+# Live tickers kept, shared by all the sessions viewing them
+MAX_SESSIONS = 20
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+INDICATOR_COLUMNS = list(compute(pd.Series([1.0, 1.0])).columns)
+
+# Periods in minutes of the price waves of the simulated feed
+WAVES = np.array([17.0, 61.0, 233.0, 907.0, 3301.0])
+
+# Yahoo Finance only serves the 1 minute bars of the last days
+YAHOO_MAX_MINUTES = 7 * 24 * 60
+
+#==============================================================================
+# Ring Buffer
+#==============================================================================
+
+class RingBuffer:
+
+    # The last capacity rows of a time series, oldest first. Rows are only
+    # added at the end, a row at the time of the last row replaces it (the
+    # bar still being formed)
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.times = np.zeros(capacity, dtype = 'datetime64[ns]')
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, first, last):
+        return (self.start + np.arange(first, last)) % self.capacity
+
+    def last_time(self):
+        if self.count == 0:
+            return None
+        return self.times[(self.start + self.count - 1) % self.capacity]
+
+    def upsert(self, times, values):
+
+        # Returns the number of rows at the end that were written
+        times = np.asarray(times, dtype = 'datetime64[ns]')
+        values = np.asarray(values, dtype = float).reshape(len(times), len(self.columns))
+        replaced = 0
+        last = self.last_time()
+        if last is not None:
+            newer = times >= last
+            times, values = times[newer], values[newer]
+            if len(times) and times[0] == last:
+                self.values[(self.start + self.count - 1) % self.capacity] = values[0]
+                times, values = times[1:], values[1:]
+                replaced = 1
+
+        times, values = times[-self.capacity:], values[-self.capacity:]
+        n = len(times)
+        if n:
+            positions = (self.start + self.count + np.arange(n)) % self.capacity
+            self.times[positions] = times
+            self.values[positions] = values
+            dropped = max(self.count + n - self.capacity, 0)
+            self.start = (self.start + dropped) % self.capacity
+            self.count = min(self.count + n, self.capacity)
+        return min(replaced + n, self.count)
+
+    def tail(self, rows):
+
+        # Times and values of the last rows, oldest first
+        rows = min(rows, self.count)
+        positions = self._positions(self.count - rows, self.count)
+        return self.times[positions], self.values[positions]
+
+    def frame(self, rows = None):
+        times, values = self.tail(self.count if rows is None else rows)
+        return pd.DataFrame(values, index = pd.DatetimeIndex(times), columns = self.columns)
+
+#==============================================================================
+# Feeds
+#==============================================================================
+
+class SimulatedFeed:
+
+    # Ticks every second, merged into 1 minute bars. The price at the start
+    # of every minute is a fixed function of the minute (a sum of waves with
+    # random phases), and the ticks in between are a random walk pinned to
+    # both ends drawn from the seed of the minute. Any poll sees the same bars,
+    # and the bar of the current minute grows from one poll to the next
+    def __init__(self, seed = 0, clock = time.time, volatility = 0.002, tick_volatility = 0.0003):
+        self.seed = seed
+        self.clock = clock
+        self.volatility = volatility
+        self.tick_volatility = tick_volatility
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _level(self, ticker, minutes):
+        code = zlib.crc32(ticker.upper().encode())
+        phases = np.random.default_rng((code, self.seed)).uniform(0, 2 * np.pi, len(WAVES))
+        waves = np.sin(np.asarray(minutes, dtype = float)[:, None] / WAVES * 2 * np.pi + phases)
+        return (50 + code % 450) * np.exp(self.volatility * (waves * np.sqrt(WAVES)).sum(axis = 1))
+
+    def _ticks(self, ticker, minute, start, end):
+        rng = np.random.default_rng((zlib.crc32(ticker.upper().encode()), self.seed, minute))
+        walk = np.cumsum(rng.normal(0, self.tick_volatility, 60))
+        steps = np.arange(1, 61) / 60
+        path = np.log(start) + (np.log(end) - np.log(start)) * steps + walk - steps * walk[-1]
+        return np.exp(path), rng.integers(100, 5000, 60)
+
+    def poll(self, ticker, since = None, minutes = CAPACITY):
+
+        # 1 minute bars from the minute of since (or the last minutes) to now
+        now = self.clock()
+        current = int(now // 60)
+        seconds = int(now % 60) + 1
+        first = current - minutes + 1 if since is None else int(pd.Timestamp(since).timestamp() // 60)
+        with self._lock:
+            self.calls += 1
+
+        levels = self._level(ticker, np.arange(first, current + 2))
+        rows = []
+        for i, minute in enumerate(range(first, current + 1)):
+            prices, volume = self._ticks(ticker, minute, levels[i], levels[i + 1])
+            if minute == current:
+                prices, volume = prices[:seconds], volume[:seconds]
+            rows.append((levels[i], max(levels[i], prices.max()), min(levels[i], prices.min()),
+                         prices[-1], volume.sum()))
+
+        return pd.DataFrame(rows, columns = BAR_COLUMNS,
+                            index = pd.to_datetime(np.arange(first, current + 1) * 60, unit = 's'))
+
+
+class YahooFeed:
+
+    def poll(self, ticker, since = None, minutes = CAPACITY):
+        from fundamentals import stock_info
+
+        now = pd.Timestamp.now(tz = 'UTC').tz_localize(None)
+        if since is None:
+            start = now - pd.Timedelta(minutes = min(minutes, YAHOO_MAX_MINUTES))
+        else:
+            start = pd.Timestamp(since)
+        try:
+            bars = fetched('intraday', ticker, lambda: stock_info().get_data(
+                ticker, start_date = start, end_date = now + pd.Timedelta(minutes = 1), interval = '1m'))
+        except KeyError:
+            # No bar in the range, e.g. outside market hours
+            return pd.DataFrame(columns = BAR_COLUMNS, index = pd.DatetimeIndex([]))
+        return bars[BAR_COLUMNS].dropna(subset = ['close'])
+
+#==============================================================================
+# Live Ticker
+#==============================================================================
+
+class LiveTicker:
+
+    def __init__(self, ticker, interval = '1m', feed = None, capacity = CAPACITY):
+        self.ticker = ticker
+        self.interval = interval
+        self.minutes = INTERVALS[interval]
+        self.feed = feed or YahooFeed()
+        self.bars = RingBuffer(capacity, BAR_COLUMNS)
+        self.indicators = RingBuffer(capacity, INDICATOR_COLUMNS)
+
+        # The 1 minute bars of the bar being formed
+        self.recent = RingBuffer(self.minutes, BAR_COLUMNS)
+        self.polled = 0.0
+        self.updates = 0
+        self._lock = threading.Lock()
+
+    def _aggregate(self, new):
+
+        # Bars of the buckets touched by the new 1 minute bars, with the
+        # minutes of the first bucket received before
+        if self.minutes == 1:
+            return new
+        rule = str(self.minutes) + 'min'
+        first_bucket = new.index[0].floor(rule)
+        earlier = self.recent.frame()
+        earlier = earlier[(earlier.index >= first_bucket) & (earlier.index < new.index[0])]
+        minutes = pd.concat([earlier, new]) if len(earlier) else new
+        return minutes.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                          'close': 'last', 'volume': 'sum'}).dropna(subset = ['close'])
+
+    def _update_indicators(self, changed):
+
+        # Continued from the indicator row of the bar before the first changed
+        # one, with the prices of the rolling windows before it
+        times, values = self.bars.tail(changed + LOOKBACK)
+        close = pd.Series(values[:, BAR_COLUMNS.index('close')], index = pd.DatetimeIndex(times))
+        first = len(close) - changed
+
+        previous = None
+        if first > 0:
+            indicator_times, indicator_values = self.indicators.tail(2)
+            match = np.nonzero(indicator_times == times[first - 1])[0]
+            if len(match):
+                previous = pd.Series(indicator_values[match[-1]], index = INDICATOR_COLUMNS)
+
+        if previous is None:
+            table = compute(close).iloc[first:]
+        else:
+            table = compute(close.iloc[first:], previous = previous, lookback = close.iloc[:first])
+        self.indicators.upsert(table.index.values, table[INDICATOR_COLUMNS].to_numpy())
+
+    def update(self, min_interval = POLL):
+
+        # Poll the feed for the bars since the last one, at most once every
+        # min_interval seconds for all the sessions viewing the ticker
+        with self._lock:
+            if time.time() - self.polled < min_interval:
+                return 0
+            with stage('live_update', ticker = self.ticker, interval = self.interval):
+                since = self.recent.last_time()
+                new = self.feed.poll(self.ticker, since, minutes = self.bars.capacity * self.minutes)
+                self.polled = time.time()
+                if len(new) == 0:
+                    return 0
+
+                bars = self._aggregate(new)
+                self.recent.upsert(new.index.values, new[BAR_COLUMNS].to_numpy())
+                changed = self.bars.upsert(bars.index.values, bars[BAR_COLUMNS].to_numpy())
+                if changed:
+                    self._update_indicators(changed)
+                self.updates += 1
+                return changed
+
+    def frame(self, overlays = ()):
+        with self._lock:
+            bars = self.bars.frame()
+            indicators = self.indicators.frame()
+        return bars.join(indicators[list(overlays)])
+
+#==============================================================================
+# Shared Live Tickers
+#==============================================================================
+
+_tickers = OrderedDict()
+_tickers_lock = threading.Lock()
+_feeds = {}
+
+
+def get_feed(simulated = False):
+    with _tickers_lock:
+        kind = 'simulated' if simulated else 'yahoo'
+        if kind not in _feeds:
+            _feeds[kind] = SimulatedFeed() if simulated else YahooFeed()
+        return _feeds[kind]
+
+
+def get_live(ticker, interval = '1m', simulated = False):
+
+    # One live ticker per (ticker, interval, feed), the least recently viewed
+    # are dropped first
+    feed = get_feed(simulated)
+    key = (ticker, interval, simulated)
+    with _tickers_lock:
+        live = _tickers.get(key)
+        if live is None:
+            live = _tickers[key] = LiveTicker(ticker, interval, feed)
+        _tickers.move_to_end(key)
+        while len(_tickers) > MAX_SESSIONS:
+            _tickers.popitem(last = False)
+        return live
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Poll the intraday bars of a ticker.')
+    parser.add_argument('ticker')
+    parser.add_argument('--interval', choices = list(INTERVALS), default = '1m')
+    parser.add_argument('--updates', type = int, default = 10)
+    parser.add_argument('--poll', type = float, default = POLL)
+    parser.add_argument('--yahoo', action = 'store_true', help = 'poll Yahoo Finance instead of the simulated feed')
+    args = parser.parse_args(argv)
+
+    live = LiveTicker(args.ticker, args.interval, YahooFeed() if args.yahoo else SimulatedFeed())
+    for i in range(args.updates):
+        start = time.perf_counter()
+        changed = live.update(min_interval = 0)
+        elapsed = time.perf_counter() - start
+        last = live.frame(['SMA_20', 'RSI']).iloc[-1]
+        print('%s  bars %d  changed %d  close %.2f  SMA_20 %.2f  RSI %.1f  %.1f ms'
+              % (live.bars.last_time(), len(live.bars), changed, last['close'], last['SMA_20'],
+                 last['RSI'], elapsed * 1000))
+        time.sleep(args.poll)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#==============================================================================
+# Market Hours
+#==============================================================================
+
+# Regular session of the NYSE, used to tell when a newer daily bar can exist.
+# Between the close and the next open the bars downloaded after the close are
+# complete, during the session the bar of the day changes until the close.
+
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Holidays are not taken into account
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+
+def market_open(now = None):
+    now = datetime.fromtimestamp(time.time() if now is None else now, MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= (now.hour, now.minute) < MARKET_CLOSE
+
+
+def last_close(now = None):
+
+    # Time of the most recent close, as a timestamp
+    now = datetime.fromtimestamp(time.time() if now is None else now, MARKET_TZ)
+    close = now.replace(hour = MARKET_CLOSE[0], minute = MARKET_CLOSE[1], second = 0, microsecond = 0)
+    while close > now or close.weekday() >= 5:
+        close -= timedelta(days = 1)
+    return close.timestamp()
+
+
+def session_missed(refreshed, now = None):
+
+    # A session has closed since the bars were downloaded at refreshed
+    return refreshed < last_close(now)
+
+
+def bars_stale(refreshed, max_age, now = None):
+
+    # The daily bars downloaded at refreshed (a timestamp) miss a closed
+    # session, or the bar of the session under way is older than max_age
+    now = time.time() if now is None else now
+    return session_missed(refreshed, now) or (market_open(now) and now - refreshed > max_age)
@@ -0,0 +1,144 @@
+#==============================================================================
+# Monte Carlo Simulation Engine
+#==============================================================================
+
+import numpy as np
+
+# Number of paths drawn per batch when only the ending prices are needed
+CHUNK_SIZE = 50000
+
+#==============================================================================
+# Price Paths
+#==============================================================================
+
+def simulate_paths(last_price, daily_volatility, simulations, time_horizon,
+                   seed = None, dtype = np.float64):
+
+    # Draw the whole (simulations x time horizon) return matrix in one batch
+    rng = np.random.default_rng(seed)
+    paths = rng.standard_normal((simulations, time_horizon), dtype = dtype)
+
+    # Turn the random returns into growth factors (1 + return) in place
+    paths *= dtype(daily_volatility)
+    paths += 1
+
+    # The cumulative product of the growth factors gives the future prices
+    np.cumprod(paths, axis = 1, out = paths)
+    paths *= dtype(last_price)
+
+    # One column per simulation and one row per day, like the old simulation_df
+    return paths.T
+
+
+def simulate_ending_prices(last_price, daily_volatility, simulations, time_horizon,
+                           seed = None, dtype = np.float64, chunk_size = CHUNK_SIZE):
+
+    # Only keep the last day of every path, so memory stays at one chunk
+    rng = np.random.default_rng(seed)
+    ending_price = np.empty(simulations, dtype = dtype)
+
+    for start in range(0, simulations, chunk_size):
+        stop = min(start + chunk_size, simulations)
+        returns = rng.standard_normal((stop - start, time_horizon), dtype = dtype)
+        returns *= dtype(daily_volatility)
+        returns += 1
+        np.prod(returns, axis = 1, out = ending_price[start:stop])
+
+    ending_price *= dtype(last_price)
+    return ending_price
+
+#==============================================================================
+# Risk Measures
+#==============================================================================
+
+def value_at_risk(last_price, ending_price, confidence = 0.95):
+
+    # Price at the given confidence interval
+    future_price_ci = np.percentile(ending_price, (1 - confidence) * 100)
+
+    return float(last_price - future_price_ci)
+
+
+def simulate_var(last_price, daily_volatility, simulations, time_horizon,
+                 confidence = 0.95, seed = None, dtype = np.float64):
+
+    # Ending prices and Value at Risk without building the full path matrix
+    ending_price = simulate_ending_prices(last_price, daily_volatility, simulations,
+                                          time_horizon, seed = seed, dtype = dtype)
+
+    return ending_price, value_at_risk(last_price, ending_price, confidence)
+
+
+def conditional_value_at_risk(last_price, ending_price, confidence = 0.95):
+
+    # Average loss in the worst (1 - confidence) of the simulations
+    future_price_ci = np.percentile(ending_price, (1 - confidence) * 100)
+    tail = ending_price[ending_price <= future_price_ci]
+
+    return float(last_price - tail.mean())
+
+#==============================================================================
+# Portfolio Simulation
+#==============================================================================
+
+# Memory used by the random shocks of one chunk of portfolio paths
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def cholesky_factor(cov):
+
+    # Lower triangular factor of the covariance matrix. A matrix which is not
+    # positive definite (e.g. two identical assets) has its negative
+    # eigenvalues clipped to zero first
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+def simulate_portfolio(daily_returns, weights, simulations, time_horizon,
+                       portfolio_value = 1.0, confidence_levels = (0.95, 0.99),
+                       seed = None, dtype = np.float32, chunk_bytes = CHUNK_BYTES):
+
+    # daily_returns is the aligned (days x assets) return history, the rows
+    # with a missing return are dropped
+    returns = np.asarray(daily_returns, dtype = float)
+    returns = returns[~np.isnan(returns).any(axis = 1)]
+    weights = np.asarray(weights, dtype = float)
+    weights = weights / weights.sum()
+
+    # Correlated shocks around 0, like the single ticker simulation
+    cov = np.atleast_2d(np.cov(returns, rowvar = False))
+    factor = cholesky_factor(cov).T.astype(dtype)
+    assets = len(weights)
+
+    # Chunks of paths, so memory stays bounded whatever the number of paths
+    rng = np.random.default_rng(seed)
+    chunk_size = max(int(chunk_bytes // (time_horizon * assets * np.dtype(dtype).itemsize)), 1)
+    chunk_size = min(chunk_size, simulations)
+    ending_value = np.empty(simulations, dtype = float)
+
+    # The draws and the correlated shocks reuse the same two buffers
+    draws = np.empty((chunk_size * time_horizon, assets), dtype = dtype)
+    shocks = np.empty_like(draws)
+
+    for start in range(0, simulations, chunk_size):
+        size = min(chunk_size, simulations - start)
+        rows = size * time_horizon
+        rng.standard_normal(out = draws[:rows], dtype = dtype)
+        np.matmul(draws[:rows], factor, out = shocks[:rows])
+        shocks[:rows] += 1
+
+        # Buy and hold, every asset grows with its own path
+        growth = np.prod(shocks[:rows].reshape(size, time_horizon, assets), axis = 1)
+        ending_value[start:start + size] = growth @ weights
+
+    ending_value *= portfolio_value
+
+    risk = {}
+    for confidence in confidence_levels:
+        risk[confidence] = {'VaR': value_at_risk(portfolio_value, ending_value, confidence),
+                            'CVaR': conditional_value_at_risk(portfolio_value, ending_value, confidence)}
+
+    return ending_value, risk
@@ -0,0 +1,228 @@
+#==============================================================================
+# Bulk Prefetcher for the S&P 500 Universe
+#==============================================================================
+
+# Warms the price store (and optionally the quote tables, read by the
+# dashboard on the first request of a ticker) for every constituent before
+# market open:
+#
+#   python prefetch.py                     # whole S&P 500 from Yahoo Finance
+#   python prefetch.py AAPL MSFT --quotes  # a few tickers, with quote tables
+#   python prefetch.py --offline           # local stand-in, for benchmarking
+#
+# It also loads every dataset of the tabs in the background as soon as a
+# ticker is selected in the dashboard (prefetch_ticker).
+
+import sys
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import fundamentals as fd
+from price_store import PriceStore
+from shared_store import SharedStore, get_shared_store
+from statements import get_statement
+from indicators import get_indicators
+
+#==============================================================================
+# Rate Limiting and Retries
+#==============================================================================
+
+class RateLimiter:
+
+    # Token bucket shared by all worker threads
+    def __init__(self, rate, burst = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def with_retries(func, limiter = None, retries = 3, backoff = 0.5):
+
+    # Exponential backoff with jitter, the last error is raised
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+
+#==============================================================================
+# Prefetcher
+#==============================================================================
+
+def prefetch_universe(tickers, shared = None, source = None, quotes = False,
+                      max_workers = 8, rate = 10.0, retries = 3, backoff = 0.5,
+                      progress = None, quote_root = None):
+
+    # shared is the shared store the dashboard reads (shared_store.py)
+    if source is None:
+        from fundamentals import stock_info
+        source = stock_info()
+    if shared is None:
+        shared = get_shared_store()
+
+    limiter = RateLimiter(rate, burst = max_workers)
+    failed = {}
+    done = 0
+    started = time.perf_counter()
+
+    def load(ticker):
+        # Full daily history published for the dashboard, only what is
+        # missing is downloaded
+        with_retries(lambda: shared.download(ticker, '1d'), limiter, retries, backoff)
+        if quotes:
+            quote = with_retries(lambda: source.get_quote_table(ticker), limiter, retries, backoff)
+            fd.save_quote(ticker, quote, quote_root)
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = {executor.submit(load, tick): tick for tick in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            error = future.exception()
+            if error is not None:
+                failed[ticker] = repr(error)
+            done += 1
+            if progress is not None:
+                progress(done, len(tickers), ticker, error is None)
+
+    return {'tickers': len(tickers),
+            'failed': failed,
+            'seconds': time.perf_counter() - started}
+
+#==============================================================================
+# Command Line
+#==============================================================================
+
+def print_progress(done, total, ticker, ok):
+    status = 'ok' if ok else 'FAILED'
+    sys.stderr.write('\r[{}/{}] {:<6} {:<6}'.format(done, total, ticker, status))
+    if done == total:
+        sys.stderr.write('\n')
+
+
+#==============================================================================
+# Ticker Prefetch
+#==============================================================================
+
+# Dataset of every tab, loaded into the caches when a ticker is selected. The
+# tabs read the same caches, a tab opened while its dataset is still loading
+# waits for the same request instead of sending another one
+TICKER_DATASETS = {'quote': fd.get_quote_table,
+                   'prices': get_indicators,
+                   'stats': fd.get_stats,
+                   'valuation': fd.get_stats_valuation,
+                   ('income_statement', True): lambda ticker: get_statement(ticker, 'income_statement', True),
+                   ('income_statement', False): lambda ticker: get_statement(ticker, 'income_statement', False),
+                   ('balance_sheet', True): lambda ticker: get_statement(ticker, 'balance_sheet', True),
+                   ('balance_sheet', False): lambda ticker: get_statement(ticker, 'balance_sheet', False),
+                   ('cash_flow', True): lambda ticker: get_statement(ticker, 'cash_flow', True),
+                   ('cash_flow', False): lambda ticker: get_statement(ticker, 'cash_flow', False),
+                   'analysts': fd.get_analysts_info,
+                   'company': fd.get_company_info}
+
+# Threads shared by all sessions, and seconds before a ticker is prefetched again
+TICKER_WORKERS = 8
+PREFETCH_AGAIN = 60
+
+# Tickers whose prefetch is remembered
+MAX_PREFETCHED = 20
+
+_ticker_executor = ThreadPoolExecutor(max_workers = TICKER_WORKERS, thread_name_prefix = 'ticker-prefetch')
+_prefetched = {}
+_prefetched_lock = threading.Lock()
+
+
+def prefetch_ticker(ticker):
+
+    # Start loading every dataset of the ticker, at most once a minute. The
+    # reruns of the same page don't submit anything
+    with _prefetched_lock:
+        entry = _prefetched.get(ticker)
+        if entry is not None and time.time() - entry[0] < PREFETCH_AGAIN:
+            return entry[1]
+
+        futures = {dataset: _ticker_executor.submit(loader, ticker)
+                   for dataset, loader in TICKER_DATASETS.items()}
+        _prefetched.pop(ticker, None)
+        _prefetched[ticker] = (time.time(), futures)
+        while len(_prefetched) > MAX_PREFETCHED:
+            del _prefetched[next(iter(_prefetched))]
+        return futures
+
+
+def pending(ticker, dataset):
+
+    # The prefetch of the dataset when it is running, else None. A prefetch
+    # still queued (e.g. behind the prefetches of other sessions) is
+    # cancelled, the page loads the dataset itself through the same caches
+    with _prefetched_lock:
+        entry = _prefetched.get(ticker)
+    if entry is None:
+        return None
+    future = entry[1].get(dataset)
+    if future is None or future.done() or future.cancel():
+        return None
+    return future
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Prefetch S&P 500 price histories into the local store.')
+    parser.add_argument('tickers', nargs = '*', help = 'tickers to load, default is the whole S&P 500')
+    parser.add_argument('--quotes', action = 'store_true', help = 'also load the quote tables')
+    parser.add_argument('--workers', type = int, default = 8)
+    parser.add_argument('--rate', type = float, default = 10.0, help = 'requests per second')
+    parser.add_argument('--retries', type = int, default = 3)
+    parser.add_argument('--data-dir', default = None)
+    parser.add_argument('--offline', action = 'store_true', help = 'use the local stand-in data source')
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'simulated latency with --offline')
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        from fake_source import FakeSource
+        source = FakeSource(latency = args.latency)
+        tickers = args.tickers or source.tickers_sp500()
+    else:
+        import yahoo_fin.stock_info as si
+        from universe import load_tickers
+        source = si
+        tickers = args.tickers or load_tickers()
+
+    shared = SharedStore(args.data_dir, PriceStore(args.data_dir, fetch = source.get_data))
+
+    result = prefetch_universe(tickers, shared, source, quotes = args.quotes,
+                               max_workers = args.workers, rate = args.rate,
+                               retries = args.retries, progress = print_progress,
+                               quote_root = args.data_dir)
+
+    print('Loaded {} tickers in {:.1f} s ({:.1f} tickers/s), {} failed'.format(
+        result['tickers'], result['seconds'], result['tickers'] / result['seconds'],
+        len(result['failed'])))
+    for ticker, error in result['failed'].items():
+        print('  ' + ticker + ': ' + error)
+
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
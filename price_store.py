@@ -0,0 +1,230 @@
+#==============================================================================
+# Persistent OHLCV Price Store
+#==============================================================================
+
+# Price histories are kept on disk as one Parquet file per ticker and interval:
+#
+#   <data dir>/prices/interval=1d/AAPL.parquet
+#   <data dir>/prices/interval=1d/AAPL.json     (covered date range)
+#
+# A request for a date range only downloads the dates that are missing before
+# the first stored bar and after the last stored bar, then appends them. When
+# the source fails, the stored bars are served and the gap is filled later.
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from instrumentation import fetched
+from market_hours import bars_stale
+
+# Root folder of the local data, can be moved with an environment variable
+DATA_DIR = os.environ.get('DASHBOARD_DATA_DIR',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+# Seconds before the bar of the session under way is downloaded again. Out
+# of market hours, the bars downloaded after the close are kept until the
+# next close
+REFRESH_AFTER = 15 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    pass
+
+#==============================================================================
+# Helpers
+#==============================================================================
+
+def _to_timestamp(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value).normalize()
+
+
+def _to_iso(value):
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+def _from_iso(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value)
+
+
+def default_fetch(ticker, start_date = None, end_date = None, interval = '1d'):
+    from fundamentals import stock_info
+    return stock_info().get_data(ticker, start_date, end_date, interval = interval)
+
+#==============================================================================
+# Price Store
+#==============================================================================
+
+class PriceStore:
+
+    def __init__(self, root = None, fetch = None):
+        self.root = os.path.join(root or DATA_DIR, 'prices')
+        self.fetch = fetch or default_fetch
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    # File locations
+    def _path(self, ticker, interval):
+        return os.path.join(self.root, 'interval=' + interval, ticker.upper() + '.parquet')
+
+    def _meta_path(self, ticker, interval):
+        return os.path.join(self.root, 'interval=' + interval, ticker.upper() + '.json')
+
+    # One lock per (ticker, interval), so different tickers can be written in parallel
+    def _lock(self, ticker, interval):
+        with self._locks_lock:
+            key = (ticker.upper(), interval)
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def read(self, ticker, interval = '1d'):
+
+        # Read the stored bars and the covered date range
+        path = self._path(ticker, interval)
+        meta_path = self._meta_path(ticker, interval)
+        if not os.path.exists(path) or not os.path.exists(meta_path):
+            return None, None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta = {key: _from_iso(value) for key, value in meta.items()}
+
+        return pd.read_parquet(path), meta
+
+    def write(self, ticker, interval, df, meta):
+
+        # Write to temporary files first, so readers never see half a file
+        path = self._path(ticker, interval)
+        meta_path = self._meta_path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        df.to_parquet(path + '.tmp')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({key: _to_iso(value) for key, value in meta.items()}, f)
+
+        os.replace(path + '.tmp', path)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _fetch(self, ticker, start, end, interval):
+        return fetched('prices', ticker, lambda: self.fetch(ticker, start, end, interval = interval))
+
+    def _download(self, ticker, start, end, interval):
+
+        # A range without any bar (before the listing date, a weekend, ...)
+        # makes the source fail on the missing timestamps
+        try:
+            return self._fetch(ticker, start, end, interval)
+        except KeyError:
+            return None
+        except Exception as error:
+            raise FetchError('{} {} bars from {} to {}: {!r}'.format(ticker, interval, start, end, error)) from error
+
+    def get(self, ticker, start_date = None, end_date = None, interval = '1d', refresh = False,
+            fallback = True):
+
+        # refresh downloads the latest bar again even when it is recent. When
+        # a gap can't be downloaded the stored bars are returned (fallback),
+        # unless refresh or fallback is False, then FetchError is raised
+
+        start = _to_timestamp(start_date)
+        end = _to_timestamp(end_date)
+        today = pd.Timestamp(datetime.today().date())
+
+        # The end date is exclusive, like si.get_data, None means up to today
+        fetch_end = end if end is not None else today + timedelta(days = 1)
+
+        with self._lock(ticker, interval):
+            df, meta = self.read(ticker, interval)
+            now = pd.Timestamp(datetime.now())
+
+            if df is None:
+                # Nothing stored yet, download the whole requested range
+                df = self._fetch(ticker, start, fetch_end, interval)
+                meta = {'start': start, 'end': fetch_end, 'refreshed': now}
+                self.write(ticker, interval, df, meta)
+
+            else:
+                pieces = [df]
+                changed = False
+
+                try:
+                    # Leading gap, dates before the first covered date
+                    if meta['start'] is not None and (start is None or start < meta['start']):
+                        lead = self._download(ticker, start, meta['start'], interval)
+                        if lead is not None:
+                            pieces.insert(0, lead)
+                        meta['start'] = start
+                        changed = True
+
+                    # Trailing gap, dates after the last covered date. When the
+                    # bars were stored up to the day of the download, only a
+                    # newer bar can be missing. The last stored bar is downloaded
+                    # again, it may have been incomplete
+                    refreshed = meta['refreshed'].normalize()
+                    if meta['end'] > refreshed:
+                        stale = refresh or bars_stale(meta['refreshed'].to_pydatetime().timestamp(), REFRESH_AFTER)
+                        missing = fetch_end > refreshed and stale
+                    else:
+                        missing = fetch_end > meta['end']
+                    if missing:
+                        last_bar = df.index[-1] if len(df) else meta['end']
+                        trail = self._download(ticker, last_bar, fetch_end, interval)
+                        if trail is not None:
+                            pieces.append(trail)
+                        meta['end'] = max(meta['end'], fetch_end)
+                        meta['refreshed'] = now
+                        changed = True
+
+                except FetchError as error:
+                    if refresh or not fallback:
+                        raise
+                    # Keep what was downloaded, the rest is tried again on a later read
+                    logger.warning('Serving the stored bars, could not download %s', error)
+
+                if changed:
+                    df = pd.concat(pieces)
+                    df = df[~df.index.duplicated(keep = 'last')].sort_index()
+                    self.write(ticker, interval, df, meta)
+
+        # Return only the requested window
+        if start is not None:
+            df = df[df.index >= start]
+        if end is not None:
+            df = df[df.index < end]
+        return df
+
+#==============================================================================
+# Shared Store
+#==============================================================================
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore()
+        return _store
+
+
+def set_store(store = None):
+
+    # Replace the shared store, e.g. by one reading a local stand-in source
+    global _store
+    with _store_lock:
+        _store = store
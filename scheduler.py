@@ -0,0 +1,244 @@
+#==============================================================================
+# Background Refresh Scheduler
+#==============================================================================
+
+# Keeps the cached data of the recently viewed tickers fresh from a background
+# thread, so the pages read it from the caches instead of waiting on Yahoo.
+# Every dataset has its own cadence during and outside market hours, the
+# quotes and the daily bars are refreshed once more after the close, and the
+# most recently viewed tickers are refreshed first. Only the datasets already
+# in the caches are refreshed, a ticker nobody looked at costs nothing.
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import fundamentals as fd
+import history
+import statements
+from fundamentals import MINUTE, HOUR, DAY
+from market_hours import last_close, market_open
+from prefetch import RateLimiter
+
+# Seconds between two refreshes (during market hours, outside market hours),
+# None means the scheduler leaves the dataset alone at that time
+CADENCES = {'quote': (MINUTE, None),
+            'prices': (15 * MINUTE, None),
+            'stats': (6 * HOUR, DAY),
+            'valuation': (6 * HOUR, DAY),
+            'analysts': (DAY, DAY),
+            'income_statement': (7 * DAY, 7 * DAY),
+            'balance_sheet': (7 * DAY, 7 * DAY),
+            'cash_flow': (7 * DAY, 7 * DAY),
+            'company': (7 * DAY, 7 * DAY)}
+
+# Refreshed once after the close, for the closing quote and daily bar
+AFTER_CLOSE = ('quote', 'prices')
+
+# Names shown in the Data Age panel
+DATASET_NAMES = {'quote': 'Quote',
+                 'prices': 'Prices',
+                 'stats': 'Statistics',
+                 'valuation': 'Valuation',
+                 'analysts': 'Analysis',
+                 'income_statement': 'Income Statement',
+                 'balance_sheet': 'Balance Sheet',
+                 'cash_flow': 'Cash Flow',
+                 'company': 'Company Profile'}
+
+# Number of recently viewed tickers kept fresh, and for how long
+RECENT_TICKERS = 50
+VIEW_EXPIRY = DAY
+
+# Seconds between two scans, and requests per second sent to the source
+TICK = 5
+RATE = 2.0
+
+# Seconds before a failed refresh is tried again, doubled after every failure
+# in a row up to MAX_BACKOFF
+BACKOFF = MINUTE
+MAX_BACKOFF = HOUR
+
+#==============================================================================
+# Due Datasets
+#==============================================================================
+
+def is_due(dataset, age, now = None):
+
+    # age is the seconds since the last download, None when not cached
+    if age is None:
+        return False
+    now = time.time() if now is None else now
+    is_open = market_open(now)
+    cadence = CADENCES[dataset][0 if is_open else 1]
+    if cadence is not None and age >= cadence:
+        return True
+    return dataset in AFTER_CLOSE and not is_open and now - age < last_close(now)
+
+
+def backoff(failures):
+    return min(BACKOFF * 2 ** (failures - 1), MAX_BACKOFF)
+
+
+def format_age(age):
+    if age is None:
+        return '-'
+    if age < MINUTE:
+        return str(int(age)) + ' s'
+    if age < HOUR:
+        return str(int(age // MINUTE)) + ' min'
+    if age < DAY:
+        return str(int(age // HOUR)) + ' h'
+    return str(int(age // DAY)) + ' d'
+
+#==============================================================================
+# Datasets
+#==============================================================================
+
+def datasets(ticker):
+
+    # Every (dataset, params) of a ticker with the age of its cached copy
+    items = [('prices', (), history.age(ticker))]
+    for dataset in CADENCES:
+        if dataset == 'prices':
+            continue
+        if dataset in statements.STATEMENTS:
+            for yearly in (True, False):
+                items.append((dataset, (yearly,), fd.age(dataset, ticker, yearly)))
+        else:
+            items.append((dataset, (), fd.age(dataset, ticker)))
+    return items
+
+
+def refresh_dataset(ticker, dataset, params = ()):
+    if dataset == 'prices':
+        history.refresh(ticker)
+    else:
+        fd.refresh(dataset, ticker, *params)
+
+
+def dataset_name(dataset, params = ()):
+    name = DATASET_NAMES[dataset]
+    if params:
+        name += ' (' + ('annual' if params[0] else 'quarterly') + ')'
+    return name
+
+
+def dataset_ages(ticker):
+
+    # Age of every cached dataset of the ticker, for the Data Age panel
+    rows = []
+    for dataset, params, age in datasets(ticker):
+        if age is None:
+            continue
+        rows.append({'Dataset': dataset_name(dataset, params), 'Age': format_age(age)})
+    return pd.DataFrame(rows, columns = ['Dataset', 'Age'])
+
+#==============================================================================
+# Scheduler
+#==============================================================================
+
+class Scheduler:
+
+    def __init__(self, tick = TICK, rate = RATE, recent_tickers = RECENT_TICKERS):
+        self.tick = tick
+        self.recent_tickers = recent_tickers
+        self.limiter = RateLimiter(rate, burst = 1)
+        self.refreshed = 0
+        # (ticker, dataset, params): (error, failures in a row, retry time)
+        self.failed = {}
+        self._viewed = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def viewed(self, ticker):
+
+        # Most recently viewed tickers last
+        with self._lock:
+            self._viewed[ticker] = time.time()
+            self._viewed.move_to_end(ticker)
+            while len(self._viewed) > self.recent_tickers:
+                self._viewed.popitem(last = False)
+
+    def recent(self, now = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for ticker in [tick for tick, seen in self._viewed.items() if now - seen > VIEW_EXPIRY]:
+                del self._viewed[ticker]
+            return list(reversed(self._viewed))
+
+    def due(self, now = None):
+
+        # Due datasets, the most recently viewed tickers first
+        now = time.time() if now is None else now
+        return [(ticker, dataset, params) for ticker in self.recent(now)
+                for dataset, params, age in datasets(ticker) if is_due(dataset, age, now)]
+
+    def run_once(self, now = None):
+        now = time.time() if now is None else now
+        for ticker, dataset, params in self.due(now):
+            if self._stop.is_set():
+                return
+            key = (ticker, dataset, params)
+            if key in self.failed and now < self.failed[key][2]:
+                continue
+            self.limiter.acquire()
+            try:
+                refresh_dataset(ticker, dataset, params)
+                self.refreshed += 1
+                self.failed.pop(key, None)
+            except Exception as error:
+                # Tried again after the backoff, the cached copy is kept
+                failures = self.failed[key][1] + 1 if key in self.failed else 1
+                self.failed[key] = (repr(error), failures, now + backoff(failures))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.tick)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._loop, name = 'refresh-scheduler', daemon = True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+#==============================================================================
+# Shared Scheduler
+#==============================================================================
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+
+    # One scheduler per server process, shared by all sessions
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+            _scheduler.start()
+        return _scheduler
+
+
+def refresh_ticker(ticker, max_workers = 4):
+
+    # Refresh every cached dataset of the ticker now (the Refresh Data button),
+    # the prices are always downloaded. Returns the name and the error of
+    # every dataset that could not be refreshed
+    items = [(dataset, params) for dataset, params, age in datasets(ticker)
+             if age is not None or dataset == 'prices']
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(refresh_dataset, ticker, dataset, params) for dataset, params in items]
+    return [(dataset_name(dataset, params), future.exception())
+            for (dataset, params), future in zip(items, futures) if future.exception() is not None]
@@ -0,0 +1,307 @@
+#==============================================================================
+# Cross-Sectional Screener
+#==============================================================================
+
+# One row per constituent with the numeric fields of the quote table, the
+# valuation measures and the statistics table, kept as a Parquet file. The
+# table is built by a bulk fetch through the fundamentals cache, never while
+# a query runs (the dashboard builds it on a background thread):
+#
+#   python screener.py           # build the table for the whole S&P 500
+#   python screener.py AAPL MSFT
+#
+# The tickers that could not be loaded are saved next to the table.
+
+import os
+import re
+import sys
+import json
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from price_store import DATA_DIR
+
+SCREENER_PATH = os.path.join(DATA_DIR, 'screener.parquet')
+
+# Number format of Yahoo Finance, e.g. "2.45T", "-1,234.5", "12.30%"
+NUMBER_PATTERN = re.compile(r'^\s*([-+]?[\d,]*\.?\d+(?:[eE][-+]?\d+)?)\s*([kKMBT%]?)\s*$')
+SUFFIXES = {'': 1.0, 'k': 1e3, 'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12, '%': 0.01}
+
+# Footnote numbers at the end of the Yahoo Finance attribute names
+FOOTNOTE_PATTERN = re.compile(r'\s+\d+$')
+
+OPERATORS = {'<': operator.lt,
+             '<=': operator.le,
+             '>': operator.gt,
+             '>=': operator.ge,
+             '=': operator.eq}
+
+#==============================================================================
+# Parsing
+#==============================================================================
+
+def parse_numbers(values):
+
+    # Vectorized parsing of a column of Yahoo Finance numbers, NaN if not a number
+    text = pd.Series(values, dtype = object).astype(str)
+    parts = text.str.extract(NUMBER_PATTERN)
+    number = pd.to_numeric(parts[0].str.replace(',', '', regex = False), errors = 'coerce')
+    scale = parts[1].fillna('').map(SUFFIXES).astype(float)
+    return (number * scale).to_numpy(dtype = float)
+
+
+def parse_number(value):
+    return parse_numbers([value])[0]
+
+
+def ticker_fields(quote, stat = None, stat_val = None):
+
+    # All the raw fields of one ticker in a single dict
+    fields = dict(quote)
+    for table in (stat_val, stat):
+        if table is not None:
+            for attribute, value in zip(table.iloc[:, 0], table.iloc[:, 1]):
+                fields[FOOTNOTE_PATTERN.sub('', str(attribute))] = value
+    return fields
+
+
+def build_table(fields, universe = None):
+
+    # One row per ticker, every column parsed at once
+    raw = pd.DataFrame.from_dict(fields, orient = 'index')
+    table = pd.DataFrame({column: parse_numbers(raw[column].to_numpy()) for column in raw.columns},
+                         index = raw.index)
+
+    # Keep the columns with at least one number
+    table = table.loc[:, table.notna().any()]
+    table.index.name = 'ticker'
+
+    if universe is not None:
+        info = universe.set_index('ticker')[['name', 'sector']]
+        table = info.reindex(table.index).join(table)
+    return table
+
+#==============================================================================
+# Screener
+#==============================================================================
+
+class Screener:
+
+    # failed is the error of every ticker missing from the table
+    def __init__(self, table, failed = None):
+        self.table = table
+        self.failed = failed or {}
+        self.numeric = [column for column in table.columns if table[column].dtype.kind == 'f']
+        self._values = {}
+        self._order = {}
+        self._sorted = {}
+        self._ranks = {}
+
+        # Sort index and percentile ranks of every numeric column, computed once
+        for column in self.numeric:
+            values = table[column].to_numpy()
+            order = np.argsort(values, kind = 'stable')
+            self._values[column] = values
+            self._order[column] = order
+            self._sorted[column] = values[order]
+            self._ranks[column] = table[column].rank(pct = True).to_numpy()
+
+    def __len__(self):
+        return len(self.table)
+
+    def _match(self, column, op, value):
+
+        # Binary search on the sorted column, NaN values are sorted last
+        sorted_values = self._sorted[column]
+        valid = np.count_nonzero(~np.isnan(sorted_values))
+        if op == '<':
+            first, last = 0, np.searchsorted(sorted_values[:valid], value, 'left')
+        elif op == '<=':
+            first, last = 0, np.searchsorted(sorted_values[:valid], value, 'right')
+        elif op == '>':
+            first, last = np.searchsorted(sorted_values[:valid], value, 'right'), valid
+        elif op == '>=':
+            first, last = np.searchsorted(sorted_values[:valid], value, 'left'), valid
+        else:
+            first = np.searchsorted(sorted_values[:valid], value, 'left')
+            last = np.searchsorted(sorted_values[:valid], value, 'right')
+
+        mask = np.zeros(len(self.table), dtype = bool)
+        mask[self._order[column][first:last]] = True
+        return mask
+
+    def mask(self, conditions):
+        mask = np.ones(len(self.table), dtype = bool)
+        for column, op, value in conditions:
+            mask &= self._match(column, op, value)
+        return mask
+
+    def query(self, conditions = (), sort_by = None, ascending = True, limit = None,
+              columns = None, ranks = False):
+
+        # conditions is a list of (column, operator, value), e.g. ('PE Ratio (TTM)', '<', 20)
+        mask = self.mask(conditions)
+
+        # Walk the precomputed sort index instead of sorting the result
+        if sort_by is not None:
+            order = self._order[sort_by]
+            if not ascending:
+                valid = np.count_nonzero(~np.isnan(self._sorted[sort_by]))
+                order = np.concatenate([order[:valid][::-1], order[valid:]])
+            rows = order[mask[order]]
+        else:
+            rows = np.flatnonzero(mask)
+
+        if limit is not None:
+            rows = rows[:limit]
+
+        result = self.table.iloc[rows]
+        if columns is not None:
+            result = result[columns]
+        if ranks:
+            result = result.copy()
+            for column in (columns or self.numeric):
+                if column in self._ranks:
+                    result[column + ' (pct)'] = self._ranks[column][rows]
+        return result
+
+    def percentile(self, column):
+        return pd.Series(self._ranks[column], index = self.table.index)
+
+#==============================================================================
+# Building and Loading
+#==============================================================================
+
+_screener = None
+_loaded = None
+_lock = threading.Lock()
+
+
+def failures_path(path = None):
+    return os.path.splitext(path or SCREENER_PATH)[0] + '_failed.json'
+
+
+def fetch_fields(tickers, max_workers = 8, progress = None):
+
+    # Bulk fetch through the fundamentals cache. Returns the fields of the
+    # tickers loaded and the error of the ones that failed
+    import fundamentals as fd
+    from prefetch import RateLimiter, with_retries
+
+    limiter = RateLimiter(10.0, burst = max_workers)
+
+    def load(ticker):
+        quote = with_retries(lambda: fd.get_quote_table(ticker), limiter)
+        stat = with_retries(lambda: fd.get_stats(ticker), limiter)
+        stat_val = with_retries(lambda: fd.get_stats_valuation(ticker), limiter)
+        return ticker_fields(quote, stat, stat_val)
+
+    fields = {}
+    failed = {}
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = {executor.submit(load, tick): tick for tick in tickers}
+        for done, future in enumerate(as_completed(futures), 1):
+            if future.exception() is None:
+                fields[futures[future]] = future.result()
+            else:
+                failed[futures[future]] = repr(future.exception())
+            if progress is not None:
+                progress(done, len(tickers))
+    return fields, failed
+
+
+def build_screener(tickers = None, path = None, progress = None):
+    from universe import load_universe
+
+    path = path or SCREENER_PATH
+
+    universe = load_universe()
+    if tickers is None:
+        tickers = universe['ticker'].tolist()
+
+    fields, failed = fetch_fields(tickers, progress = progress)
+    if not fields:
+        # Keep the previous table
+        raise RuntimeError('None of the {} tickers could be loaded'.format(len(tickers)))
+
+    table = build_table(fields, universe)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(failures_path(path) + '.tmp', 'w') as f:
+        json.dump(failed, f)
+    table.to_parquet(path + '.tmp')
+    os.replace(failures_path(path) + '.tmp', failures_path(path))
+    os.replace(path + '.tmp', path)
+
+    invalidate()
+    return table, failed
+
+
+def load_screener(path = None):
+    global _screener, _loaded
+
+    # Reloaded only when the Parquet file was rebuilt
+    path = path or SCREENER_PATH
+    if not os.path.exists(path):
+        return None
+    modified = os.path.getmtime(path)
+    with _lock:
+        if _screener is None or _loaded != modified:
+            try:
+                with open(failures_path(path)) as f:
+                    failed = json.load(f)
+            except (OSError, ValueError):
+                failed = {}
+            _screener = Screener(pd.read_parquet(path), failed)
+            _loaded = modified
+        return _screener
+
+
+def invalidate():
+    global _screener
+    with _lock:
+        _screener = None
+
+
+#==============================================================================
+# Background Build
+#==============================================================================
+
+# One build at a time for all the sessions, on a thread of its own. The
+# status is a dict with the progress (done, total) and the future of the build
+_builder = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'screener-build')
+_build = None
+_build_lock = threading.Lock()
+
+
+def start_build(tickers = None, path = None):
+
+    # Status of the build, a new one is only started when none is running
+    global _build
+    with _build_lock:
+        if _build is None or _build['future'].done():
+            status = {'done': 0, 'total': 0}
+
+            def progress(done, total):
+                status['done'], status['total'] = done, total
+
+            status['future'] = _builder.submit(build_screener, tickers, path, progress)
+            _build = status
+        return _build
+
+
+def build_status():
+
+    # Status of the last build started, None if there was none
+    with _build_lock:
+        return _build
+
+
+if __name__ == '__main__':
+    table, failed = build_screener(sys.argv[1:] or None)
+    print('Saved {} tickers and {} fields to {}'.format(len(table), table.shape[1], SCREENER_PATH))
+    for ticker, error in sorted(failed.items()):
+        print('  ' + ticker + ': ' + error)
@@ -0,0 +1,301 @@
+#==============================================================================
+# Shared Memory-Mapped Price Store
+#==============================================================================
+
+# Several Streamlit server processes can serve the dashboard behind a load
+# balancer. The daily histories are published once, as one NumPy file per
+# column, and every process maps the same files read-only: the pages live in
+# the page cache of the machine once, whatever the number of processes.
+#
+#   <data dir>/shared/interval=1d/AAPL/v000003/manifest.json
+#   <data dir>/shared/interval=1d/AAPL/v000003/close.npy
+#
+# Every publication is written to a folder of its own and renamed to the next
+# version folder once complete, so a version folder is never half written,
+# even by a publisher whose lock was taken over. A reader opens the latest
+# version and picks up a newer one (e.g. with the bars appended after the
+# close) on its next read, without a restart. The bars published after the
+# close are served until the next open, during the session the bar of the day
+# is downloaded again in the background. A lock file makes sure only one
+# process downloads a ticker at a time, the others wait for it and map what it
+# published. When the download fails, the published version is served until
+# the next attempt.
+
+import os
+import json
+import errno
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compact import PRICE_COLUMNS, arrays_frame, compact_arrays
+from market_hours import bars_stale, session_missed
+from price_store import DATA_DIR, REFRESH_AFTER, FetchError, get_store
+
+# Columns published, in the order of Yahoo Finance
+COLUMNS = PRICE_COLUMNS + ['volume']
+
+# A publication this recent is not downloaded again, even when asked to
+# refresh (another process has just done it)
+RECENT = 60
+
+# Seconds after which the lock of a crashed process is taken over
+LOCK_TIMEOUT = 120
+
+# Older versions kept for the readers still mapping them
+KEEP_VERSIONS = 2
+
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# Lock File
+#==============================================================================
+
+class FileLock:
+
+    # Lock shared by the processes of the machine, created atomically
+    def __init__(self, path, timeout = LOCK_TIMEOUT, poll = 0.05):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.timeout:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(self.poll)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+#==============================================================================
+# Shared Store
+#==============================================================================
+
+class SharedStore:
+
+    def __init__(self, root = None, store = None):
+        self.root = os.path.join(root or DATA_DIR, 'shared')
+        self.store = store
+        self._open = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers = 2, thread_name_prefix = 'shared-store')
+
+    # File locations
+    def _folder(self, ticker, interval):
+        return os.path.join(self.root, 'interval=' + interval, ticker.upper())
+
+    def _versions(self, folder):
+        try:
+            return [int(name[1:]) for name in os.listdir(folder) if name.startswith('v') and name[1:].isdigit()]
+        except OSError:
+            return []
+
+    def manifest(self, ticker, interval = '1d'):
+
+        # Manifest of the latest version, every version folder is complete
+        folder = self._folder(ticker, interval)
+        for version in sorted(self._versions(folder), reverse = True):
+            name = 'v%06d' % version
+            try:
+                with open(os.path.join(folder, name, 'manifest.json')) as f:
+                    return dict(json.load(f), version = version, path = name)
+            except (OSError, ValueError):
+                # Removed meanwhile
+                continue
+        return None
+
+    def publish(self, ticker, df, interval = '1d'):
+
+        # Write the arrays and the manifest to a folder of this publication
+        # only, then rename it to the next version. Called with the lock of the
+        # ticker held, but a lock taken over from a slow publisher still
+        # running can't make readers see half-written arrays
+        folder = self._folder(ticker, interval)
+        os.makedirs(folder, exist_ok = True)
+        temporary = tempfile.mkdtemp(prefix = '.publish-', dir = folder)
+
+        arrays = compact_arrays(df[[column for column in COLUMNS if column in df.columns]])
+        arrays['index'] = df.index.values
+        for column, values in arrays.items():
+            np.save(os.path.join(temporary, column + '.npy'), values)
+
+        manifest = {'bars': len(df), 'columns': [column for column in arrays if column != 'index'],
+                    'refreshed': time.time()}
+        with open(os.path.join(temporary, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        version = max(self._versions(folder) + [0]) + 1
+        while True:
+            name = 'v%06d' % version
+            try:
+                os.rename(temporary, os.path.join(folder, name))
+                break
+            except OSError as error:
+                if error.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                # Taken by another publisher meanwhile
+                version = max(self._versions(folder) + [version]) + 1
+
+        self._remove_old(folder)
+        return dict(manifest, version = version, path = name)
+
+    def _remove_old(self, folder):
+
+        # A mapped file stays readable after it is removed, except on
+        # Windows, where it is removed by a later publication. The folders of
+        # crashed publications are removed after LOCK_TIMEOUT
+        latest = max(self._versions(folder) + [0])
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.startswith('v') and name[1:].isdigit() and int(name[1:]) <= latest - KEEP_VERSIONS:
+                shutil.rmtree(path, ignore_errors = True)
+            elif name.startswith('.publish-'):
+                try:
+                    if time.time() - os.path.getmtime(path) > LOCK_TIMEOUT:
+                        shutil.rmtree(path, ignore_errors = True)
+                except OSError:
+                    pass
+
+    def open(self, ticker, interval = '1d', manifest = None):
+
+        # Read-only frame mapping the published version, opened once per
+        # version by each process
+        manifest = manifest or self.manifest(ticker, interval)
+        if manifest is None:
+            return None
+        key = (ticker.upper(), interval)
+        with self._lock:
+            opened = self._open.get(key)
+            if opened is not None and opened[0] == manifest['version']:
+                return opened[1]
+
+        path = os.path.join(self._folder(ticker, interval), manifest['path'])
+        try:
+            arrays = {column: np.load(os.path.join(path, column + '.npy'), mmap_mode = 'r')
+                      for column in manifest['columns']}
+            index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy'), mmap_mode = 'r'))
+        except FileNotFoundError:
+            # Replaced and removed meanwhile, read the new manifest
+            latest = self.manifest(ticker, interval)
+            if latest is None or latest['version'] == manifest['version']:
+                raise
+            return self.open(ticker, interval, latest)
+        frame = arrays_frame(arrays, index, ticker)
+
+        with self._lock:
+            self._open[key] = (manifest['version'], frame)
+        return frame
+
+    def _outdated(self, manifest, refresh):
+        if manifest is None:
+            return True
+        if refresh:
+            return time.time() - manifest['refreshed'] >= RECENT
+        return bars_stale(manifest['refreshed'], REFRESH_AFTER)
+
+    def get(self, ticker, interval = '1d', refresh = False):
+
+        # The published history, downloaded by this process only when the
+        # published copy is out of date and no other process is on it. When
+        # only the bar of the session under way is out of date, the published
+        # copy is served and the bar is downloaded in the background
+        manifest = self.manifest(ticker, interval)
+        if not self._outdated(manifest, refresh):
+            return self.open(ticker, interval, manifest)
+        if manifest is not None and not refresh and not session_missed(manifest['refreshed']):
+            self._download_in_background(ticker, interval)
+            return self.open(ticker, interval, manifest)
+        return self.download(ticker, interval, refresh)
+
+    def _download_in_background(self, ticker, interval):
+        key = (ticker.upper(), interval)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._revalidate, ticker, interval)
+
+    def _revalidate(self, ticker, interval):
+        try:
+            self.download(ticker, interval)
+        except Exception:
+            # Tried again on a later read
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard((ticker.upper(), interval))
+
+    def download(self, ticker, interval = '1d', refresh = False):
+
+        # Publish the latest bars now unless the published copy is up to date
+        with FileLock(self._folder(ticker, interval) + '.lock'):
+            manifest = self.manifest(ticker, interval)
+            if self._outdated(manifest, refresh):
+                store = self.store or get_store()
+                try:
+                    # Without a published version, the stored bars are published
+                    df = store.get(ticker, None, None, interval, refresh = refresh,
+                                   fallback = manifest is None)
+                except FetchError as error:
+                    if manifest is None or refresh:
+                        raise
+                    logger.warning('Serving the published version, could not download %s', error)
+                    return self.open(ticker, interval, manifest)
+                manifest = self.publish(ticker, df, interval)
+        return self.open(ticker, interval, manifest)
+
+    def version(self, ticker, interval = '1d'):
+        manifest = self.manifest(ticker, interval)
+        return None if manifest is None else manifest['version']
+
+    def close(self, ticker = None):
+
+        # Forget the mapped versions, the files are unmapped once no frame
+        # uses them anymore
+        with self._lock:
+            for key in list(self._open):
+                if ticker is None or key[0] == ticker.upper():
+                    del self._open[key]
+
+#==============================================================================
+# Shared Store of the Process
+#==============================================================================
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_store():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedStore()
+        return _shared
+
+
+def set_shared_store(store = None):
+    global _shared
+    with _shared_lock:
+        _shared = store
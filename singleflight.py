@@ -0,0 +1,67 @@
+#==============================================================================
+# Request Coalescing
+#==============================================================================
+
+# Every Streamlit session runs in its own thread of the same server process.
+# When several sessions ask for the same (endpoint, ticker, params) at once,
+# only the first one calls the source, the others wait for its result
+# (single-flight). A failure is raised in every waiting session, the next
+# request tries again.
+
+import threading
+
+from instrumentation import cache_result
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self, name = 'singleflight'):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, func):
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            cache_result(self.name, 'shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
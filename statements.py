@@ -0,0 +1,90 @@
+#==============================================================================
+# Financial Statement Normalizer
+#==============================================================================
+
+# Turns the income statement, balance sheet and cash flow tables from
+# yahoo_fin into the format shown in the Financials tab:
+#
+#   - the camel case Breakdown names are split into words
+#   - missing values become 0
+#   - numbers are in thousands, as integers
+#   - the columns are dates instead of timestamps
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import fundamentals as fd
+
+# Split "TotalRevenue" into "Total" and "Revenue", same words as re.split did
+BREAKDOWN_PATTERN = re.compile(r'([A-Z][a-z]*\d*)')
+
+# Statement name used in the cache and the function loading it
+STATEMENTS = {'income_statement': fd.get_income_statement,
+              'balance_sheet': fd.get_balance_sheet,
+              'cash_flow': fd.get_cash_flow}
+
+#==============================================================================
+# Normalization
+#==============================================================================
+
+def split_breakdown(breakdown):
+    return breakdown.str.replace(BREAKDOWN_PATTERN, r' \1 ', regex = True)
+
+
+def to_thousands(values):
+    values = np.nan_to_num(np.asarray(values, dtype = float))
+    return (values / 1000).astype('int64')
+
+
+def normalize_statement(statement):
+
+    # One vectorized pass over the names, the values and the column names
+    statement = statement.reset_index()
+    breakdown = split_breakdown(statement['Breakdown'].astype(str))
+    values = statement.drop(columns = 'Breakdown')
+
+    return pd.DataFrame(to_thousands(values.to_numpy()),
+                        index = pd.Index(breakdown, name = 'Breakdown'),
+                        columns = pd.to_datetime(values.columns).date)
+
+#==============================================================================
+# Cached Statements
+#==============================================================================
+
+def get_statement(ticker, statement, yearly = True):
+
+    # The fundamentals cache keeps the normalized tables, they are refreshed
+    # and invalidated with the other fundamentals
+    return STATEMENTS[statement](ticker, yearly = yearly)
+
+
+def normalize_batch(tickers, statements = tuple(STATEMENTS), periods = (True, False)):
+
+    # Every table of the tickers in one long table, one row per (ticker,
+    # statement, yearly, Breakdown, date), for bulk exports. The tables are
+    # read from the fundamentals cache, normalized once per ticker, and
+    # stacked together in a single pass over NumPy arrays
+    keys, sizes, breakdown, dates, values = [], [], [], [], []
+    for ticker in tickers:
+        for statement in statements:
+            for yearly in periods:
+                table = get_statement(ticker, statement, yearly)
+                rows, cols = table.shape
+                keys.append((ticker, statement, yearly))
+                sizes.append(rows * cols)
+                breakdown.append(np.repeat(table.index.to_numpy(), cols))
+                dates.append(np.tile(np.asarray(table.columns, dtype = 'datetime64[D]'), rows))
+                values.append(table.to_numpy().ravel())
+
+    if not keys:
+        return pd.DataFrame({'ticker': [], 'statement': [], 'yearly': [], 'Breakdown': [],
+                             'date': pd.to_datetime([]), 'value': np.array([], dtype = 'int64')})
+
+    return pd.DataFrame({'ticker': np.repeat([key[0] for key in keys], sizes),
+                         'statement': np.repeat([key[1] for key in keys], sizes),
+                         'yearly': np.repeat([key[2] for key in keys], sizes),
+                         'Breakdown': np.concatenate(breakdown),
+                         'date': pd.to_datetime(np.concatenate(dates)),
+                         'value': np.concatenate(values)})
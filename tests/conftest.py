@@ -0,0 +1,40 @@
+#==============================================================================
+# Test Fixtures
+#==============================================================================
+
+# Every test runs offline: the data calls go to the local stand-in of
+# fake_source.py and the files are written to a temporary folder.
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DASHBOARD_PATH = os.path.join(ROOT, 'S&P 500 Financial Dashboard.py')
+
+# Script of the AppTest runs
+from benchmark import dashboard_app
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    import benchmark
+    import fundamentals as fd
+    import price_store
+    import shared_store
+    import universe
+
+    monkeypatch.setattr(universe, 'UNIVERSE_PATH', str(tmp_path / 'universe.csv'))
+    monkeypatch.setattr(universe, '_universe', None)
+    monkeypatch.setenv('DASHBOARD_ROOT', ROOT)
+    source = benchmark.setup_offline(str(tmp_path))
+    yield source
+
+    fd.set_source(None)
+    price_store.set_store(None)
+    benchmark.clear_caches()
+    shared_store.set_shared_store(None)
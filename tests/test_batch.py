@@ -0,0 +1,11 @@
+from batch import analyze_ticker
+from price_store import get_store
+
+
+def test_batch_reads_full_precision(offline):
+    result = analyze_ticker('T001', simulations = 100, time_horizon = 10, seed = 0)
+    assert 'error' not in result
+    stored = get_store().get('T001')
+    assert result['sma']['adjclose'].dtype == 'float64'
+    assert (result['sma']['adjclose'].to_numpy() == stored['adjclose'].to_numpy()).all()
+    assert result['var']['last_price'] == stored['close'].iloc[-1]
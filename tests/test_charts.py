@@ -0,0 +1,14 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+from matplotlib.colors import to_rgba
+
+import charts
+
+
+def test_simulation_chart_legend_is_red():
+    paths = 100 * np.cumprod(1 + np.random.default_rng(0).normal(0, 0.01, (30, 200)), axis = 0)
+    fig = charts.draw_simulation_chart(paths, 100.0, 'T001', 30)
+    handle = fig.axes[0].get_legend().legend_handles[0]
+    assert to_rgba(handle.get_color()) == to_rgba('red')
@@ -0,0 +1,119 @@
+import json
+import base64
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import client_chart
+from client_chart import chart_html, encode_payload
+
+
+def history(start, periods):
+    index = pd.bdate_range(start, periods = periods)
+    close = np.linspace(10, 100, periods)
+    return pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                         'adjclose': close, 'volume': np.full(periods, 1000.0)}, index = index)
+
+
+@pytest.fixture
+def cdn_library(tmp_path, monkeypatch):
+
+    # No copy in the vendor folder, loaded from the CDN with its hash
+    monkeypatch.setattr(client_chart, 'LIBRARY_PATH', str(tmp_path / 'missing.js'))
+    monkeypatch.setattr(client_chart, 'LIBRARY_INTEGRITY', 'sha384-test')
+
+
+def payload_times(payload):
+    return np.frombuffer(base64.b64decode(payload['data']), dtype = '<i4', count = payload['bars'])
+
+
+def test_times_before_1970_stay_ascending():
+    bars = history('1962-01-02', 16000)
+    payload = encode_payload(bars, pd.DataFrame(index = bars.index))
+    times = payload_times(payload)
+    assert times[0] < 0
+    assert times[0] == pd.Timestamp('1962-01-02').timestamp()
+    assert np.all(np.diff(times) > 0)
+    assert times[-1] == bars.index[-1].timestamp()
+
+
+def test_recent_bars_sent_one_by_one():
+    bars = history('2000-01-03', 5000)
+    payload = encode_payload(bars, pd.DataFrame(index = bars.index), recent_bars = 100, older_bars = 50)
+    times = payload_times(payload)
+    assert payload['bars'] <= 150
+    assert list(times[-100:]) == [int(t.timestamp()) for t in bars.index[-100:]]
+
+
+# Runs the script of the chart page with a stand-in of Lightweight Charts
+# that records the points given to every series
+NODE_STUBS = """
+const recorded = [];
+const element = () => ({appendChild() {}, style: {}, options() { return {}; }});
+globalThis.document = {getElementById: element, createElement: element, createTextNode: element};
+globalThis.atob = s => Buffer.from(s, 'base64').toString('binary');
+globalThis.ResizeObserver = class { observe() {} };
+const stubSeries = () => ({setData(data) { recorded.push(data.map(p => p.time)); },
+                       applyOptions() {}, options() { return {}; }});
+globalThis.LightweightCharts = {createChart: () => ({
+  addHistogramSeries: stubSeries, addCandlestickSeries: stubSeries, addLineSeries: stubSeries,
+  priceScale: () => ({applyOptions() {}}), applyOptions() {},
+  timeScale: () => ({fitContent() {}, setVisibleRange() {}})})};
+process.on('exit', () => console.log(JSON.stringify(recorded)));
+"""
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason = 'node is not installed')
+def test_browser_times_before_1970_stay_ascending(tmp_path, cdn_library):
+    bars = history('1962-01-02', 16000)
+    payload = encode_payload(bars, pd.DataFrame(index = bars.index))
+    html = chart_html(payload, 'T000')
+    script = html.split('<script>')[1].split('</script>')[0]
+    path = tmp_path / 'chart.js'
+    path.write_text(NODE_STUBS + script)
+
+    output = subprocess.run(['node', str(path)], capture_output = True, text = True, check = True).stdout
+    for times in json.loads(output):
+        assert times[0] < 0
+        assert all(a < b for a, b in zip(times, times[1:]))
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason = 'node is not installed')
+def test_browser_draws_every_indicator_sent(tmp_path, cdn_library):
+    bars = history('2020-01-02', 300)
+    indicators = pd.DataFrame({'SMA_50': bars['close'], 'BB_upper': bars['close'] + 1}, index = bars.index)
+    payload = encode_payload(bars, indicators)
+    assert payload['indicators'] == ['SMA_50', 'BB_upper']
+    script = chart_html(payload, 'T000').split('<script>')[1].split('</script>')[0]
+    path = tmp_path / 'chart.js'
+    path.write_text(NODE_STUBS + script)
+
+    # Volume, candles, line and one series per indicator
+    output = subprocess.run(['node', str(path)], capture_output = True, text = True, check = True).stdout
+    assert len(json.loads(output)) == 5
+
+
+def test_library_loaded_with_integrity(cdn_library):
+    html = chart_html(encode_payload(history('2020-01-02', 10), pd.DataFrame()), 'T000')
+    assert '<script src="' + client_chart.LIBRARY_URL + '" integrity="sha384-test" crossorigin="anonymous">' in html
+
+
+def test_vendored_library_inlined(tmp_path, monkeypatch):
+    library = tmp_path / 'lightweight-charts.js'
+    library.write_text('var LightweightCharts = {};')
+    monkeypatch.setattr(client_chart, 'LIBRARY_PATH', str(library))
+    monkeypatch.setattr(client_chart, 'LIBRARY_INTEGRITY', '')
+    html = chart_html(encode_payload(history('2020-01-02', 10), pd.DataFrame()), 'T000')
+    assert '<script>var LightweightCharts = {};</script>' in html
+    assert client_chart.LIBRARY_URL not in html
+
+
+def test_library_required(tmp_path, monkeypatch):
+    monkeypatch.setattr(client_chart, 'LIBRARY_PATH', str(tmp_path / 'missing.js'))
+    monkeypatch.setattr(client_chart, 'LIBRARY_INTEGRITY', '')
+    assert not client_chart.library_available()
+    with pytest.raises(FileNotFoundError):
+        chart_html(encode_payload(history('2020-01-02', 10), pd.DataFrame()), 'T000')
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+import streamlit
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from streamlit.testing.v1 import AppTest
+
+from conftest import dashboard_app
+from export import FORMATS, build_export, iter_frames
+
+
+def read_export(data, file_format):
+    if file_format == 'CSV':
+        return pd.read_csv(data)
+    if file_format == 'CSV (gzip)':
+        return pd.read_csv(data, compression = 'gzip')
+    return pd.read_parquet(data)
+
+
+@pytest.mark.parametrize('file_format', list(FORMATS))
+def test_build_export(offline, file_format):
+    table = read_export(build_export(['T001', 'T002'], '2020-01-01', '2021-01-01', file_format), file_format)
+    assert set(table['ticker']) == {'T001', 'T002'}
+    assert len(table) > 400
+
+
+@pytest.mark.parametrize('file_format', list(FORMATS))
+def test_download_button(offline, monkeypatch, file_format):
+
+    # The data passed to the button is kept, to be downloaded as on a click
+    downloads = []
+    download_button = streamlit.download_button
+
+    def recording_button(label, data, *args, **kwargs):
+        downloads.append((label, data, kwargs))
+        return download_button(label, data, *args, **kwargs)
+
+    monkeypatch.setattr(streamlit, 'download_button', recording_button)
+
+    at = AppTest.from_function(dashboard_app, default_timeout = 60)
+    at.run()
+    at.sidebar.selectbox[1].set_value('T001').run()
+    format_box = [box for box in at.sidebar.selectbox if box.label == 'Format'][0]
+    format_box.set_value(file_format).run()
+    assert not at.exception
+
+    label, data, kwargs = [d for d in downloads if d[0] == 'Download Stock Data'][-1]
+    assert callable(data)
+    assert kwargs['file_name'] == 'T001_data' + FORMATS[file_format][0]
+    table = read_export(data(), file_format)
+
+    # A file object Streamlit can serve
+    buffer = data()
+    assert convert_data_to_bytes_and_infer_mime(buffer, ValueError())[0] == buffer.getvalue()
+    assert set(table['ticker']) == {'T001'}
+    assert len(table) > 1000
+
+
+def test_export_full_precision(offline):
+    import history
+    from price_store import get_store
+
+    stored = get_store().get('T001', '2020-01-01', '2021-01-01')
+    table = read_export(build_export(['T001'], '2020-01-01', '2021-01-01', 'Parquet'), 'Parquet')
+    assert table['close'].dtype == 'float64'
+    assert (table['close'].to_numpy() == stored['close'].to_numpy()).all()
+    assert history.get_history('T001')['close'].dtype == 'float32'
+
+
+def test_weekly_frames_full_precision(offline):
+    daily = pd.concat(iter_frames(['T001'], '2020-01-01', '2021-01-01'))
+    weekly = pd.concat(iter_frames(['T001'], '2020-01-01', '2021-01-01', '1wk'))
+    assert len(weekly) < len(daily) / 4
+    assert weekly['close'].dtype == 'float64'
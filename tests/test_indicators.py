@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from fake_source import FakeSource
+from indicators import Indicators, compute
+
+
+@pytest.fixture
+def close():
+    return FakeSource().get_data('T001')['adjclose'].astype(float)
+
+
+@pytest.mark.parametrize('stored, added', [(1000, 1), (1000, 30), (10, 5), (2, 300)])
+def test_incremental_update_equals_full_recompute(close, stored, added):
+
+    # The last stored bar of the day changes when the new bars arrive
+    intraday = close.iloc[:stored].copy()
+    intraday.iloc[-1] *= 0.99
+    engine = Indicators(intraday)
+    updated = engine.update(close.iloc[:stored + added])
+    pd.testing.assert_frame_equal(updated, compute(close.iloc[:stored + added]), rtol = 1e-9)
+
+
+def test_rewritten_history_recomputed(close):
+
+    # e.g. the adjusted prices after a dividend
+    engine = Indicators(close.iloc[:1000])
+    adjusted = close.iloc[:1010] * 0.98
+    pd.testing.assert_frame_equal(engine.update(adjusted), compute(adjusted))
@@ -0,0 +1,19 @@
+from instrumentation import Metrics
+
+
+def test_metrics_keyed_without_ticker(tmp_path):
+    log = tmp_path / 'metrics.jsonl'
+    metrics = Metrics(log_path = str(log))
+    for ticker in ('T001', 'T002', 'T003'):
+        with metrics.stage('page', page = 'Chart', ticker = ticker):
+            with metrics.stage('fetch', endpoint = 'prices', ticker = ticker):
+                pass
+
+    assert sorted(metrics.calls.items()) == [(('fetch', (('endpoint', 'prices'),)), 3),
+                                             (('page', (('page', 'Chart'),)), 3)]
+    assert 'ticker' not in metrics.prometheus_text()
+    assert metrics.summary(('stage', 'page'))['calls'].tolist() == [3, 3]
+
+    # The ticker is still in the events of the run and in the log
+    assert [event['ticker'] for event in metrics.run_events()] == ['T001'] * 2 + ['T002'] * 2 + ['T003'] * 2
+    assert log.read_text().count('"ticker": "T002"') == 2
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from market_hours import MARKET_TZ, bars_stale, market_open, session_missed
+
+REFRESH_AFTER = 15 * 60
+
+
+def at(day, hour, minute = 0):
+    # Timestamp of a time of October 2026 in New York, the 12th is a Monday
+    return datetime(2026, 10, day, hour, minute, tzinfo = MARKET_TZ).timestamp()
+
+
+def test_market_open():
+    assert not market_open(at(12, 9, 29))
+    assert market_open(at(12, 9, 30))
+    assert not market_open(at(12, 16, 0))
+    assert not market_open(at(17, 12))
+
+
+def test_bars_warmed_before_open_fresh_until_open():
+    warmed = at(12, 8)
+    assert not bars_stale(warmed, REFRESH_AFTER, now = at(12, 9, 29))
+
+    # The bar of the day exists once the session is open, the closed bars are complete
+    assert bars_stale(warmed, REFRESH_AFTER, now = at(12, 9, 35))
+    assert not session_missed(warmed, now = at(12, 9, 35))
+    assert session_missed(warmed, now = at(12, 16, 5))
+
+
+def test_bars_warmed_after_close_fresh_over_weekend():
+    warmed = at(16, 17)
+    for now in (at(16, 23), at(17, 12), at(18, 12), at(19, 9, 29)):
+        assert not bars_stale(warmed, REFRESH_AFTER, now = now)
+    assert bars_stale(warmed, REFRESH_AFTER, now = at(19, 9, 50))
+
+
+def test_bars_of_session_under_way():
+    loaded = at(14, 11)
+    assert not bars_stale(loaded, REFRESH_AFTER, now = at(14, 11, 10))
+    assert bars_stale(loaded, REFRESH_AFTER, now = at(14, 11, 20))
+    assert not session_missed(loaded, now = at(14, 11, 20))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from montecarlo import simulate_portfolio
+
+CORRELATION = np.array([[1.0, 0.8, -0.3],
+                        [0.8, 1.0, 0.1],
+                        [-0.3, 0.1, 1.0]])
+VOLATILITY = np.array([0.01, 0.02, 0.015])
+
+
+@pytest.fixture
+def daily_returns():
+    cov = CORRELATION * np.outer(VOLATILITY, VOLATILITY)
+    return np.random.default_rng(1).multivariate_normal(np.zeros(3), cov, 2000)
+
+
+def asset_paths(daily_returns, **kwargs):
+
+    # Every asset on its own, with the same seed the shocks are the same draws
+    return np.array([simulate_portfolio(daily_returns, weights, 200000, 1, seed = 7,
+                                        dtype = np.float64, **kwargs)[0]
+                     for weights in np.eye(3)])
+
+
+def test_portfolio_reproduces_input_correlation(daily_returns):
+    paths = asset_paths(daily_returns)
+    np.testing.assert_allclose(np.corrcoef(paths), np.corrcoef(daily_returns, rowvar = False), atol = 0.01)
+    np.testing.assert_allclose(paths.std(axis = 1),
+                               daily_returns.std(axis = 0, ddof = 1), rtol = 0.01)
+
+
+def test_seeded_portfolio_reproducible(daily_returns):
+    weights = np.array([0.5, 0.3, 0.2])
+    first, risk = simulate_portfolio(daily_returns, weights, 5000, 30, seed = 123)
+    again, risk_again = simulate_portfolio(daily_returns, weights, 5000, 30, seed = 123)
+    chunked, risk_chunked = simulate_portfolio(daily_returns, weights, 5000, 30, seed = 123,
+                                               chunk_bytes = 30 * 3 * 4 * 64)
+    np.testing.assert_array_equal(first, again)
+    np.testing.assert_array_equal(first, chunked)
+    assert risk == risk_again == risk_chunked
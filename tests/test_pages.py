@@ -0,0 +1,26 @@
+from streamlit.testing.v1 import AppTest
+
+from conftest import dashboard_app
+
+
+def page_app(page):
+    at = AppTest.from_function(dashboard_app, default_timeout = 60)
+    at.run()
+    at.sidebar.selectbox[1].set_value('T001').run()
+    at.sidebar.radio[0].set_value(page).run()
+    assert not at.exception
+    return at
+
+
+def test_chart_page_renders(offline):
+    at = page_app('Chart')
+    assert [date.label for date in at.date_input] == ['Start date', 'End date']
+    assert at.main.get('image')
+
+
+def test_analysis_page_renders(offline):
+    at = page_app('Analysis')
+    assert [subheader.value for subheader in at.subheader] == [
+        'Earnings Estimate', 'Revenue Estimate', 'Earnings History',
+        'EPS Trend', 'EPS Revisions', 'Growth Estimates']
+    assert len(at.main.dataframe) == 6
@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+
+import pytest
+
+import prefetch
+
+
+@pytest.fixture
+def busy_executor(monkeypatch):
+
+    # One worker, taken by the prefetch of another session until released
+    executor = prefetch.ThreadPoolExecutor(max_workers = 1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def other_session():
+        started.set()
+        release.wait(10)
+
+    monkeypatch.setattr(prefetch, '_ticker_executor', executor)
+    monkeypatch.setattr(prefetch, '_prefetched', {})
+    executor.submit(other_session)
+    started.wait(10)
+    yield release
+    release.set()
+    executor.shutdown()
+
+
+def test_queued_prefetch_is_cancelled(busy_executor, monkeypatch):
+    calls = []
+    monkeypatch.setattr(prefetch, 'TICKER_DATASETS', {'quote': calls.append, 'prices': calls.append})
+    futures = prefetch.prefetch_ticker('T001')
+
+    # The page does not wait behind the other session, it loads the dataset itself
+    assert prefetch.pending('T001', 'quote') is None
+    assert futures['quote'].cancelled()
+    assert not futures['prices'].cancelled()
+
+    busy_executor.set()
+    futures['prices'].result(10)
+    assert calls == ['T001']
+
+
+def test_running_prefetch_is_waited_for(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def load(ticker):
+        started.set()
+        release.wait(10)
+        return ticker
+
+    monkeypatch.setattr(prefetch, '_prefetched', {})
+    monkeypatch.setattr(prefetch, 'TICKER_DATASETS', {'quote': load})
+    futures = prefetch.prefetch_ticker('T002')
+    started.wait(10)
+
+    assert prefetch.pending('T002', 'quote') is futures['quote']
+    release.set()
+    assert futures['quote'].result(10) == 'T002'
+    assert prefetch.pending('T002', 'quote') is None
+
+
+def test_warmed_quote_served_on_first_request(offline, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch.fd, 'QUOTE_DIR', str(tmp_path / 'quotes'))
+    prefetch.prefetch_universe(['T001'], quotes = True, quote_root = str(tmp_path), rate = 1000)
+    saved, _ = prefetch.fd.load_quote('T001')
+    calls = offline.calls
+
+    assert prefetch.fd.get_quote_table('T001') == saved
+    assert offline.calls == calls
+
+
+def test_old_warmed_quote_refreshed_in_background(offline, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch.fd, 'QUOTE_DIR', str(tmp_path / 'quotes'))
+    prefetch.fd.save_quote('T002', {'Quote Price': 1.0})
+    path = prefetch.fd.quote_path('T002')
+    hours_ago = time.time() - 2 * 3600
+    os.utime(path, (hours_ago, hours_ago))
+
+    assert prefetch.fd.get_quote_table('T002') == {'Quote Price': 1.0}
+    deadline = time.time() + 10
+    while prefetch.fd.age('quote', 'T002') > 60 and time.time() < deadline:
+        time.sleep(0.01)
+    assert prefetch.fd.get_quote_table('T002') != {'Quote Price': 1.0}
+
+
+def test_day_old_warmed_quote_ignored(offline, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch.fd, 'QUOTE_DIR', str(tmp_path / 'quotes'))
+    prefetch.fd.save_quote('T003', {'Quote Price': 1.0})
+    two_days_ago = time.time() - 2 * 86400
+    os.utime(prefetch.fd.quote_path('T003'), (two_days_ago, two_days_ago))
+
+    assert prefetch.fd.get_quote_table('T003') != {'Quote Price': 1.0}
+
+
+def test_warmed_history_read_without_download(offline, monkeypatch):
+    import history
+    import shared_store
+
+    result = prefetch.prefetch_universe(['T001', 'T002'], rate = 1000)
+    assert result['failed'] == {}
+    assert shared_store.get_shared_store().manifest('T001') is not None
+
+    # Viewed before the next open
+    monkeypatch.setattr(shared_store, 'bars_stale', lambda refreshed, max_age: False)
+    calls = offline.calls
+    assert len(history.get_history('T001')) > 1000
+    assert offline.calls == calls
@@ -0,0 +1,126 @@
+import time
+import threading
+
+import pandas as pd
+import pytest
+
+import history
+import price_store
+import shared_store
+from fake_source import FakeSource
+from price_store import FetchError, PriceStore
+
+
+@pytest.fixture
+def session_closed(monkeypatch):
+
+    # A session has closed since every download
+    for module in (price_store, shared_store, history):
+        monkeypatch.setattr(module, 'bars_stale', lambda refreshed, max_age: True)
+    monkeypatch.setattr(shared_store, 'session_missed', lambda refreshed: True)
+
+
+@pytest.fixture
+def source():
+    return FakeSource()
+
+
+@pytest.fixture
+def store(tmp_path, source):
+    return PriceStore(str(tmp_path), fetch = source.get_data)
+
+
+def test_stale_bars_served_when_source_fails(store, source, session_closed):
+    stored = store.get('T001')
+    source.failure_rate = 1.0
+
+    assert store.get('T001').equals(stored)
+    assert store.get('T001', '1900-01-01').equals(stored)
+    with pytest.raises(FetchError):
+        store.get('T001', refresh = True)
+    with pytest.raises(FetchError):
+        store.get('T001', fallback = False)
+
+    # The gap is filled on the first read after the source is back
+    source.failure_rate = 0.0
+    calls = source.calls
+    store.get('T001')
+    assert source.calls == calls + 1
+
+
+def test_history_served_when_source_fails(offline, session_closed, monkeypatch):
+    published = history.get_history('T001')
+    monkeypatch.setattr(shared_store, 'RECENT', -1)
+    offline.failure_rate = 1.0
+
+    history.invalidate()
+    assert history.get_history('T001')['close'].equals(published['close'])
+    with pytest.raises(FetchError):
+        history.refresh('T001')
+
+
+def test_first_download_failure_raises(offline):
+    offline.failure_rate = 1.0
+    with pytest.raises(ConnectionError):
+        history.get_history('T001')
+
+
+def test_fresh_bars_not_downloaded_again(store, source, monkeypatch):
+    monkeypatch.setattr(price_store, 'bars_stale', lambda refreshed, max_age: False)
+    stored = store.get('T001')
+    calls = source.calls
+    assert store.get('T001').equals(stored)
+    assert len(store.get('T001', '2020-01-01', '2021-01-01')) > 0
+    assert source.calls == calls
+
+
+def test_bar_of_the_day_downloaded_in_background(offline, monkeypatch):
+    shared = shared_store.get_shared_store()
+    published = shared.get('T001')
+    version = shared.version('T001')
+
+    # Only the bar of the session under way is out of date
+    monkeypatch.setattr(shared_store, 'bars_stale', lambda refreshed, max_age: True)
+    monkeypatch.setattr(shared_store, 'session_missed', lambda refreshed: False)
+    monkeypatch.setattr(price_store, 'bars_stale', lambda refreshed, max_age: True)
+    release = threading.Event()
+    get_data = offline.get_data
+
+    def slow_get_data(*args, **kwargs):
+        release.wait(10)
+        return get_data(*args, **kwargs)
+
+    monkeypatch.setattr(shared.store or price_store.get_store(), 'fetch', slow_get_data)
+    assert shared.get('T001') is published
+    assert shared.version('T001') == version
+
+    release.set()
+    deadline = time.time() + 10
+    while shared.version('T001') == version and time.time() < deadline:
+        time.sleep(0.01)
+    assert shared.version('T001') == version + 1
+
+
+def test_gaps_fetched_without_overlap(tmp_path, source, session_closed):
+    ranges = []
+
+    def fetch(ticker, start_date = None, end_date = None, interval = '1d'):
+        ranges.append((start_date, end_date))
+        return source.get_data(ticker, start_date, end_date, interval = interval)
+
+    store = PriceStore(str(tmp_path), fetch = fetch)
+    middle = store.get('T001', '2015-01-01', '2016-01-01')
+    last_bar = middle.index[-1]
+
+    # The leading gap ends where the stored range starts, the trailing gap
+    # starts at the last stored bar, downloaded again
+    df = store.get('T001', '2010-01-01')
+    assert ranges[1:] == [(pd.Timestamp('2010-01-01'), pd.Timestamp('2015-01-01')),
+                          (last_bar, ranges[2][1])]
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    expected = source.get_data('T001', '2010-01-01')
+    pd.testing.assert_frame_equal(df[expected.columns], expected, check_freq = False)
+
+    # Nothing left to download
+    assert store.get('T001', '2012-01-01', '2013-01-01').equals(df.loc['2012-01-01':'2012-12-31'])
+    assert len(ranges) == 3
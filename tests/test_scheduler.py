@@ -0,0 +1,37 @@
+from streamlit.testing.v1 import AppTest
+
+import scheduler
+from conftest import dashboard_app
+
+
+def test_failed_refresh_backs_off(monkeypatch):
+    attempts = []
+
+    def refresh_dataset(ticker, dataset, params = ()):
+        attempts.append(ticker)
+        raise ConnectionError('no network')
+
+    monkeypatch.setattr(scheduler, 'refresh_dataset', refresh_dataset)
+    planner = scheduler.Scheduler(rate = 1000)
+    monkeypatch.setattr(planner, 'due', lambda now = None: [('T001', 'stats', ())])
+
+    # Skipped until the backoff expires, which doubles after every failure
+    for now, expected in ((0, 1), (30, 1), (60, 2), (150, 2), (180, 3)):
+        planner.run_once(now)
+        assert len(attempts) == expected
+    assert planner.failed[('T001', 'stats', ())][1:] == (3, 180 + 4 * scheduler.BACKOFF)
+
+    monkeypatch.setattr(scheduler, 'refresh_dataset', lambda ticker, dataset, params = (): None)
+    planner.run_once(180 + 4 * scheduler.BACKOFF)
+    assert not planner.failed
+
+
+def test_refresh_errors_shown(offline):
+    at = AppTest.from_function(dashboard_app, default_timeout = 60)
+    at.run()
+    at.sidebar.selectbox[1].set_value('T001').run()
+
+    offline.failure_rate = 1.0
+    [button for button in at.sidebar.button if button.label == 'Refresh Data'][0].click().run()
+    assert not at.exception
+    assert any('Could not refresh' in warning.value for warning in at.sidebar.warning)
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import prefetch
+import screener
+from conftest import dashboard_app
+
+TICKERS = ['T001', 'T002', 'T003']
+
+
+@pytest.fixture
+def screener_path(offline, tmp_path, monkeypatch):
+
+    # T003 always fails, without retries
+    stats = prefetch.fd.get_stats
+
+    def get_stats(ticker):
+        if ticker == 'T003':
+            raise ConnectionError('simulated network error')
+        return stats(ticker)
+
+    monkeypatch.setattr(prefetch.fd, 'get_stats', get_stats)
+    monkeypatch.setattr(prefetch, 'with_retries', lambda func, limiter, *args: func())
+    monkeypatch.setattr(screener, 'SCREENER_PATH', str(tmp_path / 'screener.parquet'))
+    screener.invalidate()
+    yield screener.SCREENER_PATH
+    screener.invalidate()
+
+
+def test_failed_tickers_saved_with_table(screener_path):
+    table, failed = screener.build_screener(TICKERS)
+    assert sorted(table.index) == ['T001', 'T002']
+    assert list(failed) == ['T003']
+
+    loaded = screener.load_screener()
+    assert len(loaded) == 2
+    assert 'ConnectionError' in loaded.failed['T003']
+
+
+def test_no_ticker_loaded_keeps_previous_table(screener_path):
+    screener.build_screener(TICKERS)
+    with pytest.raises(RuntimeError):
+        screener.build_screener(['T003'])
+    assert len(screener.load_screener()) == 2
+
+
+def test_background_build(screener_path):
+    status = screener.start_build(TICKERS)
+    status['future'].result(30)
+    assert status['done'] == status['total'] == 3
+    assert screener.build_status() is status
+    assert screener.load_screener().failed.keys() == {'T003'}
+
+
+def test_screener_page_shows_failures(screener_path):
+    screener.start_build(TICKERS)['future'].result(30)
+
+    at = AppTest.from_function(dashboard_app, default_timeout = 60)
+    at.run()
+    at.sidebar.radio[0].set_value('Screener').run()
+    assert not at.exception
+    assert [e.label for e in at.expander] == ['1 tickers could not be loaded']
+    assert '2 of 2 tickers' in [m.value for m in at.markdown]
+
+
+def test_screener_page_while_building(screener_path, monkeypatch):
+    release = threading.Event()
+    stats = prefetch.fd.get_stats
+
+    def slow_stats(ticker):
+        release.wait(30)
+        return stats(ticker)
+
+    monkeypatch.setattr(prefetch.fd, 'get_stats', slow_stats)
+    status = screener.start_build(TICKERS)
+    try:
+        # One build at a time
+        assert screener.start_build(TICKERS) is status
+        at = AppTest.from_function(dashboard_app, default_timeout = 60)
+        at.run()
+        at.sidebar.radio[0].set_value('Screener').run()
+        assert not at.exception
+        assert not status['future'].done()
+        assert 'Building the screener table' in at.get('progress')[0].proto.text
+    finally:
+        release.set()
+    status['future'].result(30)
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import numpy as np
+
+from fake_source import FakeSource
+from shared_store import SharedStore
+
+
+def test_concurrent_publications_stay_complete(tmp_path):
+
+    # Publishers that all took the lock (e.g. taken over from a slow one)
+    shared = SharedStore(str(tmp_path))
+    history = FakeSource().get_data('T001')
+    frames = [history.iloc[:1000 + 100 * i] for i in range(6)]
+    barrier = threading.Barrier(len(frames))
+    manifests = []
+
+    def publish(frame):
+        barrier.wait()
+        manifests.append(shared.publish('T001', frame))
+
+    threads = [threading.Thread(target = publish, args = (frame,)) for frame in frames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({manifest['version'] for manifest in manifests}) == len(frames)
+    manifest = shared.manifest('T001')
+    published = shared.open('T001', manifest = manifest)
+    assert len(published) == manifest['bars'] in [len(frame) for frame in frames]
+    assert np.array_equal(published['close'].to_numpy(), history['close'].iloc[:len(published)].to_numpy(np.float32))
+
+    folder = os.path.join(str(tmp_path), 'shared', 'interval=1d', 'T001')
+    assert not [name for name in os.listdir(folder) if name.startswith('.publish-')]
+
+
+def test_versions_increase(tmp_path):
+    shared = SharedStore(str(tmp_path))
+    history = FakeSource().get_data('T001')
+    versions = [shared.publish('T001', history)['version'] for i in range(4)]
+    assert versions == [1, 2, 3, 4]
+    folder = os.path.join(str(tmp_path), 'shared', 'interval=1d', 'T001')
+    assert sorted(os.listdir(folder)) == ['v000003', 'v000004']
@@ -0,0 +1,66 @@
+import time
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+WAITERS = 8
+
+
+def run_concurrently(flight, key, func):
+
+    # WAITERS threads asking for the same key while the first call is held
+    release = threading.Event()
+    calls = []
+    outcomes = [None] * WAITERS
+
+    def held():
+        calls.append(1)
+        release.wait(10)
+        return func()
+
+    def request(i):
+        try:
+            outcomes[i] = flight.do(key, held)
+        except Exception as error:
+            outcomes[i] = error
+
+    threads = [threading.Thread(target = request, args = (i,)) for i in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 10
+    while flight.shared < WAITERS - 1 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return calls, outcomes
+
+
+def test_concurrent_calls_coalesced():
+    flight = SingleFlight()
+    result = object()
+    calls, outcomes = run_concurrently(flight, ('prices', 'T001'), lambda: result)
+    assert len(calls) == 1
+    assert all(outcome is result for outcome in outcomes)
+    assert (flight.calls, flight.shared) == (1, WAITERS - 1)
+    assert not flight.in_flight(('prices', 'T001'))
+
+
+def test_error_raised_in_every_waiter():
+    flight = SingleFlight()
+    error = ConnectionError('no network')
+
+    def fail():
+        raise error
+
+    calls, outcomes = run_concurrently(flight, ('prices', 'T001'), fail)
+    assert len(calls) == 1
+    assert all(outcome is error for outcome in outcomes)
+
+    # The next request calls the source again
+    assert flight.do(('prices', 'T001'), lambda: 'ok') == 'ok'
+    assert flight.calls == 2
+    with pytest.raises(ConnectionError):
+        flight.do(('prices', 'T001'), fail)
@@ -0,0 +1,45 @@
+import datetime
+
+import numpy as np
+
+import fundamentals as fd
+import scheduler
+from statements import STATEMENTS, get_statement, normalize_batch
+
+
+def test_statements_cached_normalized_once(offline):
+    calls = offline.calls
+    table = get_statement('T001', 'income_statement', True)
+    assert table.index.name == 'Breakdown'
+    assert all(isinstance(column, datetime.date) for column in table.columns)
+    assert table.to_numpy().dtype == np.int64
+
+    # One entry per table, in the fundamentals cache
+    get_statement('T001', 'income_statement', True)
+    assert [key for key in fd.get_cache()._entries if key[0] in STATEMENTS] == [('income_statement', 'T001', True)]
+    assert offline.calls == calls + 1
+
+
+def test_refresh_replaces_normalized_table(offline):
+    table = get_statement('T001', 'cash_flow', False)
+    calls = offline.calls
+    scheduler.refresh_dataset('T001', 'cash_flow', (False,))
+    assert offline.calls == calls + 1
+    assert fd.age('cash_flow', 'T001', False) < 1
+    assert get_statement('T001', 'cash_flow', False).equals(table)
+    assert dict(((d, p), age) for d, p, age in scheduler.datasets('T001'))[('cash_flow', (False,))] < 1
+
+
+def test_normalize_batch_stacks_cached_tables(offline):
+    batch = normalize_batch(['T001', 'T002'])
+    calls = offline.calls
+    assert len(normalize_batch(['T001', 'T002'])) == len(batch)
+    assert offline.calls == calls
+
+    for (ticker, statement, yearly), rows in batch.groupby(['ticker', 'statement', 'yearly']):
+        table = get_statement(ticker, statement, yearly)
+        stacked = rows.pivot(index = 'Breakdown', columns = 'date', values = 'value')
+        stacked.columns = stacked.columns.date
+        assert stacked.loc[table.index, table.columns].equals(table)
+    assert len(batch) == sum(get_statement(ticker, statement, yearly).size
+                             for ticker in ('T001', 'T002') for statement in STATEMENTS for yearly in (True, False))
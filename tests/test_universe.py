@@ -0,0 +1,46 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import universe
+from conftest import dashboard_app
+
+
+@pytest.fixture
+def first_offline_start(offline, monkeypatch):
+
+    # No saved list, the scrape fails and the refreshes are only recorded
+    refreshes = []
+
+    def fetch_universe():
+        raise ConnectionError('no network')
+
+    monkeypatch.setattr(universe, 'fetch_universe', fetch_universe)
+    monkeypatch.setattr(universe, 'refresh_in_background', lambda: refreshes.append(True))
+    assert not os.path.exists(universe.UNIVERSE_PATH)
+    yield refreshes
+
+
+def test_snapshot_committed():
+    snapshot = universe._read(universe.SNAPSHOT_PATH)
+    assert len(snapshot) > 0
+    assert snapshot['ticker'].is_unique
+    assert (snapshot[universe.COLUMNS] != '').all().all()
+
+
+def test_first_offline_start_uses_snapshot(first_offline_start):
+    tickers = universe.load_tickers()
+    assert 'AAPL' in tickers
+    assert tickers == universe._read(universe.SNAPSHOT_PATH)['ticker'].tolist()
+
+    # Scraped again on the next request
+    universe.load_universe()
+    assert first_offline_start
+
+
+def test_dashboard_starts_offline(first_offline_start):
+    at = AppTest.from_function(dashboard_app, default_timeout = 60)
+    at.run()
+    assert not at.exception
+    assert 'AAPL - Apple Inc.' in at.sidebar.selectbox[1].options
@@ -0,0 +1,139 @@
+#==============================================================================
+# S&P 500 Ticker Universe
+#==============================================================================
+
+# The constituent list (ticker, company name and sector) is scraped at most
+# once a day. It is saved to disk, so reruns and restarts read it from there,
+# and an expired copy is still served while a background thread refreshes it.
+#
+#   python universe.py --snapshot   # replace the offline snapshot next to this file
+
+import os
+import sys
+import time
+import threading
+
+import pandas as pd
+
+from price_store import DATA_DIR
+from instrumentation import fetched
+
+# Seconds before the constituent list is scraped again
+UNIVERSE_TTL = 24 * 60 * 60
+
+# Seconds between two attempts when the scrape fails
+RETRY_AFTER = 10 * 60
+
+# Saved copy of the last scrape, and the offline snapshot used as a fallback
+UNIVERSE_PATH = os.path.join(DATA_DIR, 'universe.csv')
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sp500_snapshot.csv')
+
+COLUMNS = ['ticker', 'name', 'sector']
+
+_universe = None
+_loaded = 0
+_refreshing = False
+_lock = threading.Lock()
+
+#==============================================================================
+# Loading
+#==============================================================================
+
+def fetch_universe():
+
+    # Wikipedia table scraped by yahoo_fin, with tickers in Yahoo format (BRK-B)
+    from fundamentals import stock_info
+    table = fetched('universe', 'S&P 500', lambda: stock_info().tickers_sp500(include_company_data = True))
+    universe = pd.DataFrame({'ticker': table['Symbol'].str.replace('.', '-', regex = False),
+                             'name': table['Security'],
+                             'sector': table['GICS Sector']})
+    return universe.sort_values('ticker').reset_index(drop = True)
+
+
+def save_universe(universe, path = UNIVERSE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    universe[COLUMNS].to_csv(path + '.tmp', index = False)
+    os.replace(path + '.tmp', path)
+
+
+def _read(path):
+    return pd.read_csv(path, keep_default_na = False)[COLUMNS]
+
+
+def _refresh():
+    global _universe, _loaded, _refreshing
+    try:
+        universe = fetch_universe()
+        save_universe(universe)
+        with _lock:
+            _universe = universe
+            _loaded = time.time()
+    except Exception:
+        # Keep serving the saved copy and try again in a few minutes
+        with _lock:
+            _loaded = max(_loaded, time.time() - UNIVERSE_TTL + RETRY_AFTER)
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def refresh_in_background():
+    global _refreshing
+    with _lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target = _refresh, daemon = True).start()
+
+
+def load_universe():
+    global _universe, _loaded
+
+    with _lock:
+        if _universe is not None:
+            if time.time() - _loaded > UNIVERSE_TTL:
+                expired = True
+            else:
+                return _universe
+        else:
+            expired = False
+
+    if expired:
+        refresh_in_background()
+        return _universe
+
+    # Saved copy from an earlier run, refreshed in the background if too old
+    if os.path.exists(UNIVERSE_PATH):
+        universe = _read(UNIVERSE_PATH)
+        with _lock:
+            _universe = universe
+            _loaded = os.path.getmtime(UNIVERSE_PATH)
+        if time.time() - _loaded > UNIVERSE_TTL:
+            refresh_in_background()
+        return universe
+
+    # First run, scrape now and fall back to the offline snapshot
+    try:
+        universe = fetch_universe()
+        save_universe(universe)
+        loaded = time.time()
+    except Exception:
+        if not os.path.exists(SNAPSHOT_PATH):
+            raise
+        universe = _read(SNAPSHOT_PATH)
+        loaded = 0
+
+    with _lock:
+        _universe = universe
+        _loaded = loaded
+    return universe
+
+
+def load_tickers():
+    return load_universe()['ticker'].tolist()
+
+
+if __name__ == '__main__':
+    if '--snapshot' in sys.argv[1:]:
+        save_universe(fetch_universe(), SNAPSHOT_PATH)
+        print('Saved ' + SNAPSHOT_PATH)